@@ -0,0 +1,337 @@
+"""
+Este es un programa para medir el tiempo de cada etapa de la planilla de Control de Facturas con
+datos sintéticos de distintos tamaños, y compararlo con las mediciones anteriores.
+Unidad de Finanzas.
+"""
+
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from generar_datos_sinteticos import ARCHIVO_DESCRIPCION, GeneradorDatosSinteticos
+from programa_planilla_facturas import (
+    ARCHIVO_OBSERVACIONES,
+    BASES_DE_DATOS_EXCEL,
+    MINIMO_SEGUNDOS_REGRESION,
+    MOTORES_EXCEL,
+    UMBRAL_REGRESION,
+    GeneradorPlanillaFinanzas,
+)
+
+# Cantidades de documentos con que se mide la planilla, y cantidad de veces que se corre cada una
+# (se guarda la mediana de las repeticiones)
+ESCALAS_BENCHMARK = [1_000, 10_000, 100_000]
+REPETICIONES_BENCHMARK = 3
+
+# Carpeta con los datos sintéticos de cada escala (datos_1000/crudos, ...) y con los resultados de
+# cada benchmark (resultados/benchmark_2024-05-31_103000.json)
+CARPETA_BENCHMARK = "benchmark"
+
+
+class BenchmarkPlanilla:
+    """
+    Esta clase permite medir cada etapa de GeneradorPlanillaFinanzas (leyendo todos los años) con
+    datos sintéticos de distintos tamaños.
+
+    - Los datos de cada escala se generan una sola vez, y se reutilizan mientras no cambie la
+    cantidad de documentos, los años o la semilla.
+    - Cada repetición lee los archivos crudos sin cache, y parte con una carpeta de salida vacía
+    (sin histórico ni estado incremental) y con los archivos de OBSERVACIONES originales (y sin
+    base de observaciones), para que todas las repeticiones midan lo mismo.
+    """
+
+    def __init__(
+        self,
+        escalas=ESCALAS_BENCHMARK,
+        repeticiones=REPETICIONES_BENCHMARK,
+        carpeta=CARPETA_BENCHMARK,
+        semilla=0,
+        n_procesos=None,
+        medir_memoria=False,
+        motores_excel=None,
+        exportar_csv=False,
+        exportar_excel=False,
+    ):
+        self.escalas = list(escalas)
+        self.repeticiones = repeticiones
+        self.carpeta = os.path.abspath(carpeta)
+        self.semilla = semilla
+        self.n_procesos = n_procesos
+        self.medir_memoria = medir_memoria
+        self.motores_excel = motores_excel
+        self.exportar_csv = exportar_csv
+        self.exportar_excel = exportar_excel
+
+    def correr(self):
+        """
+        Esta función mide todas las escalas, guarda los resultados y los compara con el
+        benchmark anterior. Retorna un DataFrame con una fila por escala y etapa.
+        """
+        print(
+            "Ojo! Los datos sintéticos sólo tienen archivos Excel .xlsx, por lo que no se mide la "
+            "lectura de archivos .xls (como los que exporta ACEPTA) con xlrd."
+        )
+        resultados = pd.concat(
+            [self.medir_escala(n_documentos) for n_documentos in self.escalas], ignore_index=True
+        )
+
+        print("\nSegundos de cada etapa (mediana de las repeticiones):")
+        print(
+            resultados.pivot(index="etapa", columns="n_documentos", values="segundos")
+            .sort_values(self.escalas[-1])
+            .round(3)
+            .to_string()
+        )
+
+        self.comparar_con_benchmark_anterior(resultados)
+        self.guardar_resultados(resultados)
+
+        return resultados
+
+    def preparar_datos(self, n_documentos):
+        """
+        Esta función genera los datos sintéticos de una escala, salvo que ya existan con la misma
+        descripción. Retorna la carpeta de la escala.
+        """
+        carpeta_escala = os.path.join(self.carpeta, f"datos_{n_documentos}")
+        generador = GeneradorDatosSinteticos(n_documentos, semilla=self.semilla)
+
+        ruta_descripcion = os.path.join(carpeta_escala, ARCHIVO_DESCRIPCION)
+        if os.path.exists(ruta_descripcion):
+            with open(ruta_descripcion, encoding="utf-8") as archivo:
+                if json.load(archivo) == generador.obtener_descripcion():
+                    return carpeta_escala
+
+        shutil.rmtree(carpeta_escala, ignore_errors=True)
+        generador.generar(carpeta_escala)
+        shutil.copytree(
+            self.obtener_carpeta_observaciones(carpeta_escala),
+            os.path.join(carpeta_escala, "OBSERVACIONES_originales"),
+        )
+
+        return carpeta_escala
+
+    def obtener_carpeta_observaciones(self, carpeta_escala):
+        return os.path.join(carpeta_escala, "crudos", "base_de_datos_facturas", "OBSERVACIONES")
+
+    def medir_escala(self, n_documentos):
+        """
+        Esta función corre la planilla completa repeticiones veces sobre los datos de una escala.
+        Retorna la mediana de cada etapa, más una fila "total" con la duración de la corrida.
+        """
+        carpeta_escala = self.preparar_datos(n_documentos)
+        print(f"\nMidiendo {n_documentos} documentos ({self.repeticiones} repeticiones)...")
+
+        carpeta_salida = os.path.join(carpeta_escala, "salida")
+        reportes = []
+        for repeticion in range(self.repeticiones):
+            shutil.rmtree(carpeta_salida, ignore_errors=True)
+            os.makedirs(carpeta_salida)
+            # La planilla reescribe los archivos de OBSERVACIONES, por lo que se restauran
+            carpeta_observaciones = self.obtener_carpeta_observaciones(carpeta_escala)
+            shutil.rmtree(carpeta_observaciones)
+            shutil.copytree(
+                os.path.join(carpeta_escala, "OBSERVACIONES_originales"), carpeta_observaciones
+            )
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(carpeta_escala, ARCHIVO_OBSERVACIONES))
+
+            generador = GeneradorPlanillaFinanzas(
+                usar_cache=False,
+                n_procesos=self.n_procesos,
+                medir_memoria=self.medir_memoria,
+                motores_excel=self.motores_excel,
+                exportar_csv=self.exportar_csv,
+                exportar_excel=self.exportar_excel,
+                carpeta_entrada=carpeta_escala,
+                carpeta_salida=carpeta_salida,
+            )
+            inicio = time.perf_counter()
+            # Los mensajes de la planilla no se muestran, para que se lean los resultados
+            with contextlib.redirect_stdout(io.StringIO()):
+                planificador = generador.armar_planificador("2")
+                planificador.correr()
+            duracion_total = time.perf_counter() - inicio
+
+            reporte = planificador.obtener_reporte_etapas()
+            reporte.loc["total", "segundos"] = duracion_total
+            reportes.append(reporte)
+            print(f"Repetición {repeticion + 1}: {duracion_total:.1f} seconds")
+
+        resultados = pd.concat(reportes).groupby(level=0, sort=False).median()
+        resultados = resultados.rename_axis("etapa").reset_index()
+        resultados.insert(0, "n_documentos", n_documentos)
+
+        return resultados
+
+    def obtener_rutas_resultados(self):
+        return sorted(glob.glob(os.path.join(self.carpeta, "resultados", "benchmark_*.json")))
+
+    def obtener_configuracion(self):
+        """
+        Esta función obtiene la configuración con que se mide el benchmark: el computador y las
+        opciones que cambian lo que se mide. Sólo se comparan benchmarks con la misma
+        configuración (ver comparar_con_benchmark_anterior).
+        """
+        return {
+            "computador": {
+                "sistema": platform.platform(),
+                "procesador": platform.processor(),
+                "nucleos": os.cpu_count(),
+            },
+            "repeticiones": self.repeticiones,
+            "n_procesos": self.n_procesos,
+            "medir_memoria": self.medir_memoria,
+            "motores_excel": self.motores_excel,
+            "exportar_csv": self.exportar_csv,
+            "exportar_excel": self.exportar_excel,
+        }
+
+    def guardar_resultados(self, resultados):
+        """
+        Esta función guarda los resultados en CARPETA_BENCHMARK/resultados, junto a la
+        configuración, las versiones y el computador con que se midieron.
+        """
+        fecha_benchmark = datetime.datetime.now()
+        configuracion = self.obtener_configuracion()
+        configuracion["computador"].update(
+            {
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+            }
+        )
+        benchmark = {
+            "fecha": fecha_benchmark.isoformat(timespec="seconds"),
+            **configuracion,
+            "semilla": self.semilla,
+            "resultados": json.loads(resultados.to_json(orient="records")),
+        }
+
+        carpeta_resultados = os.path.join(self.carpeta, "resultados")
+        os.makedirs(carpeta_resultados, exist_ok=True)
+        ruta_resultados = os.path.join(
+            carpeta_resultados, f"benchmark_{fecha_benchmark:%Y-%m-%d_%H%M%S}.json"
+        )
+        with open(ruta_resultados, "w", encoding="utf-8") as archivo:
+            json.dump(benchmark, archivo, indent=2)
+
+        print(f"\nResultados guardados en {ruta_resultados}")
+
+    def comparar_con_benchmark_anterior(self, resultados):
+        """
+        Esta función compara los segundos de cada etapa y escala con el último benchmark
+        guardado con la misma configuración (obtener_configuracion), y avisa de las etapas que
+        tardaron más de UMBRAL_REGRESION veces (y al menos MINIMO_SEGUNDOS_REGRESION). Las
+        versiones de Python, pandas y numpy pueden ser distintas, para ver cómo afectan.
+        """
+        rutas_resultados = self.obtener_rutas_resultados()
+        if not rutas_resultados:
+            print("\nNo hay un benchmark anterior con el que comparar.")
+            return None
+
+        configuracion = self.obtener_configuracion()
+        benchmark_anterior = None
+        for ruta_resultados in reversed(rutas_resultados):
+            with open(ruta_resultados, encoding="utf-8") as archivo:
+                benchmark = json.load(archivo)
+            computador = benchmark.get("computador", {})
+            if all(
+                computador.get(dato) == valor for dato, valor in configuracion["computador"].items()
+            ) and all(
+                benchmark.get(opcion) == valor
+                for opcion, valor in configuracion.items()
+                if opcion != "computador"
+            ):
+                benchmark_anterior = benchmark
+                break
+
+        if benchmark_anterior is None:
+            print(
+                f"\nOjo! Los {len(rutas_resultados)} benchmarks anteriores tienen otra "
+                "configuración (computador, repeticiones, procesos, motores de Excel o "
+                "exportaciones), por lo que no se comparan."
+            )
+            return None
+
+        resultados_anteriores = pd.DataFrame(benchmark_anterior["resultados"])
+        comparacion = resultados[["n_documentos", "etapa", "segundos"]].merge(
+            resultados_anteriores[["n_documentos", "etapa", "segundos"]],
+            on=["n_documentos", "etapa"],
+            suffixes=("", "_anteriores"),
+        )
+        comparacion["variacion"] = comparacion["segundos"] / comparacion[
+            "segundos_anteriores"
+        ].replace(0, np.nan)
+
+        print(f"\nVariación respecto al benchmark del {benchmark_anterior['fecha']}:")
+        print(
+            comparacion.pivot(index="etapa", columns="n_documentos", values="variacion")
+            .round(2)
+            .to_string()
+        )
+
+        etapas_mas_lentas = comparacion[
+            (comparacion["variacion"] > UMBRAL_REGRESION)
+            & (comparacion["segundos"] >= MINIMO_SEGUNDOS_REGRESION)
+        ]
+        if not etapas_mas_lentas.empty:
+            print(f"\nOjo! Etapas que tardaron más de {UMBRAL_REGRESION} veces:")
+            print(etapas_mas_lentas.round(3).to_string(index=False))
+
+        return comparacion
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mide cada etapa de la planilla con datos sintéticos de distintos tamaños."
+    )
+    parser.add_argument("--escalas", type=int, nargs="+", default=ESCALAS_BENCHMARK)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES_BENCHMARK)
+    parser.add_argument("--carpeta", default=CARPETA_BENCHMARK)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--n-procesos", type=int, default=None)
+    parser.add_argument("--medir-memoria", action="store_true")
+    parser.add_argument(
+        "--motor-excel",
+        choices=list(MOTORES_EXCEL),
+        help="Motor con que se leen todas las bases de datos en Excel (por defecto, el primero "
+        "instalado)",
+    )
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="Exportar también el histórico a CSV (etapa exportar_csv)",
+    )
+    parser.add_argument(
+        "--excel",
+        action="store_true",
+        help="Exportar también el histórico a Excel (etapa exportar_excel)",
+    )
+    argumentos = parser.parse_args()
+
+    BenchmarkPlanilla(
+        escalas=argumentos.escalas,
+        repeticiones=argumentos.repeticiones,
+        carpeta=argumentos.carpeta,
+        semilla=argumentos.semilla,
+        n_procesos=argumentos.n_procesos,
+        medir_memoria=argumentos.medir_memoria,
+        motores_excel=(
+            dict.fromkeys(BASES_DE_DATOS_EXCEL, argumentos.motor_excel)
+            if argumentos.motor_excel
+            else None
+        ),
+        exportar_csv=argumentos.csv,
+        exportar_excel=argumentos.excel,
+    ).correr()
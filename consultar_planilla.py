@@ -0,0 +1,353 @@
+"""
+Este es un programa para consultar el estado de los documentos de la planilla de Control de
+Facturas sin abrir control_facturas_historico.csv. Carga la planilla histórica una sola vez en
+memoria, y responde consultas por HTTP en localhost. Cuando la planilla termina de guardar un
+histórico nuevo, lo vuelve a cargar.
+Unidad de Finanzas.
+"""
+
+import argparse
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from programa_planilla_facturas import (
+    ARCHIVO_PUBLICACION_HISTORICO,
+    CARPETA_HISTORICO,
+    ESQUEMA_PLANILLA,
+    GeneradorPlanillaFinanzas,
+)
+
+# Puerto (en localhost) donde se responden las consultas, y cada cuántos segundos se revisa si la
+# planilla publicó un histórico nuevo
+PUERTO_CONSULTAS = 8765
+SEGUNDOS_ENTRE_REVISIONES = 5
+
+# Cantidad máxima de documentos que se retornan por consulta, si no se indica otro límite
+LIMITE_DOCUMENTOS_CONSULTA = 1000
+
+# Las columnas de texto con menos valores distintos que esta proporción de las filas se guardan
+# como categorías (ej: estados de ACEPTA o razones sociales), para ocupar menos memoria
+PROPORCION_CATEGORIAS = 0.5
+
+
+class IndiceHash:
+    """
+    Esta clase permite encontrar las filas que tienen un valor en una columna, sin recorrerla.
+
+    - Cada valor distinto se busca en una tabla hash (pd.Index), que entrega su código.
+    - Las posiciones de las filas se guardan ordenadas por código, por lo que las filas de un
+    código son un tramo contiguo (entre inicios[codigo] e inicios[codigo + 1]).
+    """
+
+    def __init__(self, valores):
+        codigos, valores_unicos = pd.factorize(valores.to_numpy(dtype=object))
+        self.valores_unicos = pd.Index(valores_unicos)
+        self.posiciones = np.argsort(codigos, kind="stable")
+        # Los valores vacíos (código -1) quedan al principio, y no se pueden buscar
+        self.inicios = np.searchsorted(codigos[self.posiciones], np.arange(len(valores_unicos) + 1))
+
+    def buscar(self, valor):
+        codigo = self.valores_unicos.get_indexer([valor])[0]
+        if codigo == -1:
+            return np.array([], dtype=self.posiciones.dtype)
+
+        return self.posiciones[self.inicios[codigo] : self.inicios[codigo + 1]]
+
+
+class IndiceOrdenado:
+    """
+    Esta clase permite encontrar las filas con fechas dentro de un rango, con búsqueda binaria
+    sobre las fechas ordenadas. Las filas sin fecha no se pueden buscar.
+    """
+
+    def __init__(self, fechas):
+        posiciones = np.flatnonzero(fechas.notna().to_numpy())
+        fechas = fechas.to_numpy(dtype="datetime64[ns]")[posiciones]
+        orden = np.argsort(fechas, kind="stable")
+        self.posiciones = posiciones[orden]
+        self.fechas = fechas[orden]
+
+    def buscar_rango(self, desde=None, hasta=None):
+        """
+        Esta función retorna las filas con fechas entre desde y hasta (ambas incluidas).
+        """
+        inicio = 0 if desde is None else np.searchsorted(self.fechas, np.datetime64(desde), "left")
+        fin = (
+            len(self.fechas)
+            if hasta is None
+            else np.searchsorted(self.fechas, np.datetime64(hasta), "right")
+        )
+
+        return self.posiciones[inicio:fin]
+
+
+class TablaConsultas:
+    """
+    Esta clase guarda la planilla histórica cargada en memoria junto a sus índices. No se
+    modifica después de construirse: al recargar se construye otra, y se reemplaza completa.
+    """
+
+    def __init__(self, df, firma_publicacion, publicacion):
+        self.df = df
+        self.firma_publicacion = firma_publicacion
+        self.publicacion = publicacion
+        self.fecha_carga = datetime.datetime.now()
+        self.indice_llave_id = IndiceHash(df["llave_id"])
+        self.indice_rut_emisor = IndiceHash(df["RUT_Emisor_SII"])
+        self.indice_fecha_recepcion = IndiceOrdenado(df["Fecha_Recepcion_SII"])
+
+
+class ServicioConsultasPlanilla:
+    """
+    Esta clase permite consultar la planilla histórica de una carpeta de salida.
+
+    - Las consultas por llave_id y RUT_Emisor_SII usan índices hash, y las por rango de
+    Fecha_Recepcion_SII un índice ordenado. El resto de los filtros se aplica sólo a las filas
+    que entregan los índices.
+    - Un hilo revisa cada SEGUNDOS_ENTRE_REVISIONES si la planilla publicó un histórico nuevo
+    (ARCHIVO_PUBLICACION_HISTORICO), o si cambió el día (para actualizar tiempo_diferencia_SII y
+    esta_al_dia), y en ese caso vuelve a cargarlo. Mientras carga, se siguen respondiendo las
+    consultas con la planilla anterior.
+    """
+
+    def __init__(
+        self,
+        carpeta_entrada=".",
+        carpeta_salida=".",
+        puerto=PUERTO_CONSULTAS,
+        segundos_entre_revisiones=SEGUNDOS_ENTRE_REVISIONES,
+    ):
+        """
+        - carpeta_entrada: Carpeta que contiene crudos/. De ahí se leen los feriados locales con
+        que se recalculan los días hábiles de cada documento.
+        - carpeta_salida: Carpeta donde la planilla guarda el histórico que se consulta.
+        """
+        self.generador = GeneradorPlanillaFinanzas(
+            carpeta_entrada=carpeta_entrada, carpeta_salida=carpeta_salida
+        )
+        self.puerto = puerto
+        self.segundos_entre_revisiones = segundos_entre_revisiones
+        self.tabla = None
+
+    def obtener_ruta_publicacion(self):
+        return self.generador.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_PUBLICACION_HISTORICO)
+
+    def obtener_firma_publicacion(self):
+        """
+        Esta función obtiene la fecha de modificación y el tamaño de ARCHIVO_PUBLICACION_HISTORICO
+        (None si todavía no existe).
+        """
+        ruta_publicacion = self.obtener_ruta_publicacion()
+        if not os.path.exists(ruta_publicacion):
+            return None
+
+        estado_archivo = os.stat(ruta_publicacion)
+        return estado_archivo.st_mtime_ns, estado_archivo.st_size
+
+    def cargar(self):
+        """
+        Esta función carga la planilla histórica y construye sus índices.
+        """
+        inicio = time.perf_counter()
+        firma_publicacion = self.obtener_firma_publicacion()
+        publicacion = None
+        if firma_publicacion is not None:
+            with open(self.obtener_ruta_publicacion(), encoding="utf-8") as archivo:
+                publicacion = json.load(archivo)
+
+        df = self.generador.leer_historico()
+        df = self.generador.calcular_tiempo_8_dias(df)
+        df = self.compactar_columnas(df)
+
+        self.tabla = TablaConsultas(df, firma_publicacion, publicacion)
+        print(
+            f"Planilla cargada: {df.shape[0]} documentos, "
+            f"{df.memory_usage(deep=True).sum() / 1024**2:.1f} MB "
+            f"({time.perf_counter() - inicio:.1f} seconds)"
+        )
+
+    def compactar_columnas(self, df):
+        """
+        Esta función guarda como categorías las columnas de texto con pocos valores distintos
+        (según PROPORCION_CATEGORIAS).
+        """
+        for columna, tipo_dato in ESQUEMA_PLANILLA.items():
+            if tipo_dato != "string" or columna == "llave_id":
+                continue
+            if df[columna].nunique() <= PROPORCION_CATEGORIAS * len(df):
+                df[columna] = df[columna].astype("category")
+
+        return df
+
+    def vigilar_publicaciones(self):
+        """
+        Esta función vuelve a cargar la planilla cuando se publica un histórico nuevo o cambia
+        el día. Si la carga falla, se siguen usando los datos anteriores.
+        """
+        while True:
+            time.sleep(self.segundos_entre_revisiones)
+            hay_publicacion_nueva = self.obtener_firma_publicacion() != self.tabla.firma_publicacion
+            cambio_el_dia = datetime.date.today() != self.tabla.fecha_carga.date()
+            if not (hay_publicacion_nueva or cambio_el_dia):
+                continue
+
+            try:
+                self.cargar()
+            except Exception as error:
+                print(f"No se pudo volver a cargar la planilla ({error}), se mantiene la anterior")
+
+    def consultar(self, llave_id=None, rut=None, folio=None, desde=None, hasta=None, **filtros):
+        """
+        Esta función retorna los documentos que cumplen todos los filtros indicados.
+
+        - llave_id, rut (RUT_Emisor_SII, con o sin puntos) y folio (Folio_SII).
+        - desde y hasta: Rango de Fecha_Recepcion_SII. Aceptan un año (2024), un mes (2024-03) o
+        un día (2024-03-15), y hasta incluye todo ese año, mes o día.
+        - El resto de los filtros son columnas de la planilla, y se comparan como texto (ej:
+        estado_acepta_ACEPTA="ACEPTADO", esta_al_dia="False").
+        """
+        tabla = self.tabla
+        df = tabla.df
+
+        columnas_desconocidas = set(filtros) - set(df.columns)
+        if columnas_desconocidas:
+            raise ValueError(f"No existen las columnas {sorted(columnas_desconocidas)}")
+
+        posiciones = []
+        if llave_id is not None:
+            posiciones.append(tabla.indice_llave_id.buscar(llave_id))
+        if rut is not None:
+            rut = rut.replace(".", "").upper().strip()
+            posiciones.append(tabla.indice_rut_emisor.buscar(rut))
+        if desde is not None or hasta is not None:
+            inicio = None if desde is None else self.generador.interpretar_limite_periodo(desde)[0]
+            fin = None
+            if hasta is not None:
+                fin = self.generador.interpretar_limite_periodo(hasta)[1] + pd.Timedelta(
+                    days=1, microseconds=-1
+                )
+            posiciones.append(tabla.indice_fecha_recepcion.buscar_rango(inicio, fin))
+
+        if posiciones:
+            posiciones = functools.reduce(np.intersect1d, posiciones)
+        else:
+            posiciones = np.arange(len(df))
+
+        resultado = df.iloc[np.sort(posiciones)]
+        if folio is not None:
+            resultado = resultado[resultado["Folio_SII"] == int(folio)]
+        for columna, valor in filtros.items():
+            resultado = resultado[resultado[columna].astype("string") == valor]
+
+        return resultado
+
+    def servir(self):
+        """
+        Esta función carga la planilla y responde consultas en http://127.0.0.1:puerto hasta que
+        se detenga el programa (Ctrl+C):
+
+        - /documentos?rut=76123456-7&folio=1234: Documentos que cumplen los filtros (ver
+        consultar). Con limite=N se retornan a lo más N documentos.
+        - /estado: Documentos cargados, memoria usada y la publicación del histórico cargado.
+        """
+        self.cargar()
+        threading.Thread(target=self.vigilar_publicaciones, daemon=True).start()
+
+        servidor = ThreadingHTTPServer(
+            ("127.0.0.1", self.puerto), functools.partial(ManejadorConsultas, servicio=self)
+        )
+        print(f"Respondiendo consultas en http://127.0.0.1:{self.puerto}/documentos")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+
+    def responder(self, ruta, parametros):
+        """
+        Esta función retorna el código HTTP y el contenido (un diccionario) de la respuesta a una
+        consulta.
+        """
+        if ruta == "/estado":
+            tabla = self.tabla
+            return 200, {
+                "documentos": len(tabla.df),
+                "memoria_mb": round(tabla.df.memory_usage(deep=True).sum() / 1024**2, 1),
+                "fecha_carga": tabla.fecha_carga.isoformat(timespec="seconds"),
+                "publicacion": tabla.publicacion,
+            }
+
+        if ruta != "/documentos":
+            return 404, {"error": f"No existe la ruta {ruta} (usar /documentos o /estado)"}
+
+        inicio = time.perf_counter()
+        try:
+            limite = int(parametros.pop("limite", LIMITE_DOCUMENTOS_CONSULTA))
+            resultado = self.consultar(**parametros)
+        except ValueError as error:
+            return 400, {"error": str(error)}
+
+        return 200, {
+            "total": len(resultado),
+            "milisegundos": round((time.perf_counter() - inicio) * 1000, 2),
+            "documentos": json.loads(
+                resultado.head(limite).to_json(
+                    orient="records", date_format="iso", force_ascii=False
+                )
+            ),
+        }
+
+
+class ManejadorConsultas(BaseHTTPRequestHandler):
+    """
+    Esta clase responde cada consulta HTTP con ServicioConsultasPlanilla.responder, en JSON.
+    """
+
+    def __init__(self, *argumentos, servicio, **parametros):
+        self.servicio = servicio
+        super().__init__(*argumentos, **parametros)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        parametros = {
+            nombre: valores[-1]
+            for nombre, valores in urllib.parse.parse_qs(url.query, keep_blank_values=True).items()
+        }
+        codigo, respuesta = self.servicio.responder(url.path, parametros)
+
+        contenido = json.dumps(respuesta, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Responde consultas sobre la planilla histórica de Control de Facturas."
+    )
+    parser.add_argument("--entrada", default=".", help="Carpeta que contiene crudos/")
+    parser.add_argument("--salida", default=".", help="Carpeta donde se guarda la planilla")
+    parser.add_argument("--puerto", type=int, default=PUERTO_CONSULTAS)
+    parser.add_argument(
+        "--segundos-entre-revisiones", type=float, default=SEGUNDOS_ENTRE_REVISIONES
+    )
+    argumentos = parser.parse_args()
+
+    ServicioConsultasPlanilla(
+        carpeta_entrada=argumentos.entrada,
+        carpeta_salida=argumentos.salida,
+        puerto=argumentos.puerto,
+        segundos_entre_revisiones=argumentos.segundos_entre_revisiones,
+    ).servir()
@@ -0,0 +1,563 @@
+"""
+Este es un programa para generar datos sintéticos con la misma forma que la carpeta crudos/, para
+poder medir la planilla de Control de Facturas sin usar los datos reales de los proveedores.
+Unidad de Finanzas.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from programa_planilla_facturas import (
+    COLUMNAS_ACEPTA,
+    COLUMNAS_SII_PENDIENTES,
+    COLUMNAS_SII_RECLAMADAS,
+    COLUMNAS_SII_REGISTRO_O_NO_INCLUIR,
+)
+
+# RUT de la institución que recibe los documentos. Va en el nombre de los archivos del SII
+RUT_RECEPTOR = "61608605-3"
+
+# Proporción de cada tipo de documento (Factura afecta, Factura exenta, Nota de Débito y Nota de
+# Crédito), y de cada tipo de archivo del SII en que queda cada documento
+PROPORCION_TIPOS_DOCUMENTO = {33: 0.8, 34: 0.05, 56: 0.03, 61: 0.12}
+PROPORCION_ESTADOS_SII = {"REGISTRO": 0.7, "NO_INCLUIR": 0.1, "PENDIENTE": 0.15, "RECLAMADO": 0.05}
+
+# Proporción de los documentos que aparece en cada base de datos, y de documentos registrados que
+# además siguen apareciendo en los pendientes del SII (se deben eliminar al leer)
+PROPORCION_DOCUMENTOS_POR_BASE = {
+    "ACEPTA": 0.95,
+    "SCI": 0.5,
+    "SIGFE": 0.6,
+    "TURBO": 0.4,
+    "OBSERVACIONES": 0.01,
+}
+PROPORCION_PAGADOS_SIGFE = 0.7
+PROPORCION_DUPLICADOS_PENDIENTES = 0.02
+
+# Cantidad de documentos por proveedor, de órdenes de compra por año y de artículos del maestro
+DOCUMENTOS_POR_PROVEEDOR = 100
+ORDENES_DE_COMPRA_POR_AÑO = 2000
+CANTIDAD_ARTICULOS = 500
+CANTIDAD_ITEMS_PRESUPUESTO = 40
+
+# Versión de los archivos que se generan. Si cambia el formato de algún archivo, se debe aumentar
+# para que el benchmark vuelva a generar los datos que ya tiene
+VERSION_DATOS_SINTETICOS = 2
+
+# Un archivo Excel admite 1.048.576 filas. Las bases que se guardan en Excel se separan en partes de
+# a lo más esta cantidad de documentos
+FILAS_MAXIMAS_EXCEL = 1_000_000
+
+# Nombre del archivo que describe los datos generados en una carpeta, para poder reutilizarlos
+ARCHIVO_DESCRIPCION = "datos_sinteticos.json"
+
+
+class GeneradorDatosSinteticos:
+    """
+    Esta clase permite generar la carpeta crudos/ con documentos sintéticos en los mismos formatos
+    que leen cada una de las bases de datos de GeneradorPlanillaFinanzas:
+
+    - SII: CSV separados por ";" con las columnas COLUMNAS_SII_*, un archivo por tipo y mes.
+    - ACEPTA: Excel (.xlsx) con las columnas COLUMNAS_ACEPTA y las referencias en JSON. ACEPTA
+    exporta .xls, pero sin xlwt no se pueden escribir, por lo que la lectura de .xls con xlrd no
+    se mide con estos datos.
+    - SIGFE: CSV con 10 filas de encabezado antes de las columnas, y montos con separador de miles.
+    - SCI y OBSERVACIONES: CSV por año.
+    - TURBO, SIGFE_REPORTS y MAESTRO_ARTICULOS: Excel con filas de encabezado antes de las
+    columnas. LEY_PRESUPUESTOS: Excel sin encabezado.
+
+    Las Notas de Crédito/Débito referencian a una Factura del mismo proveedor, y todas las
+    cantidades escalan con n_documentos, por lo que se pueden generar desde mil hasta varios
+    millones de documentos. Con la misma semilla siempre se generan los mismos archivos.
+    """
+
+    def __init__(self, n_documentos, años=None, semilla=0):
+        """
+        - n_documentos: Cantidad total de documentos del SII, repartidos entre todos los años.
+        - años: Años de los documentos. Si es None, se usan los últimos 3 años.
+        - semilla: Semilla del generador de números aleatorios.
+        """
+        año_actual = pd.Timestamp.today().year
+        self.n_documentos = n_documentos
+        self.años = list(años) if años is not None else list(range(año_actual - 2, año_actual + 1))
+        self.semilla = semilla
+        self.rng = np.random.default_rng(semilla)
+
+    def generar(self, carpeta="."):
+        """
+        Esta función genera todos los archivos dentro de carpeta/crudos, y un archivo que
+        describe los datos generados (ARCHIVO_DESCRIPCION).
+        """
+        print(f"Generando {self.n_documentos} documentos sintéticos en {carpeta}...")
+        documentos = self.generar_documentos()
+        ordenes_de_compra = self.generar_ordenes_de_compra()
+
+        self.escribir_sii(documentos, carpeta)
+        self.escribir_acepta(documentos, carpeta)
+        self.escribir_sigfe(documentos, carpeta)
+        self.escribir_sci(documentos, carpeta)
+        self.escribir_turbo(documentos, carpeta)
+        self.escribir_observaciones(documentos, carpeta)
+        self.escribir_sigfe_reports(ordenes_de_compra, carpeta)
+        self.escribir_maestro_articulos(carpeta)
+        self.escribir_ley_presupuestos(carpeta)
+
+        with open(os.path.join(carpeta, ARCHIVO_DESCRIPCION), "w", encoding="utf-8") as archivo:
+            json.dump(self.obtener_descripcion(), archivo, indent=2)
+
+        print("Listo! Se generaron los datos sintéticos")
+
+    def obtener_descripcion(self):
+        return {
+            "version": VERSION_DATOS_SINTETICOS,
+            "n_documentos": self.n_documentos,
+            "años": self.años,
+            "semilla": self.semilla,
+        }
+
+    def generar_documentos(self):
+        """
+        Esta función genera la tabla de documentos del SII, con una fila por documento. Los
+        montos de las Notas de Crédito/Débito son una fracción del monto de la Factura que
+        referencian.
+        """
+        n = self.n_documentos
+        n_proveedores = max(10, n // DOCUMENTOS_POR_PROVEEDOR)
+        cuerpos_rut_proveedores = self.rng.choice(
+            np.arange(60_000_000, 100_000_000), size=n_proveedores, replace=False
+        )
+
+        documentos = pd.DataFrame(
+            {
+                "Tipo Doc": self.rng.choice(
+                    list(PROPORCION_TIPOS_DOCUMENTO),
+                    size=n,
+                    p=list(PROPORCION_TIPOS_DOCUMENTO.values()),
+                ),
+                "cuerpo_rut": cuerpos_rut_proveedores[self.rng.integers(0, n_proveedores, n)],
+                # Folios distintos entre todos los documentos, para que no se repitan llaves
+                "Folio": self.rng.permutation(n) + 1,
+                "año": self.rng.choice(self.años, size=n),
+                "dia_del_año": self.rng.integers(0, 365, n),
+                "Monto Neto": np.round(self.rng.lognormal(13, 1.5, n)).astype("int64") + 1000,
+                "estado_sii": self.rng.choice(
+                    list(PROPORCION_ESTADOS_SII), size=n, p=list(PROPORCION_ESTADOS_SII.values())
+                ),
+            }
+        )
+
+        # Cada Nota referencia a una Factura al azar, y se le asigna el proveedor de esa Factura
+        mask_notas = documentos["Tipo Doc"].isin([56, 61]).to_numpy()
+        posiciones_facturas = np.flatnonzero(documentos["Tipo Doc"].to_numpy() == 33)
+        posiciones_referencias = np.full(n, -1)
+        posiciones_referencias[mask_notas] = self.rng.choice(
+            posiciones_facturas, size=mask_notas.sum()
+        )
+        documentos["posicion_referencia"] = posiciones_referencias
+        referenciadas = posiciones_referencias[mask_notas]
+        documentos.loc[mask_notas, "cuerpo_rut"] = documentos["cuerpo_rut"].to_numpy()[
+            referenciadas
+        ]
+        documentos.loc[mask_notas, "Monto Neto"] = (
+            documentos["Monto Neto"].to_numpy()[referenciadas]
+            * self.rng.uniform(0.05, 1, n)[mask_notas]
+        ).astype("int64")
+
+        dv = pd.Series(
+            self.calcular_dv(documentos["cuerpo_rut"].to_numpy()), index=documentos.index
+        )
+        documentos["RUT Proveedor"] = documentos["cuerpo_rut"].astype(str) + "-" + dv
+        documentos["RUT con puntos"] = (
+            self.formatear_rut_con_puntos(documentos["cuerpo_rut"]) + "-" + dv
+        )
+        documentos["Razon Social"] = "PROVEEDOR " + documentos["cuerpo_rut"].astype(str)
+
+        documentos["Fecha Docto"] = pd.to_datetime(
+            documentos["año"].astype(str) + "-01-01"
+        ) + pd.to_timedelta(documentos["dia_del_año"], unit="D")
+        documentos["Fecha Recepcion"] = documentos["Fecha Docto"] + pd.to_timedelta(
+            self.rng.integers(0, 5 * 24 * 3600, n), unit="s"
+        )
+
+        es_exenta = (documentos["Tipo Doc"] == 34).to_numpy()
+        documentos["Monto Exento"] = np.where(es_exenta, documentos["Monto Neto"], 0)
+        documentos["Monto Neto"] = np.where(es_exenta, 0, documentos["Monto Neto"])
+        documentos["Monto IVA Recuperable"] = np.round(documentos["Monto Neto"] * 0.19).astype(
+            "int64"
+        )
+        documentos["Monto Total"] = (
+            documentos["Monto Exento"]
+            + documentos["Monto Neto"]
+            + documentos["Monto IVA Recuperable"]
+        )
+
+        return documentos
+
+    def calcular_dv(self, cuerpos_rut):
+        """
+        Esta función calcula el dígito verificador (módulo 11) de cada cuerpo de RUT.
+        """
+        suma = np.zeros_like(cuerpos_rut)
+        resto = cuerpos_rut.copy()
+        for posicion in range(9):
+            suma += (resto % 10) * (2 + posicion % 6)
+            resto //= 10
+
+        dv = 11 - suma % 11
+        return np.select([dv == 11, dv == 10], ["0", "K"], dv.astype(str))
+
+    def formatear_rut_con_puntos(self, cuerpos_rut):
+        """
+        Esta función formatea cada cuerpo de RUT con separador de miles (ej: 76.123.456), como
+        vienen en SCI y SIGFE.
+        """
+        return (
+            (cuerpos_rut // 1_000_000).astype(str)
+            + "."
+            + (cuerpos_rut // 1000 % 1000).astype(str).str.zfill(3)
+            + "."
+            + (cuerpos_rut % 1000).astype(str).str.zfill(3)
+        )
+
+    def obtener_muestra(self, documentos, base_de_datos):
+        mask_muestra = (
+            self.rng.random(len(documentos)) < PROPORCION_DOCUMENTOS_POR_BASE[base_de_datos]
+        )
+        return documentos[mask_muestra]
+
+    def generar_ordenes_de_compra(self):
+        ordenes_de_compra = []
+        for año in self.años:
+            correlativos = np.arange(1, ORDENES_DE_COMPRA_POR_AÑO + 1)
+            ordenes_de_compra.append(
+                pd.DataFrame(
+                    {
+                        "Número Documento": [
+                            f"1057-{correlativo}-SE{año % 100}" for correlativo in correlativos
+                        ],
+                        "Monto Disponible": self.rng.integers(0, 10_000_000, len(correlativos)),
+                        "Folio": correlativos + año * 10_000,
+                        "Concepto Presupuesto": self.rng.choice(
+                            ["22 04", "22 05", "29 05"], len(correlativos)
+                        ),
+                        "año": año,
+                    }
+                )
+            )
+
+        return pd.concat(ordenes_de_compra, ignore_index=True)
+
+    def obtener_carpeta(self, carpeta, tipo_documento, base_de_datos):
+        carpeta_base = os.path.join(
+            carpeta, "crudos", f"base_de_datos_{tipo_documento}", base_de_datos
+        )
+        os.makedirs(carpeta_base, exist_ok=True)
+
+        return carpeta_base
+
+    def escribir_excel_por_partes(self, df, ruta_sin_extension, extension, filas_encabezado):
+        """
+        Esta función escribe df en uno o más archivos Excel de a lo más FILAS_MAXIMAS_EXCEL filas,
+        dejando filas_encabezado filas vacías antes de las columnas.
+        """
+        for inicio in range(0, max(len(df), 1), FILAS_MAXIMAS_EXCEL):
+            parte = inicio // FILAS_MAXIMAS_EXCEL
+            ruta = f"{ruta_sin_extension}{f' parte {parte + 1}' if parte else ''}{extension}"
+            with pd.ExcelWriter(ruta, engine="openpyxl") as escritor:
+                df.iloc[inicio : inicio + FILAS_MAXIMAS_EXCEL].to_excel(
+                    escritor, startrow=filas_encabezado, index=False
+                )
+
+    def escribir_sii(self, documentos, carpeta):
+        """
+        Esta función escribe un archivo del SII por tipo de archivo y mes. Una parte de los
+        documentos registrados también se escribe en los pendientes, como ocurre en el SII.
+        """
+        print("Escribiendo SII")
+        carpeta_sii = self.obtener_carpeta(carpeta, "facturas", "SII")
+        columnas_por_estado = {
+            "REGISTRO": COLUMNAS_SII_REGISTRO_O_NO_INCLUIR,
+            "NO_INCLUIR": COLUMNAS_SII_REGISTRO_O_NO_INCLUIR,
+            "PENDIENTE": COLUMNAS_SII_PENDIENTES,
+            "RECLAMADO": COLUMNAS_SII_RECLAMADAS,
+        }
+
+        duplicados = documentos[
+            (documentos["estado_sii"] == "REGISTRO")
+            & (self.rng.random(len(documentos)) < PROPORCION_DUPLICADOS_PENDIENTES)
+        ].assign(estado_sii="PENDIENTE")
+        documentos_sii = pd.concat([documentos, duplicados])
+
+        documentos_sii = documentos_sii.assign(
+            **{
+                "Nro": 1,
+                "Tipo Compra": "Del Giro",
+                "Fecha Acuse": "",
+                "Fecha Reclamo": documentos_sii["Fecha Recepcion"].dt.strftime("%d/%m/%Y %H:%M:%S"),
+                "mes": documentos_sii["Fecha Docto"].dt.month,
+            }
+        )
+        documentos_sii["Fecha Docto"] = documentos_sii["Fecha Docto"].dt.strftime("%d/%m/%Y")
+        documentos_sii["Fecha Recepcion"] = documentos_sii["Fecha Recepcion"].dt.strftime(
+            "%d/%m/%Y %H:%M:%S"
+        )
+
+        for (estado, año, mes), documentos_archivo in documentos_sii.groupby(
+            ["estado_sii", "año", "mes"]
+        ):
+            columnas = ["Nro", "Tipo Doc", "Tipo Compra"] + [
+                columna for columna in columnas_por_estado[estado] if columna != "Tipo Doc"
+            ]
+            ruta = os.path.join(
+                carpeta_sii, f"RCV_COMPRA_{estado}_{RUT_RECEPTOR}_{año}{mes:02d}.csv"
+            )
+            documentos_archivo[columnas].to_csv(ruta, sep=";", index=False)
+
+    def escribir_acepta(self, documentos, carpeta):
+        """
+        Esta función escribe un Excel de ACEPTA por año. Las Notas de Crédito/Débito traen en
+        referencias un JSON con la Factura que referencian (y una referencia interna que no es
+        documento, como en ACEPTA). Cada documento se asocia a una orden de compra de su año.
+        """
+        print("Escribiendo ACEPTA")
+        carpeta_acepta = self.obtener_carpeta(carpeta, "facturas", "ACEPTA")
+        acepta = self.obtener_muestra(documentos, "ACEPTA")
+        n = len(acepta)
+
+        posiciones_referencias = acepta["posicion_referencia"].to_numpy()
+        mask_notas = posiciones_referencias >= 0
+        tipos_referencia = documentos["Tipo Doc"].to_numpy()[posiciones_referencias[mask_notas]]
+        folios_referencia = documentos["Folio"].to_numpy()[posiciones_referencias[mask_notas]]
+        referencias = np.full(n, None, dtype=object)
+        referencias[mask_notas] = [
+            json.dumps(
+                [
+                    {"Tipo": "801", "Folio": "1", "Fecha": "", "Razon": "Orden de Compra"},
+                    {"Tipo": str(tipo), "Folio": f"{folio:08d}", "Fecha": "", "Razon": ""},
+                ]
+            )
+            for tipo, folio in zip(tipos_referencia, folios_referencia)
+        ]
+
+        folios_oc = (
+            "1057-"
+            + pd.Series(self.rng.integers(1, ORDENES_DE_COMPRA_POR_AÑO + 1, n)).astype(str)
+            + "-SE"
+            + pd.Series(acepta["año"].to_numpy() % 100).astype(str).str.zfill(2)
+        )
+        acepta = pd.DataFrame(
+            {
+                "tipo": acepta["Tipo Doc"].to_numpy(),
+                "folio": acepta["Folio"].to_numpy(),
+                "emisor": acepta["RUT Proveedor"].to_numpy(),
+                "publicacion": acepta["Fecha Recepcion"]
+                .dt.strftime("%Y-%m-%d %H:%M:%S")
+                .to_numpy(),
+                "estado_acepta": self.rng.choice(["ACEPTADO", "RECHAZADO", "PENDIENTE"], n),
+                "estado_sii": self.rng.choice(["ACEPTADO", "RECLAMADO"], n, p=[0.95, 0.05]),
+                "referencias": referencias,
+                "estado_nar": self.rng.choice(["ACEPTADO", "SIN NAR"], n),
+                "estado_devengo": self.rng.choice(["DEVENGADO", "NO DEVENGADO"], n),
+                "folio_oc": folios_oc.to_numpy(),
+                "folio_rc": None,
+                "fecha_ingreso_rc": None,
+                "folio_sigfe": np.where(
+                    self.rng.random(n) < 0.5, self.rng.integers(1, 99999, n), None
+                ),
+                "tarea_actual": self.rng.choice(["Revisión", "Aprobación", "Finalizado"], n),
+                "estado_cesion": None,
+                "año": acepta["año"].to_numpy(),
+            }
+        )
+
+        for año, acepta_año in acepta.groupby("año"):
+            self.escribir_excel_por_partes(
+                acepta_año[list(COLUMNAS_ACEPTA)],
+                os.path.join(carpeta_acepta, f"ACEPTA {año}"),
+                ".xlsx",
+                filas_encabezado=0,
+            )
+
+    def escribir_sigfe(self, documentos, carpeta):
+        """
+        Esta función escribe un CSV de SIGFE por año, con un movimiento de devengo (Haber) por
+        documento y un movimiento de pago (Debe) para una parte de ellos. Cada archivo trae 10
+        filas de encabezado, y el encabezado de las columnas se repite a mitad del archivo (como
+        en los reportes con más de una página).
+        """
+        print("Escribiendo SIGFE")
+        carpeta_sigfe = self.obtener_carpeta(carpeta, "facturas", "SIGFE")
+        devengos = self.obtener_muestra(documentos, "SIGFE")
+        pagos = devengos[self.rng.random(len(devengos)) < PROPORCION_PAGADOS_SIGFE]
+
+        movimientos = pd.concat([devengos.assign(es_pago=False), pagos.assign(es_pago=True)])
+        movimientos = movimientos.sort_values(["año", "Fecha Docto"], kind="stable")
+        montos = movimientos["Monto Total"].abs().map("{:,}".format).str.replace(",", ".")
+        movimientos = pd.DataFrame(
+            {
+                "Cuenta Contable": "2152201",
+                "Principal": (
+                    movimientos["RUT con puntos"] + " " + movimientos["Razon Social"]
+                ).to_numpy(),
+                "Folio": np.arange(len(movimientos)) + 1,
+                "Número ": movimientos["Folio"].to_numpy(),
+                "Fecha": (
+                    movimientos["Fecha Docto"]
+                    + pd.to_timedelta(np.where(movimientos["es_pago"], 30, 5), unit="D")
+                )
+                .dt.strftime("%d/%m/%Y")
+                .to_numpy(),
+                "Debe": np.where(movimientos["es_pago"], montos, "0"),
+                "Haber": np.where(movimientos["es_pago"], "0", montos),
+                "año": movimientos["año"].to_numpy(),
+            }
+        )
+
+        for año, movimientos_año in movimientos.groupby("año"):
+            movimientos_año = movimientos_año.drop(columns="año")
+            mitad = len(movimientos_año) // 2
+            with open(
+                os.path.join(carpeta_sigfe, f"SIGFE {año}.csv"), "w", encoding="utf-8"
+            ) as archivo:
+                for numero_linea in range(10):
+                    archivo.write(f"Cartola SIGFE {año} - línea de encabezado {numero_linea + 1}\n")
+                movimientos_año.iloc[:mitad].to_csv(archivo, index=False)
+                movimientos_año.iloc[mitad:].to_csv(archivo, index=False)
+
+    def escribir_sci(self, documentos, carpeta):
+        print("Escribiendo SCI")
+        carpeta_sci = self.obtener_carpeta(carpeta, "facturas", "SCI")
+        sci = self.obtener_muestra(documentos, "SCI")
+        sci = pd.DataFrame(
+            {
+                "Rut Proveedor": sci["RUT con puntos"].to_numpy(),
+                "Numero Documento": sci["Folio"].to_numpy(dtype=float),
+                "Fecha Recepción": sci["Fecha Recepcion"].dt.strftime("%d/%m/%Y").to_numpy(),
+                "Registrador": self.rng.choice(
+                    [f"REGISTRADOR {i}" for i in range(1, 11)], len(sci)
+                ),
+                "Codigo Articulo": self.rng.integers(1, CANTIDAD_ARTICULOS + 1, len(sci)),
+                "Articulo": "ARTICULO",
+                "N° Acta": self.rng.integers(1, 100_000, len(sci)),
+                "año": sci["año"].to_numpy(),
+            }
+        )
+
+        for año, sci_año in sci.groupby("año"):
+            sci_año.drop(columns="año").to_csv(
+                os.path.join(carpeta_sci, f"SCI {año}.csv"), index=False
+            )
+
+    def escribir_turbo(self, documentos, carpeta):
+        print("Escribiendo TURBO")
+        carpeta_turbo = self.obtener_carpeta(carpeta, "facturas", "TURBO")
+        turbo = self.obtener_muestra(documentos, "TURBO")
+        # La mayoría de los montos de bodega coinciden con el SII
+        montos = np.where(
+            self.rng.random(len(turbo)) < 0.9, turbo["Monto Total"], turbo["Monto Total"] + 1
+        )
+        turbo = pd.DataFrame(
+            {
+                "Rut": turbo["RUT Proveedor"].to_numpy(),
+                "Folio": np.arange(len(turbo)) + 1,
+                "NºDoc.": turbo["Folio"].to_numpy(dtype=float),
+                "Monto": montos.astype(float),
+                "Ubic.": self.rng.choice(["BODEGA 1", "BODEGA 2", "FARMACIA"], len(turbo)),
+                "NºPresu": self.rng.integers(1, 1000, len(turbo)),
+                "NºPago": self.rng.integers(1, 1000, len(turbo)),
+                "año": turbo["año"].to_numpy(),
+            }
+        )
+
+        for año, turbo_año in turbo.groupby("año"):
+            self.escribir_excel_por_partes(
+                turbo_año.drop(columns="año"),
+                os.path.join(carpeta_turbo, f"TURBO {año}"),
+                ".xlsx",
+                filas_encabezado=3,
+            )
+
+    def escribir_observaciones(self, documentos, carpeta):
+        print("Escribiendo OBSERVACIONES")
+        carpeta_observaciones = self.obtener_carpeta(carpeta, "facturas", "OBSERVACIONES")
+        observaciones = self.obtener_muestra(documentos, "OBSERVACIONES")
+        observaciones = pd.DataFrame(
+            {
+                "RUT_Emisor_SII": observaciones["RUT Proveedor"].to_numpy(),
+                "Folio_SII": observaciones["Folio"].to_numpy(),
+                "OBSERVACION_OBSERVACIONES": "Revisar con el proveedor",
+                "año": observaciones["año"].to_numpy(),
+            }
+        )
+
+        for año in self.años:
+            observaciones_año = observaciones[observaciones["año"] == año].drop(columns="año")
+            observaciones_año.to_csv(
+                os.path.join(carpeta_observaciones, f"OBSERVACIONES {año}.csv"),
+                sep=";",
+                index=False,
+            )
+
+    def escribir_sigfe_reports(self, ordenes_de_compra, carpeta):
+        print("Escribiendo SIGFE_REPORTS")
+        carpeta_oc = self.obtener_carpeta(carpeta, "oc", "SIGFE_REPORTS")
+        for año, ordenes_año in ordenes_de_compra.groupby("año"):
+            self.escribir_excel_por_partes(
+                ordenes_año.drop(columns="año"),
+                os.path.join(carpeta_oc, f"OC {año}"),
+                ".xlsx",
+                filas_encabezado=5,
+            )
+
+    def escribir_maestro_articulos(self, carpeta):
+        print("Escribiendo MAESTRO_ARTICULOS")
+        carpeta_maestro = self.obtener_carpeta(carpeta, "articulos", "MAESTRO_ARTICULOS")
+        codigos = np.arange(1, CANTIDAD_ARTICULOS + 1)
+        maestro = pd.DataFrame(
+            {
+                "Código": codigos,
+                "Familia": [f"FAMILIA {codigo % 20}" for codigo in codigos],
+                "Items": 2204000 + codigos % CANTIDAD_ITEMS_PRESUPUESTO,
+                "Nombre Items": [
+                    f"ITEM {codigo % CANTIDAD_ITEMS_PRESUPUESTO}" for codigo in codigos
+                ],
+            }
+        )
+        self.escribir_excel_por_partes(
+            maestro,
+            os.path.join(carpeta_maestro, f"MAESTRO ARTICULOS {max(self.años)}"),
+            ".xlsx",
+            filas_encabezado=3,
+        )
+
+    def escribir_ley_presupuestos(self, carpeta):
+        print("Escribiendo LEY_PRESUPUESTOS")
+        carpeta_ley = self.obtener_carpeta(carpeta, "articulos", "LEY_PRESUPUESTOS")
+        items = 2204000 + np.arange(CANTIDAD_ITEMS_PRESUPUESTO)
+        ley = pd.DataFrame(
+            {"Numero_Concepto": items, "Cargar_en": [f"22.04.{item % 1000:03d}" for item in items]}
+        )
+        self.escribir_excel_por_partes(
+            ley,
+            os.path.join(carpeta_ley, f"LEY PRESUPUESTOS {max(self.años)}"),
+            ".xlsx",
+            filas_encabezado=0,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una carpeta crudos/ con datos sintéticos.")
+    parser.add_argument("carpeta", help="Carpeta donde se crea crudos/")
+    parser.add_argument("-n", "--n-documentos", type=int, default=10_000)
+    parser.add_argument("--años", type=int, nargs="+", default=None)
+    parser.add_argument("--semilla", type=int, default=0)
+    argumentos = parser.parse_args()
+
+    generador = GeneradorDatosSinteticos(
+        argumentos.n_documentos, argumentos.años, argumentos.semilla
+    )
+    generador.generar(argumentos.carpeta)
@@ -3,16 +3,31 @@ Este es un programa para generar la planilla de Control de Facturas. Unidad de F
 Javier Rojas Benítez
 """
 
+import argparse
+import contextlib
 import datetime
+import functools
 import glob
+import hashlib
+import importlib.util
 import json
+import multiprocessing
 import os
+import re
+import sqlite3
+import threading
 import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 
 import numpy as np
 import pandas as pd
-
-pd.options.mode.chained_assignment = None  # default='warn'
+import pyarrow as pa
+import pyarrow.compute as pc
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
 
 COLUMNAS_SII_REGISTRO_O_NO_INCLUIR = {
     "Tipo Doc": int,
@@ -55,6 +70,96 @@ COLUMNAS_SII_RECLAMADAS = {
     "Monto Total": "Int64",
 }
 
+# Columnas de fecha de los archivos del SII, con su formato de FORMATOS_FECHA. Se convierten al
+# leer cada archivo, por lo que el cache de lectura ya guarda las fechas convertidas
+FECHAS_SII = {
+    "Fecha Docto": "Fecha_Docto_SII",
+    "Fecha Recepcion": "Fecha_Recepcion_SII",
+    "Fecha Acuse": "Fecha_Reclamo_SII",
+    "Fecha Reclamo": "Fecha_Reclamo_SII",
+}
+
+# Tipos de datos que se asignan a cada base de datos apenas se lee. Las columnas de texto con
+# pocos valores distintos (estados, registradores, familias, etc) se guardan como category
+TIPOS_DATOS_LECTURA = {
+    "SII": {"Razon Social": "category"},
+    "ACEPTA": {
+        "estado_acepta": "category",
+        "estado_sii": "category",
+        "estado_nar": "category",
+        "estado_devengo": "category",
+        "tarea_actual": "category",
+        "estado_cesion": "category",
+    },
+    "SCI": {"Registrador": "category", "Articulo": "category"},
+    "TURBO": {"Ubic.": "category"},
+    "SIGFE_REPORTS": {"Concepto Presupuesto": "category"},
+    "MAESTRO_ARTICULOS": {"Familia": "category", "Nombre Items": "category"},
+    "LEY_PRESUPUESTOS": {"Cargar_en": "category"},
+}
+
+# Formatos de las fechas de cada fuente. Se prueban en orden, y sólo las fechas que no calzan con
+# ninguno se leen con el lector flexible de pandas (mucho más lento)
+FORMATOS_FECHA = {
+    "Fecha_Docto_SII": ["%d/%m/%Y"],
+    "Fecha_Recepcion_SII": ["%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y"],
+    "Fecha_Reclamo_SII": ["%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y"],
+    "Fecha_SIGFE": ["%d/%m/%Y"],
+    "Fecha_Recepción_SCI": ["%d/%m/%Y"],
+    "publicacion_ACEPTA": ["%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S"],
+}
+
+# Período que cubre cada archivo crudo según su nombre: un mes (RCV_COMPRA_REGISTRO_202403.csv o
+# SIGFE 2024-03.csv), o uno o más años (SIGFE 2024.csv)
+PATRON_MES_ARCHIVO = r"(?<!\d)(20\d{2})[-_]?(0[1-9]|1[0-2])(?!\d)"
+PATRON_AÑO_ARCHIVO = r"(?<!\d)(20\d{2})(?!\d)"
+
+# Si el nombre de un archivo no indica su período, se obtiene leyendo sólo esta columna de fecha
+# (con el formato de FORMATOS_FECHA y los parámetros de lectura indicados). Los archivos de otras
+# bases de datos sin período en el nombre se leen siempre.
+SONDEO_PERIODO_ARCHIVOS = {
+    "SII": ("Fecha Docto", "Fecha_Docto_SII", {"delimiter": ";"}),
+    "ACEPTA": ("publicacion", "publicacion_ACEPTA", {}),
+    "SCI": ("Fecha Recepción", "Fecha_Recepción_SCI", {"delimiter": ","}),
+    "SIGFE": ("Fecha", "Fecha_SIGFE", {"delimiter": ",", "header": 10}),
+}
+
+# Motores con que se pueden leer los archivos Excel, en orden de preferencia: el módulo que
+# necesita cada uno y los formatos que sabe leer ("xlsx" para los archivos zip y "xls" para el
+# formato binario antiguo). calamine es el más rápido, pero es opcional (pip install
+# python-calamine). openpyxl lee en modo read-only, sin cargar estilos ni fórmulas.
+MOTORES_EXCEL = {
+    "calamine": ("python_calamine", ["xlsx", "xls"]),
+    "openpyxl": ("openpyxl", ["xlsx"]),
+    "xlrd": ("xlrd", ["xls"]),
+}
+
+# Primeros bytes de cada formato de Excel. Los archivos .xls de ACEPTA a veces son xlsx (y al
+# guardarlos desde Excel quedan .xlsx), por lo que el formato se obtiene del contenido y no de la
+# extensión.
+FIRMAS_FORMATO_EXCEL = {
+    b"PK\x03\x04": "xlsx",
+    b"\xd0\xcf\x11\xe0": "xls",
+}
+
+# Bases de datos que se leen desde archivos Excel
+BASES_DE_DATOS_EXCEL = ["ACEPTA", "TURBO", "SIGFE_REPORTS", "MAESTRO_ARTICULOS", "LEY_PRESUPUESTOS"]
+
+# Agregaciones de los movimientos de SIGFE por documento (RUT Emisor + Folio). Todas se calculan
+# en una sola agrupación. Las opcionales se agregan con agregaciones_sigfe_extra
+AGREGACIONES_SIGFE = {
+    "Fecha DEVENGO": ("Fecha DEVENGO", "min"),
+    "Folio_interno DEVENGO": ("Folio_interno DEVENGO", "min"),
+    "Fecha PAGO": ("Fecha PAGO", "min"),
+    "Folio_interno PAGO": ("Folio_interno PAGO", "min"),
+}
+
+AGREGACIONES_SIGFE_OPCIONALES = {
+    "Fecha ULTIMO_PAGO": ("Fecha PAGO", "max"),
+    "Cantidad MOVIMIENTOS": ("Folio_interno", "count"),
+    "Total DEBE": ("Debe", "sum"),
+    "Total HABER": ("Haber", "sum"),
+}
 
 COLUMNAS_ACEPTA = {
     "tipo": int,
@@ -74,6 +179,515 @@ COLUMNAS_ACEPTA = {
     "estado_cesion": str,
 }
 
+# Las carpetas de CARPETA_CACHE se ubican dentro de la carpeta de entrada (la que contiene crudos/),
+# y las de CARPETA_ESTADO, CARPETA_HISTORICO, CARPETA_REPORTES_CORRIDAS y el CSV del histórico
+# dentro de la carpeta de salida. Por defecto ambas son la carpeta desde donde se corre el programa.
+
+# Carpeta donde se guardan las lecturas ya procesadas de cada archivo crudo. Si se cambia la forma
+# en que se normaliza algun archivo, se debe aumentar la VERSION_CACHE para invalidar el cache.
+CARPETA_CACHE = os.path.join("crudos", ".cache_lectura")
+VERSION_CACHE = 5
+
+# Los archivos Excel se leen con el pool de procesos de la corrida sólo si los que no están en el
+# cache son más de uno y suman al menos estos bytes. Lanzar los procesos (spawn) toma cerca de un
+# segundo, y openpyxl lee cerca de 1 MB por segundo, por lo que con menos conviene leerlos aquí.
+BYTES_MINIMOS_POOL_PROCESOS = 4 * 1024**2
+
+# Base SQLite con las observaciones manuales de cada documento (llave_id). Se actualiza con los
+# archivos de OBSERVACIONES que cambiaron desde la última importación, o directamente con
+# actualizar_observaciones, y se lee en vez de esos archivos.
+ARCHIVO_OBSERVACIONES = os.path.join("crudos", "observaciones.sqlite")
+ESQUEMA_OBSERVACIONES = """
+CREATE TABLE IF NOT EXISTS observaciones (
+    llave_id TEXT PRIMARY KEY,
+    rut_emisor TEXT NOT NULL,
+    folio TEXT NOT NULL,
+    observacion TEXT NOT NULL,
+    creado TEXT NOT NULL,
+    actualizado TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archivos_importados (
+    archivo TEXT PRIMARY KEY,
+    modificado_ns INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+"""
+
+# Carpeta donde se guardan las huellas de cada base de datos y el listado de archivos leídos en
+# la última corrida. La usa el modo incremental.
+CARPETA_ESTADO = "estado_planilla"
+
+# Carpeta con la planilla histórica en Parquet. Tiene una partición por año de Fecha_Docto_SII
+# (control_facturas_historico/anio=2024/planilla.parquet)
+CARPETA_HISTORICO = "control_facturas_historico"
+ARCHIVO_HISTORICO_CSV = "control_facturas_historico.csv"
+
+# Archivo que se reescribe (dentro de CARPETA_HISTORICO) cada vez que terminan de guardarse las
+# particiones de una corrida. Quien lee el histórico mientras se actualiza (ej: consultar_planilla)
+# lo vigila para saber cuándo hay una planilla nueva completa.
+ARCHIVO_PUBLICACION_HISTORICO = "publicacion.json"
+
+# Archivo (dentro de CARPETA_HISTORICO) con los arcos del grafo de referencias de la última corrida
+# (cada nota y los documentos que referencia). Cuando sólo se lee un período, se reemplazan los
+# arcos de las notas leídas en vez de volver a leer todos los archivos del SII y ACEPTA.
+ARCHIVO_ARCOS_REFERENCIAS = "referencias.parquet"
+
+# Excel con la planilla histórica (con exportar_excel), con una hoja por año de Fecha_Docto_SII.
+# Las columnas de FORMATOS_EXCEL se escriben como fechas o números con ese formato, y el resto
+# como texto o número sin formato. Si un año no cabe en FILAS_MAXIMAS_HOJA_EXCEL filas, sigue en
+# otra hoja (2024 (2)). Las filas se convierten a valores de Excel de a FILAS_POR_BLOQUE_EXCEL.
+ARCHIVO_HISTORICO_EXCEL = "control_facturas_historico.xlsx"
+FORMATOS_EXCEL = {
+    "Fecha_Docto_SII": "dd/mm/yyyy",
+    "Fecha_Recepcion_SII": "dd/mm/yyyy hh:mm:ss",
+    "Fecha_Reclamo_SII": "dd/mm/yyyy hh:mm:ss",
+    "Monto_Exento_SII": "#,##0",
+    "Monto_Neto_SII": "#,##0",
+    "Monto_IVA_Recuperable_SII": "#,##0",
+    "Monto_Total_SII": "#,##0",
+    "Monto_Disponible_OC": "#,##0",
+    "Fecha_DEVENGO_SIGFE": "dd/mm/yyyy",
+    "Fecha_PAGO_SIGFE": "dd/mm/yyyy",
+    "Monto_TURBO": "#,##0",
+    "tiempo_diferencia_SII": "0.00",
+    "Saldo_Neto_Referencias": "#,##0",
+}
+FILAS_MAXIMAS_HOJA_EXCEL = 1_048_576
+FILAS_POR_BLOQUE_EXCEL = 50_000
+
+# Carpeta donde se guarda un reporte JSON de cada corrida, con el tiempo, filas y memoria de cada
+# etapa. Al final de cada corrida se compara contra las CORRIDAS_A_COMPARAR anteriores del mismo
+# modo, y se avisa de las etapas que tardaron más de UMBRAL_REGRESION veces lo habitual (sólo si
+# tardaron al menos MINIMO_SEGUNDOS_REGRESION, para no avisar por etapas instantáneas).
+CARPETA_REPORTES_CORRIDAS = "reportes_corridas"
+CORRIDAS_A_COMPARAR = 5
+UMBRAL_REGRESION = 1.5
+MINIMO_SEGUNDOS_REGRESION = 0.5
+
+# Plazo (en días hábiles siguientes a la recepción en el SII) para aceptar o reclamar un
+# documento, y límites de los tramos de antigüedad en días hábiles (0-8, 9-30, 31-60 y >60)
+PLAZO_DIAS_HABILES_SII = 8
+LIMITES_TRAMOS_ANTIGUEDAD = [8, 30, 60]
+
+# Feriados nacionales de Chile (una fecha y su nombre por línea). Los días hábiles son de lunes
+# a viernes, sin estos feriados ni los de ARCHIVO_FERIADOS_LOCALES (columnas fecha;nombre, con
+# fechas 2024-09-20), que permite agregar feriados nuevos o locales sin cambiar el programa. Al
+# agregar o corregir feriados aquí, se debe subir VERSION_FERIADOS (queda en el reporte de cada
+# corrida).
+VERSION_FERIADOS = 1
+ARCHIVO_FERIADOS_LOCALES = os.path.join("crudos", "feriados.csv")
+FERIADOS_CHILE = """
+2022-01-01 Año Nuevo
+2022-04-15 Viernes Santo
+2022-04-16 Sábado Santo
+2022-05-01 Día del Trabajo
+2022-05-21 Día de las Glorias Navales
+2022-06-21 Día de los Pueblos Indígenas
+2022-06-27 San Pedro y San Pablo
+2022-07-16 Virgen del Carmen
+2022-08-15 Asunción de la Virgen
+2022-09-04 Plebiscito
+2022-09-16 Feriado adicional Fiestas Patrias
+2022-09-18 Independencia Nacional
+2022-09-19 Glorias del Ejército
+2022-10-10 Encuentro de Dos Mundos
+2022-10-31 Día de las Iglesias Evangélicas
+2022-11-01 Día de Todos los Santos
+2022-12-08 Inmaculada Concepción
+2022-12-25 Navidad
+2023-01-01 Año Nuevo
+2023-01-02 Feriado adicional Año Nuevo
+2023-04-07 Viernes Santo
+2023-04-08 Sábado Santo
+2023-05-01 Día del Trabajo
+2023-05-21 Día de las Glorias Navales
+2023-06-21 Día de los Pueblos Indígenas
+2023-06-26 San Pedro y San Pablo
+2023-07-16 Virgen del Carmen
+2023-08-15 Asunción de la Virgen
+2023-09-18 Independencia Nacional
+2023-09-19 Glorias del Ejército
+2023-10-09 Encuentro de Dos Mundos
+2023-10-27 Día de las Iglesias Evangélicas
+2023-11-01 Día de Todos los Santos
+2023-12-08 Inmaculada Concepción
+2023-12-17 Plebiscito
+2023-12-25 Navidad
+2024-01-01 Año Nuevo
+2024-03-29 Viernes Santo
+2024-03-30 Sábado Santo
+2024-05-01 Día del Trabajo
+2024-05-21 Día de las Glorias Navales
+2024-06-09 Elecciones primarias
+2024-06-20 Día de los Pueblos Indígenas
+2024-06-29 San Pedro y San Pablo
+2024-07-16 Virgen del Carmen
+2024-08-15 Asunción de la Virgen
+2024-09-18 Independencia Nacional
+2024-09-19 Glorias del Ejército
+2024-09-20 Feriado adicional Fiestas Patrias
+2024-10-12 Encuentro de Dos Mundos
+2024-10-27 Elecciones municipales
+2024-10-31 Día de las Iglesias Evangélicas
+2024-11-01 Día de Todos los Santos
+2024-12-08 Inmaculada Concepción
+2024-12-25 Navidad
+2025-01-01 Año Nuevo
+2025-04-18 Viernes Santo
+2025-04-19 Sábado Santo
+2025-05-01 Día del Trabajo
+2025-05-21 Día de las Glorias Navales
+2025-06-20 Día de los Pueblos Indígenas
+2025-06-29 San Pedro y San Pablo
+2025-07-16 Virgen del Carmen
+2025-08-15 Asunción de la Virgen
+2025-09-18 Independencia Nacional
+2025-09-19 Glorias del Ejército
+2025-10-12 Encuentro de Dos Mundos
+2025-10-31 Día de las Iglesias Evangélicas
+2025-11-01 Día de Todos los Santos
+2025-11-16 Elecciones presidenciales y parlamentarias
+2025-12-08 Inmaculada Concepción
+2025-12-14 Segunda vuelta presidencial
+2025-12-25 Navidad
+2026-01-01 Año Nuevo
+2026-04-03 Viernes Santo
+2026-04-04 Sábado Santo
+2026-05-01 Día del Trabajo
+2026-05-21 Día de las Glorias Navales
+2026-06-21 Día de los Pueblos Indígenas
+2026-06-29 San Pedro y San Pablo
+2026-07-16 Virgen del Carmen
+2026-08-15 Asunción de la Virgen
+2026-09-18 Independencia Nacional
+2026-09-19 Glorias del Ejército
+2026-10-12 Encuentro de Dos Mundos
+2026-10-31 Día de las Iglesias Evangélicas
+2026-11-01 Día de Todos los Santos
+2026-12-08 Inmaculada Concepción
+2026-12-25 Navidad
+"""
+
+# Columnas de la planilla final (en orden), y el tipo de dato con que se guardan en el histórico
+ESQUEMA_PLANILLA = {
+    "llave_id": "string",
+    "Tipo_Doc_SII": "Int64",
+    "RUT_Emisor_SII": "string",
+    "Razon_Social_SII": "string",
+    "Folio_SII": "Int64",
+    "Fecha_Docto_SII": "datetime64[ns]",
+    "Fecha_Recepcion_SII": "datetime64[ns]",
+    "Fecha_Reclamo_SII": "datetime64[ns]",
+    "Monto_Exento_SII": "Int64",
+    "Monto_Neto_SII": "Int64",
+    "Monto_IVA_Recuperable_SII": "Int64",
+    "Monto_Total_SII": "Int64",
+    "publicacion_ACEPTA": "string",
+    "estado_acepta_ACEPTA": "string",
+    "estado_sii_ACEPTA": "string",
+    "estado_nar_ACEPTA": "string",
+    "estado_devengo_ACEPTA": "string",
+    "folio_oc_ACEPTA": "string",
+    "Numero_Compromiso_OC": "string",
+    "Monto_Disponible_OC": "float64",
+    "Concepto_Presupuesto_OC": "string",
+    "folio_rc_ACEPTA": "string",
+    "fecha_ingreso_rc_ACEPTA": "string",
+    "folio_sigfe_ACEPTA": "Int64",
+    "tarea_actual_ACEPTA": "string",
+    "estado_cesion_ACEPTA": "string",
+    "Fecha_DEVENGO_SIGFE": "datetime64[ns]",
+    "Folio_interno_DEVENGO_SIGFE": "Int64",
+    "Fecha_PAGO_SIGFE": "datetime64[ns]",
+    "Folio_interno_PAGO_SIGFE": "Int64",
+    "Fecha_Recepción_SCI": "string",
+    "Registrador_SCI": "string",
+    "Codigo_Articulo_SCI": "string",
+    "Articulo_SCI": "string",
+    "N°_Acta_SCI": "string",
+    "Familia_MAESTRO_ARTICULOS": "string",
+    "Items_MAESTRO_ARTICULOS": "string",
+    "Nombre Items_MAESTRO_ARTICULOS": "string",
+    "Cargar_en_LEY_PRESUPUESTO": "string",
+    "Ubic._TURBO": "string",
+    "NºPresu_TURBO": "string",
+    "Folio_interno_TURBO": "string",
+    "NºPago_TURBO": "string",
+    "Monto_TURBO": "Int64",
+    "tiempo_diferencia_SII": "float64",
+    "esta_al_dia": "boolean",
+    "dias_habiles_SII": "Int64",
+    "dias_para_plazo_SII": "Int64",
+    "tramo_antiguedad_SII": "string",
+    "monto_sii_y_turbo_coinciden": "boolean",
+    "REFERENCIAS": "string",
+    "Saldo_Neto_Referencias": "Int64",
+    "OBSERVACION_OBSERVACIONES": "string",
+}
+
+# Cada base de datos se lee sólo con las columnas que terminan en la planilla (ESQUEMA_PLANILLA)
+# o que usan las etapas intermedias (COLUMNAS_ETAPAS). Para saber si una columna cruda se
+# necesita, se obtiene el nombre que tendría en la tabla unida: primero se renombra con
+# RENOMBRES_COLUMNAS, y luego se le agrega el SUFIJOS_TABLA_UNIDA de su base de datos (por
+# defecto "_BASE", cambiando los espacios por "_").
+RENOMBRES_COLUMNAS = {
+    "ACEPTA": {"emisor": "RUT Emisor", "folio": "Folio"},
+    "OBSERVACIONES": {
+        "RUT_Emisor_SII": "RUT Emisor",
+        "Folio_SII": "Folio",
+        "OBSERVACION_OBSERVACIONES": "OBSERVACION",
+    },
+    "SCI": {"Rut Proveedor": "RUT Emisor", "Numero Documento": "Folio"},
+    "TURBO": {"Rut": "RUT Emisor", "Folio": "Folio_interno", "NºDoc.": "Folio"},
+    "SIGFE_REPORTS": {
+        "Monto Disponible": "Monto_Disponible_OC",
+        "Folio": "Numero_Compromiso_OC",
+        "Concepto Presupuesto": "Concepto_Presupuesto_OC",
+    },
+}
+
+SUFIJOS_TABLA_UNIDA = {
+    "SIGFE_REPORTS": "",
+    "MAESTRO_ARTICULOS": "_MAESTRO_ARTICULOS",
+    "LEY_PRESUPUESTOS": "_LEY_PRESUPUESTO",
+}
+
+# Columnas de la tabla unida que no quedan en la planilla, pero que usan las etapas intermedias
+# (llaves de unión y columnas con que se calculan otras)
+COLUMNAS_ETAPAS = {
+    "ACEPTA": ["RUT_Emisor_ACEPTA", "Folio_ACEPTA", "tipo_ACEPTA", "referencias_ACEPTA"],
+    "OBSERVACIONES": ["RUT_Emisor_OBSERVACIONES", "Folio_OBSERVACIONES"],
+    "SCI": ["RUT_Emisor_SCI", "Folio_SCI"],
+    "TURBO": ["RUT_Emisor_TURBO", "Folio_TURBO"],
+    "SIGFE_REPORTS": ["Número Documento"],
+    "MAESTRO_ARTICULOS": ["Código_MAESTRO_ARTICULOS"],
+    "LEY_PRESUPUESTOS": ["Numero_Concepto_LEY_PRESUPUESTO"],
+}
+
+# SIGFE se agrupa por documento al leerlo, por lo que sus columnas crudas no llegan a la tabla
+# unida. Éstas son las columnas con que se filtran los movimientos y se calculan las
+# AGREGACIONES_SIGFE (y las opcionales).
+COLUMNAS_SIGFE = ["Cuenta Contable", "Principal", "Folio", "Número ", "Fecha", "Debe", "Haber"]
+
+# Patrones para leer la columna referencias de ACEPTA sin decodificar el JSON fila por fila. Cada
+# referencia es un objeto {"Tipo": "33", "Folio": "00001234", ...}
+PATRON_OBJETO_REFERENCIA = r"(\{[^{}]*\})"
+PATRON_TIPO_REFERENCIA = r'"Tipo"\s*:\s*"?([^",}\s]*)'
+PATRON_FOLIO_REFERENCIA = r'"Folio"\s*:\s*"?([^",}\s]*)'
+
+# Tipos de documento que pueden referenciar a otros (Nota de Débito y Nota de Crédito), y la
+# abreviatura con que se muestra cada tipo en la columna REFERENCIAS
+TIPOS_NOTA = [56, 61]
+ABREVIATURAS_TIPO_DOCUMENTO = {33: "FE", 34: "FE", 56: "ND", 61: "NC"}
+
+# La llave de cada documento (RUT-DV + Folio) se representa como un único entero de 64 bits:
+# cuerpo del RUT (27 bits) | dígito verificador (4 bits, K = 10) | folio (32 bits). La llave_id
+# legible (ej: 76123456-K1234) sólo se arma al guardar la planilla.
+BITS_RUT_LLAVE = 27
+BITS_DV_LLAVE = 4
+BITS_FOLIO_LLAVE = 32
+
+# Bases de datos cuyos documentos con un RUT o Folio que no cabe en la llave se mantienen, con una
+# llave de respaldo negativa (la huella de su llave_id). El SII es la base de la planilla, y las
+# OBSERVACIONES se escriben desde ella. En el resto de las bases esos documentos se descartan, ya
+# que no se pueden unir.
+BASES_CON_LLAVE_RESPALDO = ["SII", "OBSERVACIONES"]
+
+# Versión del estado que guarda el modo incremental. Si se cambia la forma de las huellas o de las
+# llaves, o cómo se calcula una columna de la planilla, se debe aumentar para que la siguiente
+# corrida recalcule todo.
+VERSION_ESTADO = 10
+
+
+@functools.lru_cache(maxsize=None)
+def armar_calendario_dias_habiles(feriados):
+    """
+    Esta función arma el calendario de días hábiles (lunes a viernes, sin los feriados de la tupla
+    de fechas "YYYY-MM-DD"). Se guarda en cache a nivel de módulo y no en el generador, ya que
+    np.busdaycalendar no se puede serializar (pickle) y el generador se envía a los procesos que
+    leen los archivos.
+    """
+    return np.busdaycalendar(weekmask="1111100", holidays=np.array(feriados, dtype="datetime64[D]"))
+
+
+class PeriodoSinArchivosError(ValueError):
+    """
+    Error que se lanza cuando no hay archivos del SII que leer en el período indicado. main lo
+    muestra como un error de uso, sin el detalle (traceback) del programa.
+    """
+
+
+class PlanificadorEtapas:
+    """
+    Esta clase permite correr un conjunto de etapas que dependen unas de otras (un DAG).
+
+    - Cada etapa recibe como argumentos los resultados de sus dependencias, en el mismo orden en
+    que fueron declaradas.
+    - Las etapas que no dependen entre sí se corren en paralelo con un pool de hilos.
+    - Se registra el inicio y fin de cada etapa, para obtener la ruta crítica de la corrida.
+    - Se registra el tiempo de CPU de cada etapa (del hilo que la corre, sin contar los procesos
+    que lanza para leer archivos), y las filas de su entrada más grande y de su resultado.
+    - Si medir_memoria es True, se registra la memoria máxima que usa cada etapa (con
+    tracemalloc). En ese caso las etapas se corren de a una, para poder atribuir la memoria a
+    cada etapa.
+    """
+
+    def __init__(self, n_hilos=None, medir_memoria=False):
+        self.n_hilos = 1 if medir_memoria else n_hilos
+        self.medir_memoria = medir_memoria
+        self.etapas = {}
+        self.tiempos = {}
+        self.perfil = {}
+        self.memoria = {}
+
+    def agregar_etapa(self, nombre, funcion, dependencias=()):
+        if nombre in self.etapas:
+            raise ValueError(f"La etapa {nombre} ya existe")
+
+        self.etapas[nombre] = (funcion, list(dependencias))
+
+    def correr(self):
+        """
+        Esta función corre todas las etapas, respetando sus dependencias. Retorna un diccionario
+        con el resultado de cada etapa.
+        """
+        resultados = {}
+        pendientes = dict(self.etapas)
+        en_curso = {}
+
+        if self.medir_memoria:
+            tracemalloc.start()
+
+        with ThreadPoolExecutor(max_workers=self.n_hilos) as ejecutor:
+            while pendientes or en_curso:
+                etapas_listas = [
+                    nombre
+                    for nombre, (_, dependencias) in pendientes.items()
+                    if all(dependencia in resultados for dependencia in dependencias)
+                ]
+                for nombre in etapas_listas:
+                    funcion, dependencias = pendientes.pop(nombre)
+                    argumentos = [resultados[dependencia] for dependencia in dependencias]
+                    futuro = ejecutor.submit(self.correr_etapa, nombre, funcion, argumentos)
+                    en_curso[futuro] = nombre
+
+                if not en_curso:
+                    raise ValueError(
+                        f"Las etapas {list(pendientes)} tienen dependencias inexistentes o cíclicas"
+                    )
+
+                terminadas, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    resultados[en_curso.pop(futuro)] = futuro.result()
+
+        if self.medir_memoria:
+            tracemalloc.stop()
+
+        return resultados
+
+    def correr_etapa(self, nombre, funcion, argumentos):
+        if self.medir_memoria:
+            tracemalloc.reset_peak()
+            memoria_inicial = tracemalloc.get_traced_memory()[0]
+
+        inicio = time.perf_counter()
+        inicio_cpu = time.thread_time()
+        resultado = funcion(*argumentos)
+        self.tiempos[nombre] = (inicio, time.perf_counter())
+        self.perfil[nombre] = {
+            "segundos": self.tiempos[nombre][1] - inicio,
+            "segundos_cpu": time.thread_time() - inicio_cpu,
+            "filas_entrada": max(map(self.contar_filas, argumentos), default=0),
+            "filas_salida": self.contar_filas(resultado),
+        }
+
+        if self.medir_memoria:
+            memoria_maxima = tracemalloc.get_traced_memory()[1] - memoria_inicial
+            memoria_entrada = max(map(self.obtener_memoria_resultado, argumentos), default=0)
+            self.memoria[nombre] = {
+                "memoria_maxima_MB": memoria_maxima / 1024**2,
+                "entrada_MB": memoria_entrada / 1024**2,
+                "resultado_MB": self.obtener_memoria_resultado(resultado) / 1024**2,
+            }
+
+        return resultado
+
+    def obtener_memoria_resultado(self, resultado):
+        """
+        Esta función obtiene la memoria que usa el resultado de una etapa (DataFrame, Series o
+        diccionario de DataFrames).
+        """
+        if isinstance(resultado, pd.DataFrame):
+            return resultado.memory_usage(deep=True).sum()
+        if isinstance(resultado, pd.Series):
+            return resultado.memory_usage(deep=True)
+        if isinstance(resultado, dict):
+            return sum(map(self.obtener_memoria_resultado, resultado.values()))
+
+        return 0
+
+    def contar_filas(self, resultado):
+        """
+        Esta función cuenta las filas del resultado de una etapa (DataFrame, Series, Index o
+        diccionario de DataFrames).
+        """
+        if isinstance(resultado, (pd.DataFrame, pd.Series, pd.Index)):
+            return len(resultado)
+        if isinstance(resultado, dict):
+            return sum(map(self.contar_filas, resultado.values()))
+
+        return 0
+
+    def obtener_reporte_etapas(self):
+        """
+        Esta función obtiene el tiempo, tiempo de CPU y filas de entrada/salida de cada etapa de la
+        última corrida, en el orden en que terminaron. Si se midió la memoria, se agregan las
+        columnas de obtener_reporte_memoria.
+        """
+        reporte = pd.DataFrame.from_dict(self.perfil, orient="index")
+        reporte = reporte.loc[sorted(reporte.index, key=lambda nombre: self.tiempos[nombre][1])]
+        if self.medir_memoria:
+            reporte = reporte.join(self.obtener_reporte_memoria())
+
+        return reporte.round(3)
+
+    def obtener_reporte_memoria(self):
+        """
+        Esta función obtiene la memoria máxima que usó cada etapa de la última corrida, junto al
+        tamaño de su entrada más grande y de su resultado. copias_de_la_entrada indica a cuántas
+        copias de la entrada equivale la memoria máxima de la etapa.
+        """
+        reporte = pd.DataFrame.from_dict(self.memoria, orient="index")
+        reporte["copias_de_la_entrada"] = reporte["memoria_maxima_MB"] / reporte[
+            "entrada_MB"
+        ].replace(0, np.nan)
+
+        return reporte.round(2)
+
+    def obtener_ruta_critica(self):
+        """
+        Esta función obtiene la cadena de etapas dependientes más larga (en segundos) de la
+        última corrida. Ninguna cantidad de paralelismo puede hacer la corrida más corta que esta
+        cadena.
+        """
+        duracion_acumulada = {}
+        etapa_anterior = {}
+        # Las etapas se agregan después de sus dependencias, por lo que ya están ordenadas
+        for nombre, (_, dependencias) in self.etapas.items():
+            inicio, fin = self.tiempos[nombre]
+            anterior = max(dependencias, key=duracion_acumulada.get, default=None)
+            etapa_anterior[nombre] = anterior
+            duracion_acumulada[nombre] = (fin - inicio) + duracion_acumulada.get(anterior, 0)
+
+        etapa = max(duracion_acumulada, key=duracion_acumulada.get)
+        duracion_total = duracion_acumulada[etapa]
+        ruta_critica = []
+        while etapa is not None:
+            ruta_critica.insert(0, etapa)
+            etapa = etapa_anterior[etapa]
+
+        return ruta_critica, duracion_total
+
 
 class GeneradorPlanillaFinanzas:
     """
@@ -81,10 +695,91 @@ class GeneradorPlanillaFinanzas:
     Consta de 6 funciones principales.
     """
 
-    def __init__(self):
-        pass
-
-    def correr_programa(self):
+    def __init__(
+        self,
+        usar_cache=True,
+        n_procesos=None,
+        exportar_csv=False,
+        filas_por_bloque_sii=None,
+        agregaciones_sigfe_extra=(),
+        medir_memoria=False,
+        carpeta_entrada=".",
+        carpeta_salida=".",
+        motores_excel=None,
+        exportar_excel=False,
+    ):
+        """
+        - usar_cache: Si es True, guarda y reutiliza las lecturas de cada archivo crudo. El modo
+        incremental necesita el cache para leer menos: sin él, se leen todos los archivos crudos
+        (salvo que ninguno haya cambiado), ya que las bases sin cambios deben entregar las filas
+        de los documentos a recalcular.
+        - n_procesos: Cantidad de procesos/hilos para leer archivos en paralelo. Si es None, se
+        usa la cantidad de núcleos del computador. Si es 1, los archivos se leen uno a uno.
+        - exportar_csv: Si es True, al final de cada corrida se exporta la planilla histórica a
+        control_facturas_historico.csv. Se vuelven a leer y escribir todos los años, por lo que
+        no se exporta por defecto.
+        - filas_por_bloque_sii: Si se indica, los archivos del SII se leen por bloques de esa
+        cantidad de filas, para acotar la memoria usada al leer todos los años. Los archivos del
+        SII se leen entonces de a uno y sin el cache de lectura.
+        - agregaciones_sigfe_extra: Nombres de AGREGACIONES_SIGFE_OPCIONALES que se agregan a la
+        tabla de SIGFE (ej: "Fecha ULTIMO_PAGO"). Quedan en la tabla unida, pero no en la planilla.
+        - medir_memoria: Si es True, al final se informa la memoria máxima que usó cada etapa. Las
+        etapas se corren de a una, por lo que la corrida es más lenta.
+        - carpeta_entrada: Carpeta que contiene crudos/. Ahí también se guarda el cache de lectura
+        y se escriben los archivos de OBSERVACIONES.
+        - carpeta_salida: Carpeta donde se guarda el histórico, su CSV, el estado incremental y
+        los reportes de cada corrida. Para correr varias planillas a la vez, cada una debe tener
+        su propia carpeta de salida.
+        - motores_excel: Diccionario con el motor de MOTORES_EXCEL con que se prefiere leer cada
+        base de datos en Excel (ej: {"ACEPTA": "calamine"}). Si el motor no está instalado, no
+        sabe leer el formato del archivo o falla, se usan los demás motores en orden.
+        - exportar_excel: Si es True, al final de cada corrida se exporta la planilla histórica a
+        control_facturas_historico.xlsx, con formato.
+        """
+        agregaciones_desconocidas = set(agregaciones_sigfe_extra) - set(
+            AGREGACIONES_SIGFE_OPCIONALES
+        )
+        if agregaciones_desconocidas:
+            raise ValueError(f"No existen las agregaciones de SIGFE {agregaciones_desconocidas}")
+
+        motores_excel = dict(motores_excel or {})
+        bases_desconocidas = set(motores_excel) - set(BASES_DE_DATOS_EXCEL)
+        if bases_desconocidas:
+            raise ValueError(f"No se leen desde Excel las bases de datos {bases_desconocidas}")
+        motores_desconocidos = set(motores_excel.values()) - set(MOTORES_EXCEL)
+        if motores_desconocidos:
+            raise ValueError(f"No existen los motores de Excel {motores_desconocidos}")
+        for base_de_datos, motor in motores_excel.items():
+            if importlib.util.find_spec(MOTORES_EXCEL[motor][0]) is None:
+                print(f"{motor} no está instalado, {base_de_datos} se leerá con otro motor")
+
+        self.usar_cache = usar_cache
+        self.n_procesos = n_procesos
+        self.exportar_csv = exportar_csv
+        self.filas_por_bloque_sii = filas_por_bloque_sii
+        self.agregaciones_sigfe_extra = list(agregaciones_sigfe_extra)
+        self.medir_memoria = medir_memoria
+        self.carpeta_entrada = carpeta_entrada
+        self.carpeta_salida = carpeta_salida
+        self.motores_excel = motores_excel
+        self.exportar_excel = exportar_excel
+        self.version_feriados = None
+        self.pool_procesos = None
+        self.candado_pool = threading.Lock()
+
+    def __getstate__(self):
+        # El pool de procesos y su candado no se pueden enviar a los procesos que leen archivos
+        estado = self.__dict__.copy()
+        estado["pool_procesos"] = None
+        del estado["candado_pool"]
+
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.candado_pool = threading.Lock()
+
+    def correr_programa(self, leer=None, desde=None, hasta=None):
         """
         Esta función permite correr el programa de para obtener el cruce de bases de datos
         SII - ACEPTA - SIGFE - TURBO - SCI de facturas. Ejectura los siguientes pasos:
@@ -94,515 +789,2094 @@ class GeneradorPlanillaFinanzas:
         - Calcular el tiempo entre que se recibe la factura desde el SII y la fecha actual.
         - Obtener las referencias entre Notas de Créditos y Facturas.
         - Filtrar columnas innecesarias, y solo dejar las columnas necesarias
+
+        - leer: "1" (este año, o el período entre desde y hasta), "2" (todos los años) o "3"
+        (incremental). Si es None, se le pregunta al usuario.
+        - desde, hasta: Inicio y fin del período a leer en el modo "1". Cada uno puede ser un año
+        (2024), un mes ("2024-03") o un día ("2024-03-15"). Si no se indican, se lee el año
+        actual. Sólo se leen los archivos que cubren alguna parte del período.
+
+        Retorna la planilla de los documentos leídos (en el modo incremental, sólo la de los
+        documentos recalculados).
         """
         start_time = time.time()
-        leer = input(
-            "¿Quieres leer los archivos de este año o todos los años? \n"
-            "1) Este año \n"
-            "2) Todos los años \n"
-            "> "
-        )
+        if leer is None:
+            leer = input(
+                "¿Quieres leer los archivos de este año o todos los años? \n"
+                "1) Este año \n"
+                "2) Todos los años \n"
+                "3) Sólo archivos nuevos o modificados desde la última corrida (incremental) \n"
+                "> "
+            )
+        periodo = self.obtener_periodo_a_leer(leer, desde, hasta)
+
+        planificador = self.armar_planificador(leer, periodo)
+        try:
+            resultados = planificador.correr()
+        finally:
+            self.cerrar_pool_procesos()
+
+        facturas_con_columnas_necesarias = resultados["obtener_columnas_necesarias"]
+        if leer != "3":
+            print(
+                f"La planilla final tiene {facturas_con_columnas_necesarias.shape[0]} documentos."
+            )
 
-        archivos_facturas = self.obtener_archivos("facturas", leer)
-        tablas_de_facturas = self.obtener_facturas_base_de_datos(archivos_facturas)
+        ruta_critica, duracion_ruta_critica = planificador.obtener_ruta_critica()
+        print(f"\nRuta crítica ({round(duracion_ruta_critica, 1)} seconds):")
+        print(" -> ".join(ruta_critica))
 
-        archivos_oc = self.obtener_archivos("oc", leer)
-        oc_limpias = self.obtener_oc_base_de_datos(archivos_oc)
+        if self.medir_memoria:
+            print("\nMemoria usada por cada etapa:")
+            print(planificador.obtener_reporte_memoria().to_string())
 
-        archivo_articulos = self.obtener_archivos("articulos", leer)
-        articulos = self.obtener_articulos_base_de_datos(archivo_articulos)
+        reporte_etapas = planificador.obtener_reporte_etapas()
+        duracion_total = time.time() - start_time
+        self.comparar_con_corridas_anteriores(reporte_etapas, leer)
+        self.guardar_reporte_corrida(reporte_etapas, leer, duracion_total, ruta_critica)
 
-        facturas_unidas = self.unir_dfs(tablas_de_facturas)
+        print("\nListo! No hubo ningún problema")
+        print(f"--- {round(duracion_total, 1)} seconds ---")
 
-        facturas_cumplen_tiempo = self.calcular_tiempo_8_dias(facturas_unidas)
-        facturas_con_ref_nc = self.obtener_referencias_nc(facturas_cumplen_tiempo)
-        facturas_con_ref_nc = facturas_con_ref_nc.reset_index()
-        facturas_con_oc = self.asociar_saldo_de_oc(facturas_con_ref_nc, oc_limpias["SIGFE_REPORTS"])
-        facturas_con_maestro_articulos = self.asociar_maestro_articulos(
-            facturas_con_oc, articulos["MAESTRO_ARTICULOS"]
-        )
+        return facturas_con_columnas_necesarias
 
-        facturas_con_ley_presupuesto = self.asociar_ley_presupuesto(
-            facturas_con_maestro_articulos, articulos["LEY_PRESUPUESTOS"]
-        )
-        facturas_con_mismo_monto_sii = self.tienen_el_mismo_monto_sii_y_turbo(
-            facturas_con_ley_presupuesto
-        )
+    def obtener_periodo_a_leer(self, leer, desde=None, hasta=None):
+        """
+        Esta función obtiene el período (fecha de inicio y de fin) de los archivos a leer según
+        el modo de lectura. Retorna None si se leen todos los años.
+        """
+        if leer not in ("1", "2", "3"):
+            raise ValueError(f"No existe el modo de lectura {leer}")
 
-        facturas_con_columnas_necesarias = self.obtener_columnas_necesarias(
-            facturas_con_mismo_monto_sii
-        )
+        if leer != "1":
+            if desde is not None or hasta is not None:
+                raise ValueError("El período desde y hasta sólo se puede indicar en el modo 1")
+            return None
 
-        self.guardar_dfs(facturas_con_columnas_necesarias, leer)
-        print(f"La planilla final tiene {facturas_con_columnas_necesarias.shape[0]} documentos.")
+        hasta = datetime.date.today().year if hasta is None else hasta
+        inicio_hasta, fin = self.interpretar_limite_periodo(hasta)
+        inicio = inicio_hasta if desde is None else self.interpretar_limite_periodo(desde)[0]
+        if inicio > fin:
+            raise ValueError(f"El inicio del período ({desde}) es posterior a su fin ({hasta})")
 
-        print("\nListo! No hubo ningún problema")
-        print(f"--- {round(time.time() - start_time, 1)} seconds ---")
+        return inicio, fin
 
-    def obtener_archivos(self, base_de_datos, leer):
-        archivos_a_leer = {}
-        # Lee un tipo de documento, como facturas, OC o articulos
-        tipo_documento_a_leer = f"crudos/base_de_datos_{base_de_datos}"
+    def interpretar_limite_periodo(self, limite):
+        """
+        Esta función obtiene el primer y último día de un año (2024), mes ("2024-03") o día
+        ("2024-03-15").
+        """
+        texto = str(limite).strip()
+        if re.fullmatch(r"\d{4}", texto):
+            frecuencia = "Y"
+        elif re.fullmatch(r"\d{4}-\d{1,2}", texto):
+            frecuencia = "M"
+        elif re.fullmatch(r"\d{4}-\d{1,2}-\d{1,2}", texto):
+            frecuencia = "D"
+        else:
+            raise ValueError(f"No se entiende el límite del período {limite} (ej: 2024, 2024-03)")
 
-        # Lee todas las bases que estan dentro de ese tipo de documento
-        bases_de_tipo_documento = os.listdir(tipo_documento_a_leer)
-        bases_de_tipo_documento = [
-            element for element in bases_de_tipo_documento if not element.startswith(".")
-        ]
+        periodo = pd.Period(texto, frecuencia)
+        return periodo.start_time.normalize(), periodo.end_time.normalize()
 
-        for carpeta_base_de_datos in bases_de_tipo_documento:
-            archivos_a_leer[carpeta_base_de_datos] = []
-            for archivo in os.listdir(os.path.join(tipo_documento_a_leer, carpeta_base_de_datos)):
-                ruta_archivo = os.path.join(tipo_documento_a_leer, carpeta_base_de_datos, archivo)
-                archivos_a_leer[carpeta_base_de_datos].append(ruta_archivo)
+    def obtener_ruta_entrada(self, *partes):
+        return os.path.join(self.carpeta_entrada, *partes)
 
-        hoy = datetime.date.today()
-        anio_actual = str(hoy.year)
+    def obtener_ruta_salida(self, *partes):
+        return os.path.join(self.carpeta_salida, *partes)
 
-        if leer == "1":
-            for base_de_datos, lista_archivos in archivos_a_leer.items():
-                archivos_a_leer[base_de_datos] = [
-                    archivo for archivo in lista_archivos if anio_actual in archivo
-                ]
+    def guardar_reporte_corrida(self, reporte_etapas, leer, duracion_total, ruta_critica):
+        """
+        Esta función guarda el reporte de la corrida en CARPETA_REPORTES_CORRIDAS, en un JSON con
+        la fecha de la corrida en el nombre (corrida_2024-05-31_103000.json).
+        """
+        fecha_corrida = datetime.datetime.now()
+        reporte = {
+            "fecha": fecha_corrida.isoformat(timespec="seconds"),
+            "modo": leer,
+            "segundos": round(duracion_total, 3),
+            "ruta_critica": ruta_critica,
+            "version_feriados": self.version_feriados,
+            "etapas": json.loads(reporte_etapas.to_json(orient="index")),
+        }
+
+        os.makedirs(self.obtener_ruta_salida(CARPETA_REPORTES_CORRIDAS), exist_ok=True)
+        ruta_reporte = self.obtener_ruta_salida(
+            CARPETA_REPORTES_CORRIDAS, f"corrida_{fecha_corrida:%Y-%m-%d_%H%M%S}.json"
+        )
+        with open(ruta_reporte, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, indent=2)
 
-        return archivos_a_leer
+        print(f"\nReporte de la corrida guardado en {ruta_reporte}")
 
-    def obtener_facturas_base_de_datos(self, archivos_a_leer):
-        diccionario_base_de_datos = {}
-        for base_de_datos, lista_archivos in archivos_a_leer.items():
-            print(f"Leyendo {base_de_datos}")
-            if base_de_datos == "ACEPTA":
-                df_sumada = self.leer_acepta()
+    def leer_reportes_corridas(self, leer):
+        """
+        Esta función lee los reportes de las CORRIDAS_A_COMPARAR últimas corridas con el mismo
+        modo de lectura. Retorna un DataFrame con una fila por corrida y etapa.
+        """
+        rutas_reportes = sorted(
+            glob.glob(self.obtener_ruta_salida(CARPETA_REPORTES_CORRIDAS, "corrida_*.json"))
+        )
+        reportes = []
+        for ruta_reporte in reversed(rutas_reportes):
+            with open(ruta_reporte, encoding="utf-8") as archivo:
+                reporte = json.load(archivo)
+            if reporte["modo"] != leer:
+                continue
 
-            elif base_de_datos == "OBSERVACIONES":
-                df_sumada = self.leer_observaciones(lista_archivos)
+            etapas = pd.DataFrame.from_dict(reporte["etapas"], orient="index")
+            etapas["fecha"] = reporte["fecha"]
+            reportes.append(etapas)
+            if len(reportes) == CORRIDAS_A_COMPARAR:
+                break
 
-            elif base_de_datos == "SCI":
-                df_sumada = self.leer_sci(lista_archivos)
+        if not reportes:
+            return pd.DataFrame()
 
-            elif base_de_datos == "SIGFE":
-                df_sumada = self.leer_sigfe(lista_archivos)
+        return pd.concat(reportes)
 
-            elif base_de_datos == "SII":
-                df_sumada = self.leer_sii()
-                print(f"\nSII tiene {df_sumada.shape[0]} documentos totales\n")
+    def comparar_con_corridas_anteriores(self, reporte_etapas, leer):
+        """
+        Esta función compara el tiempo y las filas de cada etapa contra la mediana de las corridas
+        anteriores con el mismo modo de lectura, y avisa de las etapas que se pusieron más lentas.
+        Las filas permiten distinguir si la etapa se hizo más lenta porque creció la entrada (por
+        ejemplo, al agregar el export de un nuevo mes) o porque empeoró el código.
+        """
+        reportes_anteriores = self.leer_reportes_corridas(leer)
+        if reportes_anteriores.empty:
+            print("\nNo hay corridas anteriores con las que comparar esta corrida.")
+            return None
+
+        medianas_anteriores = reportes_anteriores.groupby(level=0)[
+            ["segundos", "filas_entrada"]
+        ].median()
+        comparacion = reporte_etapas[["segundos", "filas_entrada"]].join(
+            medianas_anteriores, rsuffix="_anteriores", how="inner"
+        )
+        comparacion["variacion_segundos"] = comparacion["segundos"] / comparacion[
+            "segundos_anteriores"
+        ].replace(0, np.nan)
+        comparacion["variacion_filas"] = comparacion["filas_entrada"] / comparacion[
+            "filas_entrada_anteriores"
+        ].replace(0, np.nan)
+        comparacion = comparacion.round(2)
+
+        etapas_mas_lentas = comparacion[
+            (comparacion["variacion_segundos"] > UMBRAL_REGRESION)
+            & (comparacion["segundos"] >= MINIMO_SEGUNDOS_REGRESION)
+        ]
+        n_corridas = reportes_anteriores["fecha"].nunique()
+        print(f"\nComparación contra la mediana de las {n_corridas} corridas anteriores:")
+        print(comparacion.to_string())
+        if not etapas_mas_lentas.empty:
+            print(
+                f"\nOjo! Las etapas {list(etapas_mas_lentas.index)} tardaron más de "
+                f"{UMBRAL_REGRESION} veces lo habitual."
+            )
+
+        return comparacion
 
-            elif base_de_datos == "TURBO":
-                df_sumada = self.leer_turbo(lista_archivos)
+    def armar_planificador(self, leer, periodo=None):
+        """
+        Esta función arma el DAG de etapas del programa, leyendo los archivos que cubren el
+        período (o todos los archivos si es None):
 
-            df_sumada["RUT Emisor"] = (
-                df_sumada["RUT Emisor"].str.replace(".", "", regex=False).str.upper().str.strip()
+        - Leer y normalizar cada base de datos de facturas, OC y articulos (son independientes
+        entre sí, por lo que se leen en paralelo).
+        - Unir las bases de facturas, una vez que todas estén normalizadas.
+        - Agregar los cálculos y asociaciones a la planilla unida, en el mismo orden de siempre.
+        """
+        archivos_facturas = self.obtener_archivos("facturas", periodo)
+        archivos_oc = self.obtener_archivos("oc", periodo)
+        archivos_articulos = self.obtener_archivos("articulos", periodo)
+        if not archivos_facturas.get("SII"):
+            if periodo is None:
+                raise PeriodoSinArchivosError("No hay archivos del SII que leer")
+            inicio, fin = periodo
+            raise PeriodoSinArchivosError(
+                f"No hay archivos del SII que leer en el período del {inicio:%Y-%m-%d} al "
+                f"{fin:%Y-%m-%d} (revisa --desde y --hasta, o los archivos de crudos/)"
             )
 
-            df_sumada["llave_id"] = df_sumada["RUT Emisor"].astype(str) + df_sumada["Folio"].astype(
-                str
+        planificador = PlanificadorEtapas(self.n_procesos, medir_memoria=self.medir_memoria)
+
+        if leer == "3":
+            bases_cambiadas = self.obtener_bases_cambiadas()
+            if bases_cambiadas is None:
+                print("Se recalculará la planilla completa (Todos los años)")
+                leer = "2"
+
+            elif not bases_cambiadas:
+                # Ningún archivo cambió desde la última corrida, por lo que no se lee ninguno
+                print("No hay archivos nuevos ni modificados, la planilla histórica no cambia")
+                planificador.agregar_etapa(
+                    "obtener_columnas_necesarias",
+                    lambda: self.leer_historico(años=[]),
+                )
+                planificador.agregar_etapa(
+                    "guardar_dfs", lambda _: None, ["obtener_columnas_necesarias"]
+                )
+                self.agregar_exportaciones(planificador)
+                return planificador
+
+            elif not self.usar_cache:
+                print(
+                    "Ojo! Sin el cache de lectura, el modo incremental lee todos los archivos "
+                    "crudos (sólo se ahorra recalcular y guardar los documentos sin cambios)"
+                )
+
+        for base_de_datos, lista_archivos in archivos_facturas.items():
+            planificador.agregar_etapa(
+                f"leer_{base_de_datos}",
+                functools.partial(self.leer_base_de_datos_facturas, base_de_datos, lista_archivos),
+            )
+            planificador.agregar_etapa(
+                f"normalizar_{base_de_datos}",
+                functools.partial(
+                    self.normalizar_base_de_datos_facturas, base_de_datos=base_de_datos
+                ),
+                [f"leer_{base_de_datos}"],
             )
-            df_sumada = df_sumada.set_index("llave_id")
 
-            df_sumada.columns = df_sumada.columns + f"_{base_de_datos}"
-            df_sumada.columns = df_sumada.columns.str.replace(" ", "_")
+        for base_de_datos, lista_archivos in archivos_oc.items():
+            planificador.agregar_etapa(
+                f"leer_{base_de_datos}",
+                functools.partial(self.leer_base_de_datos_oc, base_de_datos, lista_archivos),
+            )
 
-            diccionario_base_de_datos[base_de_datos] = df_sumada
+        for base_de_datos, lista_archivos in archivos_articulos.items():
+            planificador.agregar_etapa(
+                f"leer_{base_de_datos}",
+                functools.partial(self.leer_base_de_datos_articulos, base_de_datos, lista_archivos),
+            )
 
-        return diccionario_base_de_datos
+        # Mantiene el orden de las bases de datos de facturas para unirlas igual que siempre
+        bases_facturas = list(archivos_facturas)
+        planificador.agregar_etapa(
+            "tablas_de_facturas",
+            lambda *tablas: dict(zip(bases_facturas, tablas)),
+            [f"normalizar_{base_de_datos}" for base_de_datos in bases_facturas],
+        )
 
-    def leer_acepta(self):
-        acepta_unido = pd.concat(
-            (
-                pd.read_excel(archivo, usecols=list(COLUMNAS_ACEPTA.keys()), dtype=COLUMNAS_ACEPTA)
-                for archivo in glob.glob("crudos/base_de_datos_facturas/ACEPTA/*.xls")
+        if leer == "3":
+            # Solo se unen los documentos que cambiaron, y sus Notas de Crédito/Facturas
+            planificador.agregar_etapa("leer_estado", self.leer_estado)
+            planificador.agregar_etapa(
+                "calcular_huellas",
+                functools.partial(self.calcular_huellas, bases_de_datos=bases_cambiadas),
+                ["tablas_de_facturas"],
             )
-        )
-        acepta_unido = acepta_unido.rename(columns={"emisor": "RUT Emisor", "folio": "Folio"})
+            planificador.agregar_etapa(
+                "obtener_llaves_afectadas",
+                self.obtener_llaves_afectadas,
+                ["calcular_huellas", "tablas_de_facturas"],
+            )
+            planificador.agregar_etapa(
+                "filtrar_llaves_afectadas",
+                self.filtrar_llaves_afectadas,
+                ["tablas_de_facturas", "obtener_llaves_afectadas"],
+            )
+            tablas_a_unir = "filtrar_llaves_afectadas"
 
-        return acepta_unido
+        else:
+            tablas_a_unir = "tablas_de_facturas"
 
-    def leer_observaciones(self, lista_archivos):
-        dfs = map(lambda x: pd.read_csv(x, encoding="utf-8", delimiter=";"), lista_archivos)
-        df_sumada = pd.concat(dfs)
-        df_sumada = df_sumada[["RUT_Emisor_SII", "Folio_SII", "OBSERVACION_OBSERVACIONES"]]
-        df_sumada = df_sumada.rename(
-            columns={
-                "RUT_Emisor_SII": "RUT Emisor",
-                "Folio_SII": "Folio",
-                "OBSERVACION_OBSERVACIONES": "OBSERVACION",
-            }
+        # unir_dfs modifica el diccionario que recibe, por lo que se le entrega una copia
+        planificador.agregar_etapa(
+            "unir_dfs", lambda tablas: self.unir_dfs(dict(tablas)), [tablas_a_unir]
         )
+        planificador.agregar_etapa(
+            "calcular_tiempo_8_dias", self.calcular_tiempo_8_dias, ["unir_dfs"]
+        )
+        if periodo is not None:
+            # Las notas de otros períodos también referencian a los documentos del período (y al
+            # revés), por lo que el grafo guardado se actualiza con las notas del período. Si no
+            # hay grafo guardado, se construye con todos los archivos del SII y ACEPTA
+            todos_los_archivos = self.obtener_archivos("facturas")
+            planificador.agregar_etapa(
+                "construir_grafo_referencias",
+                functools.partial(
+                    self.obtener_grafo_referencias_periodo,
+                    archivos_contexto={
+                        base: todos_los_archivos[base]
+                        for base in ["SII", "ACEPTA"]
+                        if base in todos_los_archivos
+                    },
+                ),
+                ["calcular_tiempo_8_dias"],
+            )
 
-        return df_sumada
+        elif leer == "3":
+            # El monto de una nota se reparte entre todos los documentos que referencia, por lo
+            # que se actualiza el grafo guardado (con todos los documentos) con las notas
+            # recalculadas, y el monto de los demás documentos se toma del estado
+            planificador.agregar_etapa(
+                "construir_grafo_referencias",
+                lambda df_unida, estado, llaves_afectadas: self.actualizar_grafo_referencias(
+                    df_unida,
+                    self.obtener_arcos_referencias(df_unida),
+                    estado["Monto_Total_SII"],
+                    llaves_afectadas,
+                ),
+                ["calcular_tiempo_8_dias", "leer_estado", "obtener_llaves_afectadas"],
+            )
 
-    def leer_sci(self, lista_archivos):
-        dfs = map(lambda x: pd.read_csv(x, delimiter=","), lista_archivos)
-        df_sumada = pd.concat(dfs)
-        df_sumada = df_sumada.rename(
-            columns={"Rut Proveedor": "RUT Emisor", "Numero Documento": "Folio"}
+        else:
+            planificador.agregar_etapa(
+                "construir_grafo_referencias",
+                self.construir_grafo_referencias,
+                ["calcular_tiempo_8_dias"],
+            )
+        planificador.agregar_etapa(
+            "obtener_referencias_nc",
+            self.obtener_referencias_nc,
+            ["calcular_tiempo_8_dias", "construir_grafo_referencias"],
         )
 
-        df_sumada["Folio"] = df_sumada["Folio"].astype(str).str.replace(".0", "", regex=False)
+        # Las asociaciones retornan sólo sus columnas, y se agregan todas juntas al final
+        planificador.agregar_etapa(
+            "asociar_saldo_de_oc",
+            self.asociar_saldo_de_oc,
+            ["obtener_referencias_nc", "leer_SIGFE_REPORTS"],
+        )
+        planificador.agregar_etapa(
+            "asociar_maestro_articulos",
+            self.asociar_maestro_articulos,
+            ["obtener_referencias_nc", "leer_MAESTRO_ARTICULOS"],
+        )
+        planificador.agregar_etapa(
+            "asociar_ley_presupuesto",
+            self.asociar_ley_presupuesto,
+            ["asociar_maestro_articulos", "leer_LEY_PRESUPUESTOS"],
+        )
+        planificador.agregar_etapa(
+            "tienen_el_mismo_monto_sii_y_turbo",
+            self.tienen_el_mismo_monto_sii_y_turbo,
+            ["obtener_referencias_nc"],
+        )
+        planificador.agregar_etapa(
+            "agregar_columnas_calculadas",
+            self.agregar_columnas_calculadas,
+            [
+                "obtener_referencias_nc",
+                "asociar_saldo_de_oc",
+                "asociar_maestro_articulos",
+                "asociar_ley_presupuesto",
+                "tienen_el_mismo_monto_sii_y_turbo",
+            ],
+        )
+        planificador.agregar_etapa(
+            "obtener_columnas_necesarias",
+            self.obtener_columnas_necesarias,
+            ["agregar_columnas_calculadas"],
+        )
 
-        return df_sumada
+        if leer == "3":
+            planificador.agregar_etapa(
+                "guardar_dfs",
+                self.guardar_incremental,
+                [
+                    "obtener_columnas_necesarias",
+                    "obtener_llaves_afectadas",
+                    "leer_estado",
+                    "calcular_huellas",
+                    "construir_grafo_referencias",
+                ],
+            )
 
-    def leer_sigfe(self, lista_archivos):
-        dfs = map(lambda x: pd.read_csv(x, delimiter=",", header=10), lista_archivos)
-        df_sumada = pd.concat(dfs)
-        df_sumada = df_sumada.dropna(subset=["Folio"])
-        df_sumada = df_sumada.query('`Cuenta Contable` != "Cuenta Contable"')
+        else:
+            planificador.agregar_etapa(
+                "guardar_dfs",
+                lambda df, grafo: self.guardar_dfs(df, periodo, grafo),
+                ["obtener_columnas_necesarias", "construir_grafo_referencias"],
+            )
 
-        df_sumada["RUT Emisor"] = df_sumada["Principal"].str.split(" ").str[0]
+        self.agregar_exportaciones(planificador)
 
-        df_sumada = df_sumada.rename(columns={"Folio": "Folio_interno", "Número ": "Folio"})
-        df_sumada = df_sumada.reset_index()
+        if leer == "2":
+            # Deja guardado el estado para que la siguiente corrida pueda ser incremental
+            planificador.agregar_etapa(
+                "calcular_huellas",
+                functools.partial(self.calcular_huellas, bases_de_datos=bases_facturas),
+                ["tablas_de_facturas"],
+            )
+            planificador.agregar_etapa(
+                "guardar_estado",
+                lambda huellas, _: self.guardar_estado(huellas),
+                ["calcular_huellas", "guardar_dfs"],
+            )
 
-        df_sumada["Fecha"] = pd.to_datetime(df_sumada["Fecha"], dayfirst=True)
-        df_sumada["Folio_interno"] = df_sumada["Folio_interno"].astype("Int32")
+        return planificador
 
-        mask_debe = df_sumada["Debe"] != "0"
-        mask_haber = df_sumada["Haber"] != "0"
+    def agregar_exportaciones(self, planificador):
+        """
+        Esta función agrega las etapas que exportan la planilla histórica (CSV y Excel). Corren
+        después de guardar_dfs, ya que leen la planilla histórica ya guardada.
+        """
+        if self.exportar_csv:
+            planificador.agregar_etapa(
+                "exportar_csv", lambda _: self.exportar_historico_csv(), ["guardar_dfs"]
+            )
+        if self.exportar_excel:
+            planificador.agregar_etapa(
+                "exportar_excel", lambda _: self.exportar_historico_excel(), ["guardar_dfs"]
+            )
 
-        df_sumada["Folio_interno PAGO"] = df_sumada[mask_debe]["Folio_interno"]
-        df_sumada["Fecha PAGO"] = df_sumada[mask_debe]["Fecha"]
+    def obtener_archivos(self, tipo_documento, periodo=None):
+        """
+        Esta función obtiene los archivos a leer de cada base de datos de un tipo de documento
+        (facturas, oc o articulos). Si se indica un período, sólo se leen los archivos del
+        catálogo que cubren alguna parte de él.
+        """
+        archivos_a_leer = {}
+        for base_de_datos, catalogo_base in self.obtener_catalogo(tipo_documento).items():
+            if periodo is not None:
+                catalogo_base = self.seleccionar_archivos_del_periodo(
+                    base_de_datos, catalogo_base, periodo
+                )
+            archivos_a_leer[base_de_datos] = catalogo_base["archivo"].tolist()
 
-        df_sumada["Folio_interno DEVENGO"] = df_sumada["Folio_interno"][mask_haber]
-        df_sumada["Fecha DEVENGO"] = df_sumada["Fecha"][mask_haber]
+        return archivos_a_leer
 
-        df_sumada["RUT Emisor"] = (
-            df_sumada["RUT Emisor"].str.replace(".", "", regex=False).str.upper().str.strip()
+    def obtener_catalogo(self, tipo_documento):
+        """
+        Esta función arma el catálogo de los archivos crudos de un tipo de documento. Retorna un
+        diccionario con un DataFrame por base de datos, con la ruta de cada archivo y el período
+        que cubre (inicio y fin).
+
+        - El período se obtiene del nombre del archivo (PATRON_MES_ARCHIVO o PATRON_AÑO_ARCHIVO).
+        - Si el nombre no lo indica, se lee la columna de fecha de SONDEO_PERIODO_ARCHIVOS. El
+        resultado se guarda junto al cache de lectura, para no volver a leer el archivo mientras
+        no cambie.
+        - Los archivos sin período conocido quedan con inicio y fin vacíos.
+        - Los archivos ocultos o temporales no se incluyen.
+        """
+        # Lee un tipo de documento, como facturas, OC o articulos
+        tipo_documento_a_leer = self.obtener_ruta_entrada(
+            "crudos", f"base_de_datos_{tipo_documento}"
         )
 
-        fecha_devengo_mas_antigua = df_sumada.groupby(by=["RUT Emisor", "Folio"])[
-            "Fecha DEVENGO"
-        ].min()
-        folio_devengo = df_sumada.groupby(by=["RUT Emisor", "Folio"])["Folio_interno DEVENGO"].min()
-        fecha_pago = df_sumada.groupby(by=["RUT Emisor", "Folio"])["Fecha PAGO"].min()
-        folio_pago = df_sumada.groupby(by=["RUT Emisor", "Folio"])["Folio_interno PAGO"].min()
-        df_sumada = pd.concat(
-            [fecha_devengo_mas_antigua, folio_devengo, fecha_pago, folio_pago], axis=1
-        ).reset_index()
-
-        return df_sumada
+        # Lee todas las bases que estan dentro de ese tipo de documento
+        bases_de_tipo_documento = os.listdir(tipo_documento_a_leer)
+        bases_de_tipo_documento = [
+            element for element in bases_de_tipo_documento if not element.startswith(".")
+        ]
 
-    def lector_csv_sii(self, archivo, tipo_datos):
-        return pd.read_csv(
-            archivo,
-            delimiter=";",
-            index_col=False,
-            usecols=list(tipo_datos.keys()),
-            dtype=tipo_datos,
-        )
+        sondeos = self.leer_sondeos_periodo()
+        cantidad_sondeos = len(sondeos)
+        catalogo = {}
+        for carpeta_base_de_datos in bases_de_tipo_documento:
+            filas_catalogo = []
+            for archivo in os.listdir(os.path.join(tipo_documento_a_leer, carpeta_base_de_datos)):
+                # No lee archivos ocultos o temporales (ej: .OBSERVACIONES 2024.csv.tmp a medio
+                # escribir, o ~$ACEPTA 2024.xls mientras el archivo está abierto en Excel)
+                if archivo.startswith((".", "~$")):
+                    continue
 
-    def leer_sii(self):
-        # Define ruta de archivos a leer
-        registro = glob.glob("crudos/base_de_datos_facturas/SII/*REGISTRO*.csv")
-        no_incluir = glob.glob("crudos/base_de_datos_facturas/SII/*NO_INCLUIR*.csv")
-        pendientes = glob.glob("crudos/base_de_datos_facturas/SII/*PENDIENTE*.csv")
-        reclamados = glob.glob("crudos/base_de_datos_facturas/SII/*RECLAMADO*.csv")
+                ruta_archivo = os.path.join(tipo_documento_a_leer, carpeta_base_de_datos, archivo)
+                inicio, fin = self.obtener_periodo_de_nombre(archivo)
+                if inicio is None and carpeta_base_de_datos in SONDEO_PERIODO_ARCHIVOS:
+                    inicio, fin = self.sondear_periodo_archivo(
+                        carpeta_base_de_datos, ruta_archivo, sondeos
+                    )
+                filas_catalogo.append({"archivo": ruta_archivo, "inicio": inicio, "fin": fin})
 
-        # Renombra Fecha Acuse a Fecha de Reclamo (6 de ~74000 documentos tienen registros)
-        df_registro = (
-            self.lector_csv_sii(archivo, COLUMNAS_SII_REGISTRO_O_NO_INCLUIR) for archivo in registro
-        )
-        df_registro = pd.concat(df_registro).rename(columns={"Fecha Acuse": "Fecha Reclamo"})
-        # df_registro["tipo"] = "registro"
+            catalogo[carpeta_base_de_datos] = pd.DataFrame(
+                filas_catalogo, columns=["archivo", "inicio", "fin"]
+            ).astype({"inicio": "datetime64[ns]", "fin": "datetime64[ns]"})
 
-        # Renombra Fecha Acuse a Fecha de Reclamo (Ninguna tiene un valor)
-        df_no_incluir = (
-            self.lector_csv_sii(archivo, COLUMNAS_SII_REGISTRO_O_NO_INCLUIR)
-            for archivo in no_incluir
-        )
-        df_no_incluir = pd.concat(df_no_incluir).rename(columns={"Fecha Acuse": "Fecha Reclamo"})
-        # df_no_incluir["tipo"] = "no_incluir"
+        if len(sondeos) > cantidad_sondeos:
+            self.guardar_sondeos_periodo(sondeos)
 
-        # Agrega la columna Fecha de Reclamo para alinear dfs
-        df_pendientes = (
-            self.lector_csv_sii(archivo, COLUMNAS_SII_PENDIENTES) for archivo in pendientes
-        )
-        df_pendientes = pd.concat(df_pendientes)
-        df_pendientes.insert(8, "Fecha Reclamo", np.nan)
-        # df_pendientes["tipo"] = "pendientes"
+        return catalogo
 
-        # Se mantiene el archivo como esta
-        df_reclamados = (
-            self.lector_csv_sii(archivo, COLUMNAS_SII_RECLAMADAS) for archivo in reclamados
-        )
-        df_reclamados = pd.concat(df_reclamados)
-        # df_reclamados["tipo"] = "reclamados"
+    def obtener_periodo_de_nombre(self, nombre_archivo):
+        """
+        Esta función obtiene el período que cubre un archivo a partir de su nombre: los meses
+        (ej: 202403) o, si no tiene, los años (ej: 2024) que aparecen en él. Retorna (None, None)
+        si el nombre no tiene ninguno.
+        """
+        meses = re.findall(PATRON_MES_ARCHIVO, nombre_archivo)
+        if meses:
+            periodos = [pd.Period(f"{año}-{mes}", "M") for año, mes in meses]
+        else:
+            periodos = [
+                pd.Period(año, "Y") for año in re.findall(PATRON_AÑO_ARCHIVO, nombre_archivo)
+            ]
 
-        # Une todos los tipos de documentos luego de alinear todos los dfs
-        df_sumada = pd.concat([df_registro, df_no_incluir, df_pendientes, df_reclamados])
-        df_sumada = df_sumada.rename(columns={"RUT Proveedor": "RUT Emisor"})
+        if not periodos:
+            return None, None
 
-        # Pone Notas de Credito/Debito en negativo
-        COLUMNAS_NEGATIVAS = ["Monto Exento", "Monto Neto", "Monto IVA Recuperable", "Monto Total"]
-        mask_negativas = (df_sumada["Tipo Doc"] == 61) | (df_sumada["Tipo Doc"] == 56)
-        df_sumada.loc[mask_negativas, COLUMNAS_NEGATIVAS] = (
-            df_sumada.loc[mask_negativas, COLUMNAS_NEGATIVAS] * -1
+        return (
+            min(periodos).start_time.normalize(),
+            max(periodos).end_time.normalize(),
         )
 
-        # Elimina documentos duplicados con mismo tipo de doc, rut y folio (casos de facturas en
-        # pendientes y registro)
-        df_sumada = df_sumada.drop_duplicates(subset=["Tipo Doc", "RUT Emisor", "Folio"])
-
-        return df_sumada
-
-    def leer_turbo(self, lista_archivos):
-        dfs = map(lambda x: pd.read_excel(x, header=3), lista_archivos)
-        df_sumada = pd.concat(dfs)
-        df_sumada = df_sumada.rename(
-            columns={"Rut": "RUT Emisor", "Folio": "Folio_interno", "NºDoc.": "Folio"}
+    def sondear_periodo_archivo(self, base_de_datos, ruta_archivo, sondeos):
+        """
+        Esta función obtiene el período de un archivo leyendo sólo su columna de fecha. Los
+        sondeos se guardan en el diccionario sondeos, según la ruta, fecha de modificación y
+        tamaño del archivo.
+        """
+        estado_archivo = os.stat(ruta_archivo)
+        llave_sondeo = json.dumps(
+            [os.path.abspath(ruta_archivo), estado_archivo.st_mtime_ns, estado_archivo.st_size]
         )
+        if llave_sondeo not in sondeos:
+            columna_fecha, nombre_formato, parametros = SONDEO_PERIODO_ARCHIVOS[base_de_datos]
+            print(f"Obteniendo el período de {ruta_archivo}...")
+            try:
+                if ruta_archivo.lower().endswith(".csv"):
+                    fechas = pd.read_csv(ruta_archivo, usecols=[columna_fecha], **parametros)
+                else:
+                    fechas = self.leer_excel(
+                        ruta_archivo, base_de_datos, usecols=[columna_fecha], **parametros
+                    )
+            except ValueError as error:
+                print(f"No se pudo obtener el período de {ruta_archivo}: {error}")
+                return None, None
+
+            # Quita los encabezados repetidos (SIGFE) antes de convertir las fechas
+            fechas = fechas[columna_fecha].dropna()
+            fechas = self.convertir_fechas(fechas[fechas != columna_fecha], nombre_formato)
+            sondeos[llave_sondeo] = [
+                None if pd.isna(fechas.min()) else fechas.min().normalize().isoformat(),
+                None if pd.isna(fechas.max()) else fechas.max().normalize().isoformat(),
+            ]
+
+        inicio, fin = sondeos[llave_sondeo]
+        return (pd.Timestamp(inicio), pd.Timestamp(fin)) if inicio else (None, None)
+
+    def leer_sondeos_periodo(self):
+        ruta_sondeos = self.obtener_ruta_entrada(CARPETA_CACHE, "periodos_archivos.json")
+        if not (self.usar_cache and os.path.exists(ruta_sondeos)):
+            return {}
+
+        with open(ruta_sondeos, encoding="utf-8") as archivo:
+            return json.load(archivo)
+
+    def guardar_sondeos_periodo(self, sondeos):
+        if not self.usar_cache:
+            return
+
+        os.makedirs(self.obtener_ruta_entrada(CARPETA_CACHE), exist_ok=True)
+        ruta_sondeos = self.obtener_ruta_entrada(CARPETA_CACHE, "periodos_archivos.json")
+        ruta_temporal = f"{ruta_sondeos}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(ruta_temporal, "w", encoding="utf-8") as archivo:
+            json.dump(sondeos, archivo)
+        os.replace(ruta_temporal, ruta_sondeos)
+
+    def seleccionar_archivos_del_periodo(self, base_de_datos, catalogo_base, periodo):
+        """
+        Esta función deja sólo los archivos del catálogo de una base de datos que cubren alguna
+        parte del período, más los archivos sin período conocido.
 
-        df_sumada["Folio"] = df_sumada["Folio"].astype(str).str.replace(".0", "", regex=False)
-        df_sumada["Monto"] = df_sumada["Monto"].astype("Int64")
+        Si ningún archivo de una base distinta al SII cubre el período (ej: en enero, antes de
+        que exista el archivo del año), se lee su archivo más reciente anterior al período. Así la
+        planilla tiene todas sus columnas, y como se une por llave a los documentos del SII, los
+        documentos de otros períodos no se agregan a la planilla.
+        """
+        inicio, fin = periodo
+        con_periodo = catalogo_base["inicio"].notna()
+        en_periodo = (catalogo_base["inicio"] <= fin) & (catalogo_base["fin"] >= inicio)
+
+        if base_de_datos != "SII" and con_periodo.any() and not en_periodo.any():
+            anteriores = catalogo_base[con_periodo & (catalogo_base["inicio"] <= fin)]
+            if anteriores.empty:
+                anteriores = catalogo_base[con_periodo]
+            mas_reciente = anteriores["fin"].idxmax()
+            en_periodo[mas_reciente] = True
+            print(
+                f"{base_de_datos} no tiene archivos entre {inicio.date()} y {fin.date()}, se lee "
+                f"{os.path.basename(catalogo_base.loc[mas_reciente, 'archivo'])}"
+            )
 
-        return df_sumada
+        return catalogo_base[en_periodo | ~con_periodo]
 
-    def obtener_oc_base_de_datos(self, archivos_a_leer):
+    def obtener_facturas_base_de_datos(self, archivos_a_leer):
         diccionario_base_de_datos = {}
         for base_de_datos, lista_archivos in archivos_a_leer.items():
-            print(f"Leyendo {base_de_datos}")
-            if base_de_datos == "SIGFE_REPORTS":
-                df_sumada = self.leer_sigfe_reports(lista_archivos)
+            df_sumada = self.leer_base_de_datos_facturas(base_de_datos, lista_archivos)
+            df_sumada = self.normalizar_base_de_datos_facturas(df_sumada, base_de_datos)
 
             diccionario_base_de_datos[base_de_datos] = df_sumada
 
         return diccionario_base_de_datos
 
-    def leer_sigfe_reports(self, lista_archivos):
-        dfs = map(lambda x: pd.read_excel(x, header=5), lista_archivos)
-        df_sumada = pd.concat(dfs)
+    def leer_base_de_datos_facturas(self, base_de_datos, lista_archivos):
+        print(f"Leyendo {base_de_datos}")
+        if base_de_datos == "ACEPTA":
+            df_sumada = self.leer_acepta(lista_archivos)
 
-        return df_sumada
+        elif base_de_datos == "OBSERVACIONES":
+            df_sumada = self.leer_observaciones(lista_archivos)
 
-    def obtener_articulos_base_de_datos(self, archivos_a_leer):
-        diccionario_base_de_datos = {}
-        for base_de_datos, lista_archivos in archivos_a_leer.items():
-            print(f"Leyendo {base_de_datos}")
-            if base_de_datos == "MAESTRO_ARTICULOS":
-                df_sumada = self.leer_maestro_articulo(lista_archivos)
+        elif base_de_datos == "SCI":
+            df_sumada = self.leer_sci(lista_archivos)
 
-            elif base_de_datos == "LEY_PRESUPUESTOS":
-                df_sumada = self.leer_ley_de_presupuestos(lista_archivos)
+        elif base_de_datos == "SIGFE":
+            df_sumada = self.leer_sigfe(lista_archivos)
 
-            diccionario_base_de_datos[base_de_datos] = df_sumada
+        elif base_de_datos == "SII":
+            df_sumada = self.leer_sii(lista_archivos)
+            print(f"\nSII tiene {df_sumada.shape[0]} documentos totales\n")
 
-        return diccionario_base_de_datos
+        elif base_de_datos == "TURBO":
+            df_sumada = self.leer_turbo(lista_archivos)
 
-    def leer_maestro_articulo(self, lista_archivos):
-        dfs = map(lambda x: pd.read_excel(x, header=3), lista_archivos)
-        df_sumada = pd.concat(dfs)
+        else:
+            raise ValueError(f"No se sabe cómo leer la base de datos de facturas {base_de_datos}")
+
+        df_sumada = self.aplicar_tipos_datos_lectura(df_sumada, base_de_datos)
 
         return df_sumada
 
-    def leer_ley_de_presupuestos(self, lista_archivos):
-        dfs = map(pd.read_excel, lista_archivos)
-        df_sumada = pd.concat(dfs)
+    def aplicar_tipos_datos_lectura(self, df_sumada, base_de_datos):
+        """
+        Esta función asigna los tipos de datos de TIPOS_DATOS_LECTURA a una base de datos recién
+        leída, e informa la memoria que usa antes y después del cambio.
+        """
+        tipos_datos = TIPOS_DATOS_LECTURA.get(base_de_datos, {})
+        tipos_datos = {
+            columna: tipo_dato
+            for columna, tipo_dato in tipos_datos.items()
+            if columna in df_sumada.columns
+        }
+        if not tipos_datos:
+            return df_sumada
+
+        memoria_antes = df_sumada.memory_usage(deep=True).sum() / 1024**2
+        df_sumada = df_sumada.astype(tipos_datos)
+        memoria_despues = df_sumada.memory_usage(deep=True).sum() / 1024**2
+        print(
+            f"{base_de_datos} usa {memoria_despues:.1f} MB de memoria "
+            f"(antes de asignar tipos de datos: {memoria_antes:.1f} MB)"
+        )
 
         return df_sumada
 
-    def unir_dfs(self, diccionario_dfs_limpias):
+    def normalizar_base_de_datos_facturas(self, df_sumada, base_de_datos):
         """
-        Esta función permite unir todas las bases de datos según la llave RUT-DV + Folio SII.
-        - En este caso, se realiza un LEFT JOIN a la base de datos del SII. Esto, ya que es la base
-        de las facturas.
-        - El orden en que se agregan las bases de datos es: SII -> ACEPTA -> OBSERVACIONES -> SCI
-        -> SIGFE -> TURBO
+        Esta función deja la llave RUT-DV + Folio como índice de la base de datos, y agrega el
+        nombre de la base de datos a cada columna.
         """
-        print("\nUniendo todas las bases de datos!")
-        df_sii = diccionario_dfs_limpias.pop("SII")
-        lista_dfs_secuenciales = list(diccionario_dfs_limpias.values())
-
-        for df_derecha in lista_dfs_secuenciales:
-            df_sii = pd.merge(df_sii, df_derecha, how="left", left_index=True, right_index=True)
+        df_sumada["RUT Emisor"] = (
+            df_sumada["RUT Emisor"].str.replace(".", "", regex=False).str.upper().str.strip()
+        )
 
-        df_sii = df_sii[~df_sii.index.duplicated(keep="first")]
+        con_respaldo = base_de_datos in BASES_CON_LLAVE_RESPALDO
+        llaves = self.calcular_llave(df_sumada["RUT Emisor"], df_sumada["Folio"], con_respaldo)
+        llaves_invalidas = llaves.isna() | (llaves < 0)
+        if llaves_invalidas.any():
+            if con_respaldo:
+                print(
+                    f"{base_de_datos} tiene {llaves_invalidas.sum()} documentos con RUT o Folio "
+                    f"inválido, que se mantienen pero no se podrán unir con otras bases"
+                )
+            else:
+                print(
+                    f"{base_de_datos} tiene {llaves_invalidas.sum()} documentos con RUT o Folio "
+                    f"inválido, que no se podrán unir"
+                )
+                df_sumada = df_sumada.loc[~llaves_invalidas.to_numpy(dtype=bool)]
+                llaves = llaves[~llaves_invalidas]
+
+        df_sumada = df_sumada.set_index(pd.Index(llaves.to_numpy(dtype="int64"), name="llave"))
+
+        df_sumada.columns = df_sumada.columns + f"_{base_de_datos}"
+        df_sumada.columns = df_sumada.columns.str.replace(" ", "_")
 
-        return df_sii
+        return df_sumada
 
-    def calcular_tiempo_8_dias(self, df_unida):
+    def calcular_llave(self, rut, folio, con_respaldo=False):
         """
-        Esta función permite calcular la diferencia de tiempo entre el día actual, y el día en que
-        se recibió la factura ("Fecha Recepción SII").
+        Esta función calcula la llave compacta (entero de 64 bits) de cada documento a partir de
+        su RUT-DV normalizado (ej: 76123456-K) y su Folio.
 
-        Este calculo solo se realiza a las facturas que NO estén devengadas.
+        Retorna NA en los documentos con un RUT o Folio que no se puede representar. Si
+        con_respaldo es True, a esos documentos se les asigna su llave de respaldo (ver
+        calcular_llave_respaldo).
         """
-        print("Calculando los 8 días de las facturas!")
-        mask_no_devengadas = pd.isna(df_unida["Fecha_DEVENGO_SIGFE"])
-
-        df_unida["Fecha_Docto_SII"] = pd.to_datetime(
-            df_unida["Fecha_Docto_SII"], dayfirst=True, format="mixed"
-        )
-
-        df_unida["Fecha_Recepcion_SII"] = pd.to_datetime(
-            df_unida["Fecha_Recepcion_SII"], dayfirst=True, format="mixed"
+        partes_rut = rut.astype("string").str.extract(r"^(\d+)-([\dK])$")
+        cuerpo_rut = pd.to_numeric(partes_rut[0], errors="coerce")
+        dv = pd.to_numeric(partes_rut[1].replace("K", "10"), errors="coerce")
+        folio = pd.to_numeric(folio, errors="coerce")
+
+        mask_validas = (
+            cuerpo_rut.between(0, 2**BITS_RUT_LLAVE - 1)
+            & dv.notna()
+            & folio.between(0, 2**BITS_FOLIO_LLAVE - 1)
+            & (folio % 1 == 0)
         )
 
-        df_unida["Fecha_Reclamo_SII"] = pd.to_datetime(
-            df_unida["Fecha_Reclamo_SII"], dayfirst=True, format="mixed"
+        llaves = pd.Series(pd.NA, index=rut.index, dtype="Int64")
+        llaves[mask_validas] = (
+            (cuerpo_rut[mask_validas].to_numpy(dtype="int64") << (BITS_DV_LLAVE + BITS_FOLIO_LLAVE))
+            | (dv[mask_validas].to_numpy(dtype="int64") << BITS_FOLIO_LLAVE)
+            | folio[mask_validas].to_numpy(dtype="int64")
         )
+        if con_respaldo and not mask_validas.all():
+            llaves[~mask_validas] = self.calcular_llave_respaldo(
+                rut[~mask_validas], folio[~mask_validas]
+            )
 
-        diferencia = (
-            pd.to_datetime("today") - df_unida[mask_no_devengadas]["Fecha_Recepcion_SII"]
-        ) + pd.Timedelta(days=1)
-
-        df_unida["tiempo_diferencia_SII"] = round(diferencia / pd.Timedelta(days=1), 2)
-        esta_al_dia = df_unida[mask_no_devengadas]["tiempo_diferencia_SII"] <= 8
+        return llaves
 
-        df_unida["esta_al_dia"] = esta_al_dia
+    def calcular_llave_respaldo(self, rut, folio):
+        """
+        Esta función calcula la llave de respaldo de los documentos cuyo RUT o Folio no cabe en
+        la llave compacta: la huella (hash) de su llave_id, como un entero negativo. Así nunca
+        coincide con una llave compacta, y es la misma en cada corrida.
+        """
+        huellas = pd.util.hash_pandas_object(self.armar_llave_id(rut, folio), index=False)
 
-        return df_unida
+        return pd.Series(-((huellas.to_numpy() >> 1).astype("int64")) - 1, index=rut.index)
 
-    def obtener_referencias_nc(self, df_izquierda):
+    def armar_llave_id(self, rut, folio):
         """
-        Esta función permite obtener las referencias que contienen las Notas de Crédito, y
-        agregarlas a la columna REFERENCIAS
+        Esta función arma la llave_id legible (RUT-DV + Folio) directamente desde el RUT y el
+        Folio, para los documentos que no tienen una llave compacta.
         """
-        print("Referenciando las Notas de Crédito...")
-        # Copia la base de datos original, y resetea el indice para unir por la llave_id
-        tmp = df_izquierda.copy().reset_index()
-        # Obtiene Notas de Creditos, y elimina las que no tengan una referencia
-        referencias_nc = tmp.query("Tipo_Doc_SII == 61")["referencias_ACEPTA"].dropna()
-        referencias_facturas_validas = referencias_nc.apply(self.extraer_referencia_de_nc_de_json)
+        return rut.astype("string").fillna("") + self.convertir_codigos_a_texto(folio).fillna("")
 
-        # Agrega las referencias de documentos 33 como columna, y elimina los 0 iniciales
-        tmp["referencias_a_facturas"] = referencias_facturas_validas.str.lstrip("0")
-        tmp["referencias_a_facturas"] = tmp["RUT_Emisor_SII"] + tmp["referencias_a_facturas"]
+    def materializar_llave_id(self, llaves, rut=None, folio=None):
+        """
+        Esta función arma la llave_id legible (RUT-DV + Folio, ej: 76123456-K1234) a partir de
+        las llaves compactas. Las llaves de respaldo no se pueden decodificar, por lo que su
+        llave_id se arma con el RUT y Folio indicados (o queda vacía si no se indican).
+        """
+        valores = llaves.to_numpy(dtype="int64")
+        cuerpo_rut = valores >> (BITS_DV_LLAVE + BITS_FOLIO_LLAVE)
+        dv = (valores >> BITS_FOLIO_LLAVE) & (2**BITS_DV_LLAVE - 1)
+        folio_llave = valores & (2**BITS_FOLIO_LLAVE - 1)
+
+        llave_id = pd.Series(cuerpo_rut, index=llaves.index).astype(str) + "-"
+        llave_id += pd.Series(np.where(dv == 10, "K", dv.astype(str)), index=llaves.index)
+        llave_id += pd.Series(folio_llave, index=llaves.index).astype(str)
+
+        mask_respaldo = valores < 0
+        if mask_respaldo.any():
+            llave_id = llave_id.astype("string")
+            llave_id[mask_respaldo] = (
+                self.armar_llave_id(rut[mask_respaldo], folio[mask_respaldo])
+                if rut is not None
+                else pd.NA
+            )
 
-        # Une las referencias de las NC con sus facturas originales
-        referencias_a_nc = tmp.merge(
-            tmp, how="inner", left_on="llave_id", right_on="referencias_a_facturas"
-        )["llave_id_y"]
+        return llave_id
 
-        tmp["referencias_a_nc"] = referencias_a_nc
+    def leer_con_cache(self, lector, archivo, **parametros):
+        """
+        Esta función permite leer un archivo crudo utilizando un cache en formato Parquet.
 
-        # Consolida ambas referencias cruzadas en una unica columna
-        tmp["referencias_a_facturas"] = tmp["referencias_a_facturas"].fillna("")
-        tmp["referencias_a_nc"] = tmp["referencias_a_nc"].fillna("")
+        - La llave del cache considera la ruta, fecha de modificación y tamaño del archivo, junto
+        al lector y sus parámetros (por ej, header=3 o el diccionario COLUMNAS_ACEPTA).
+        - Si el archivo no ha cambiado, se lee el DataFrame ya normalizado desde el cache.
+        - Si el DataFrame no se puede guardar en Parquet (columnas con tipos mixtos), se lee
+        directamente el archivo crudo.
+        """
+        if not self.usar_cache:
+            return lector(archivo, **parametros)
 
-        # Elimina referencias vacias, quita el RUT y agrega indicador de Factura Electronica (FE)
-        referencias_a_facturas = tmp["referencias_a_facturas"].dropna()
-        referencias_a_facturas = referencias_a_facturas.str.split("-").str[1].str[1:]
-        referencias_a_facturas = "FE: " + referencias_a_facturas
+        ruta_cache = self.obtener_ruta_cache(lector.__name__, archivo, parametros)
+        if os.path.exists(ruta_cache):
+            return pd.read_parquet(ruta_cache)
 
-        # Elimina referencias a NC, quita el RUT y agrega indicador de Nota de Credito (NC)
-        referencias_a_nc = tmp["referencias_a_nc"].dropna()
-        referencias_a_nc = referencias_a_nc.str.split("-").str[1].str[1:]
-        referencias_a_nc = " NC: " + referencias_a_nc
+        df = lector(archivo, **parametros)
 
-        # Vuelve a agregar las referencias formateadas
-        tmp["referencias_a_facturas"] = referencias_a_facturas
-        tmp["referencias_a_nc"] = referencias_a_nc
+        # Escribe primero a un archivo temporal, para no dejar caches a medio escribir
+        os.makedirs(self.obtener_ruta_entrada(CARPETA_CACHE), exist_ok=True)
+        ruta_temporal = f"{ruta_cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(ruta_temporal)
+            os.replace(ruta_temporal, ruta_cache)
+        except (ImportError, ValueError, TypeError, NotImplementedError) as error:
+            print(f"No se pudo guardar el cache de {archivo}: {error}")
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
 
-        # Llena espacios vacios de referencias, para poder sumar ambas columnas
-        tmp["referencias_a_facturas"] = tmp["referencias_a_facturas"].fillna("")
-        tmp["referencias_a_nc"] = tmp["referencias_a_nc"].fillna("")
+        return df
 
-        # Consolida referencias de FE y NC en una unica columna
-        tmp["REFERENCIAS"] = tmp["referencias_a_facturas"] + tmp["referencias_a_nc"]
+    def leer_archivos(self, lector, lista_archivos, tipo_archivo, **parametros):
+        """
+        Esta función permite leer una lista de archivos en paralelo, y unirlos en un único
+        DataFrame.
+
+        - Los archivos "excel" se leen con el pool de procesos de la corrida, ya que su lectura
+        usa la CPU, siempre que los que no están en el cache sean suficientes para pagar el
+        costo de lanzar los procesos (ver conviene_pool_procesos).
+        - El resto de los archivos se leen con un pool de hilos.
+        - Los DataFrames se unen en el mismo orden de lista_archivos, sin importar qué archivo
+        termine de leerse primero.
+        """
+        leer_archivo = functools.partial(self.leer_con_cache, lector, **parametros)
+
+        if self.n_procesos == 1 or len(lista_archivos) <= 1:
+            dfs = list(map(leer_archivo, lista_archivos))
+
+        elif tipo_archivo == "excel" and self.conviene_pool_procesos(
+            lector, lista_archivos, parametros
+        ):
+            dfs = list(self.obtener_pool_procesos().map(leer_archivo, lista_archivos))
+
+        else:
+            with ThreadPoolExecutor(self.n_procesos) as ejecutor:
+                dfs = list(ejecutor.map(leer_archivo, lista_archivos))
+
+        return pd.concat(dfs)
+
+    def conviene_pool_procesos(self, lector, lista_archivos, parametros):
+        """
+        Esta función indica si conviene leer los archivos con el pool de procesos: deben faltar
+        en el cache más de un archivo, y sumar al menos BYTES_MINIMOS_POOL_PROCESOS.
+        """
+        archivos_a_leer = [
+            archivo
+            for archivo in lista_archivos
+            if not self.usar_cache
+            or not os.path.exists(self.obtener_ruta_cache(lector.__name__, archivo, parametros))
+        ]
+
+        return (
+            len(archivos_a_leer) > 1
+            and sum(map(os.path.getsize, archivos_a_leer)) >= BYTES_MINIMOS_POOL_PROCESOS
+        )
+
+    def obtener_pool_procesos(self):
+        """
+        Esta función entrega el pool de procesos de la corrida, y lo crea la primera vez que se
+        pide. Todas las bases en Excel comparten el mismo pool, para no lanzar n_procesos
+        intérpretes por cada una.
+        """
+        with self.candado_pool:
+            if self.pool_procesos is None:
+                # Usa "spawn" (igual que en Windows), ya que hacer fork mientras otros hilos leen
+                # archivos puede dejar bloqueados a los procesos hijos
+                contexto = multiprocessing.get_context("spawn")
+                self.pool_procesos = ProcessPoolExecutor(self.n_procesos, mp_context=contexto)
+
+            return self.pool_procesos
+
+    def cerrar_pool_procesos(self):
+        with self.candado_pool:
+            if self.pool_procesos is not None:
+                self.pool_procesos.shutdown()
+                self.pool_procesos = None
+
+    def obtener_ruta_cache(self, nombre_lector, archivo, parametros):
+        """
+        Esta función obtiene la ruta del cache de un archivo crudo. Los archivos de las bases en
+        Excel (con base_de_datos en los parámetros) incluyen en la llave el motor con que se
+        leen, ya que cada motor puede entregar distintos tipos de datos.
+        """
+        estado_archivo = os.stat(archivo)
+        base_de_datos = parametros.get("base_de_datos")
+        motores = (
+            self.obtener_motores_excel(archivo, base_de_datos)
+            if base_de_datos in BASES_DE_DATOS_EXCEL
+            else []
+        )
+        llave = json.dumps(
+            [
+                VERSION_CACHE,
+                nombre_lector,
+                os.path.abspath(archivo),
+                estado_archivo.st_mtime_ns,
+                estado_archivo.st_size,
+                repr(sorted(parametros.items())),
+                motores[:1],
+            ]
+        )
+        hash_llave = hashlib.sha1(llave.encode("utf-8")).hexdigest()
+
+        return self.obtener_ruta_entrada(CARPETA_CACHE, f"{hash_llave}.parquet")
+
+    def leer_acepta(self, lista_archivos):
+        acepta_unido = self.leer_archivos(
+            self.leer_archivo_acepta,
+            [archivo for archivo in lista_archivos if archivo.lower().endswith((".xls", ".xlsx"))],
+            "excel",
+            base_de_datos="ACEPTA",
+            tipo_datos=COLUMNAS_ACEPTA,
+            columnas=self.obtener_columnas_a_leer("ACEPTA"),
+        )
+
+        return acepta_unido
+
+    def leer_archivo_acepta(self, archivo, base_de_datos, tipo_datos, columnas):
+        usecols = list(filter(self.filtrar_columnas(base_de_datos, columnas), tipo_datos.keys()))
+        df = self.leer_excel(archivo, base_de_datos, usecols=usecols, dtype=tipo_datos)
+        df = df.rename(columns=RENOMBRES_COLUMNAS["ACEPTA"])
+
+        return df
+
+    def leer_observaciones(self, lista_archivos):
+        """
+        Esta función importa los archivos de OBSERVACIONES que cambiaron, y luego lee todas las
+        observaciones desde la base de observaciones.
+        """
+        self.importar_observaciones_csv(lista_archivos)
+
+        with contextlib.closing(self.conectar_observaciones()) as conexion:
+            df_sumada = pd.read_sql_query(
+                'SELECT rut_emisor AS "RUT Emisor", folio AS "Folio", observacion AS "OBSERVACION" '
+                "FROM observaciones ORDER BY llave_id",
+                conexion,
+            )
+
+        return df_sumada
+
+    def leer_archivo_observaciones(self, archivo, columnas):
+        df = pd.read_csv(
+            archivo,
+            encoding="utf-8",
+            delimiter=";",
+            usecols=self.filtrar_columnas("OBSERVACIONES", columnas),
+            dtype=str,
+            keep_default_na=False,
+        )
+        df = df.rename(columns=RENOMBRES_COLUMNAS["OBSERVACIONES"])
+
+        return df
+
+    def conectar_observaciones(self):
+        """
+        Esta función abre la base de observaciones, y crea sus tablas si no existen. Cada hilo
+        debe abrir su propia conexión.
+        """
+        conexion = sqlite3.connect(self.obtener_ruta_entrada(ARCHIVO_OBSERVACIONES), timeout=60)
+        conexion.executescript(ESQUEMA_OBSERVACIONES)
+
+        return conexion
+
+    def importar_observaciones_csv(self, lista_archivos):
+        """
+        Esta función actualiza la base de observaciones con los archivos de OBSERVACIONES que
+        cambiaron desde la última importación (según su fecha de modificación y tamaño). De cada
+        archivo sólo se leen las columnas de llave y observación.
+
+        - Si una llave aparece en más de un archivo, se mantiene su primera observación no vacía.
+        - Las llaves que sólo tienen observaciones vacías se borran de la base (se borró la
+        observación en el archivo).
+        """
+        with contextlib.closing(self.conectar_observaciones()) as conexion:
+            importados = {
+                archivo: (modificado_ns, bytes_archivo)
+                for archivo, modificado_ns, bytes_archivo in conexion.execute(
+                    "SELECT archivo, modificado_ns, bytes FROM archivos_importados"
+                )
+            }
+
+            archivos_cambiados = []
+            for archivo in lista_archivos:
+                estado_archivo = os.stat(archivo)
+                estado_importado = (estado_archivo.st_mtime_ns, estado_archivo.st_size)
+                if importados.get(os.path.abspath(archivo)) != estado_importado:
+                    archivos_cambiados.append(archivo)
+
+            if not archivos_cambiados:
+                return
+
+            print(f"Importando las observaciones de {len(archivos_cambiados)} archivos...")
+            columnas = self.obtener_columnas_a_leer("OBSERVACIONES")
+            observaciones = pd.concat(
+                [
+                    self.leer_archivo_observaciones(archivo, columnas)
+                    for archivo in archivos_cambiados
+                ]
+            )
+            with conexion:
+                self.escribir_observaciones(conexion, observaciones)
+                for archivo in archivos_cambiados:
+                    self.marcar_archivo_importado(conexion, archivo)
+
+    def actualizar_observaciones(self, observaciones):
+        """
+        Esta función guarda observaciones directamente en la base de observaciones, sin pasar
+        por los archivos de OBSERVACIONES. observaciones es un DataFrame con las columnas
+        RUT_Emisor_SII, Folio_SII y OBSERVACION_OBSERVACIONES (vacía para borrar la observación).
+        Sólo se escriben las filas indicadas.
+        """
+        observaciones = observaciones.rename(columns=RENOMBRES_COLUMNAS["OBSERVACIONES"])
+        with contextlib.closing(self.conectar_observaciones()) as conexion, conexion:
+            self.escribir_observaciones(conexion, observaciones.fillna("").astype(str))
+
+    def escribir_observaciones(self, conexion, observaciones):
+        """
+        Esta función inserta o actualiza (upsert) las observaciones no vacías, y borra las
+        llaves que sólo tienen observaciones vacías. La fecha actualizado sólo cambia si cambió
+        la observación.
+        """
+        rut_emisor = (
+            observaciones["RUT Emisor"].str.replace(".", "", regex=False).str.upper().str.strip()
+        )
+        folio = observaciones["Folio"].str.strip().str.replace(r"\.0$", "", regex=True)
+        observacion = observaciones["OBSERVACION"].str.strip()
+        df = pd.DataFrame(
+            {
+                "llave_id": rut_emisor + folio,
+                "rut_emisor": rut_emisor,
+                "folio": folio,
+                "observacion": observacion,
+            }
+        )
+
+        mask_vacias = df["observacion"] == ""
+        con_observacion = df[~mask_vacias].drop_duplicates("llave_id")
+        llaves_sin_observacion = set(df.loc[mask_vacias, "llave_id"]) - set(
+            con_observacion["llave_id"]
+        )
+
+        ahora = datetime.datetime.now().isoformat(timespec="seconds")
+        conexion.executemany(
+            "INSERT INTO observaciones VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (llave_id) DO UPDATE SET observacion = excluded.observacion, "
+            "actualizado = excluded.actualizado WHERE observacion != excluded.observacion",
+            ((*fila, ahora, ahora) for fila in con_observacion.itertuples(index=False, name=None)),
+        )
+        conexion.executemany(
+            "DELETE FROM observaciones WHERE llave_id = ?",
+            ((llave_id,) for llave_id in llaves_sin_observacion),
+        )
+
+    def marcar_archivo_importado(self, conexion, archivo):
+        estado_archivo = os.stat(archivo)
+        conexion.execute(
+            "INSERT OR REPLACE INTO archivos_importados VALUES (?, ?, ?)",
+            (os.path.abspath(archivo), estado_archivo.st_mtime_ns, estado_archivo.st_size),
+        )
+
+    def leer_sci(self, lista_archivos):
+        df_sumada = self.leer_archivos(
+            self.leer_archivo_sci,
+            lista_archivos,
+            "csv",
+            columnas=self.obtener_columnas_a_leer("SCI"),
+        )
+
+        return df_sumada
+
+    def leer_archivo_sci(self, archivo, columnas):
+        df = pd.read_csv(archivo, delimiter=",", usecols=self.filtrar_columnas("SCI", columnas))
+        df = df.rename(columns=RENOMBRES_COLUMNAS["SCI"])
+
+        df["Folio"] = df["Folio"].astype(str).str.replace(".0", "", regex=False)
+
+        return df
+
+    def leer_sigfe(self, lista_archivos):
+        df_sumada = self.leer_archivos(self.leer_archivo_sigfe, lista_archivos, "csv", header=10)
+        df_sumada = df_sumada.reset_index(drop=True)
+
+        agregaciones = dict(AGREGACIONES_SIGFE)
+        for nombre_agregacion in self.agregaciones_sigfe_extra:
+            agregaciones[nombre_agregacion] = AGREGACIONES_SIGFE_OPCIONALES[nombre_agregacion]
+
+        # Los montos vienen con separador de miles (ej: 1.234.567)
+        for columna_monto in ("Debe", "Haber"):
+            if any(columna == columna_monto for columna, _ in agregaciones.values()):
+                df_sumada[columna_monto] = pd.to_numeric(
+                    df_sumada[columna_monto].astype(str).str.replace(".", "", regex=False),
+                    errors="coerce",
+                )
+
+        # Obtiene el devengo y pago más antiguo de cada documento en una sola agrupación
+        df_sumada = df_sumada.groupby(by=["RUT Emisor", "Folio"]).agg(**agregaciones).reset_index()
+
+        return df_sumada
+
+    def leer_archivo_sigfe(self, archivo, header):
+        df = pd.read_csv(archivo, delimiter=",", header=header, usecols=COLUMNAS_SIGFE)
+        df = df.dropna(subset=["Folio"])
+        df = df.query('`Cuenta Contable` != "Cuenta Contable"')
+
+        df = df.rename(columns={"Folio": "Folio_interno", "Número ": "Folio"})
+        df = df.reset_index(drop=True)
+
+        df["RUT Emisor"] = df["Principal"].str.split(" ").str[0]
+
+        df["Fecha"] = self.convertir_fechas(df["Fecha"], "Fecha_SIGFE")
+        df["Folio_interno"] = df["Folio_interno"].astype("Int32")
+
+        mask_debe = df["Debe"] != "0"
+        mask_haber = df["Haber"] != "0"
+
+        df["Folio_interno PAGO"] = df["Folio_interno"].where(mask_debe)
+        df["Fecha PAGO"] = df["Fecha"].where(mask_debe)
+
+        df["Folio_interno DEVENGO"] = df["Folio_interno"].where(mask_haber)
+        df["Fecha DEVENGO"] = df["Fecha"].where(mask_haber)
+
+        df["RUT Emisor"] = (
+            df["RUT Emisor"].str.replace(".", "", regex=False).str.upper().str.strip()
+        )
+
+        return df
+
+    def lector_csv_sii(self, lista_archivos, tipo_datos):
+        return self.leer_archivos(
+            self.leer_archivo_sii, lista_archivos, "csv", tipo_datos=tipo_datos
+        )
+
+    def leer_archivo_sii(self, archivo, tipo_datos, chunksize=None):
+        """
+        Esta función lee un archivo del SII, con sus columnas de FECHAS_SII ya convertidas. Si
+        se indica chunksize, retorna un iterador con bloques de esa cantidad de filas.
+        """
+        df = pd.read_csv(
+            archivo,
+            delimiter=";",
+            index_col=False,
+            usecols=list(tipo_datos.keys()),
+            dtype=tipo_datos,
+            chunksize=chunksize,
+        )
+        if chunksize is not None:
+            return map(self.convertir_fechas_sii, df)
+
+        return self.convertir_fechas_sii(df)
+
+    def convertir_fechas_sii(self, df):
+        for columna, nombre_formato in FECHAS_SII.items():
+            if columna in df.columns:
+                df[columna] = self.convertir_fechas(df[columna], nombre_formato)
+
+        return df
+
+    def leer_sii(self, lista_archivos):
+        # Separa los archivos a leer según su tipo. Si un documento está en más de un tipo de
+        # archivo, se mantiene el del primero (ej: facturas en pendientes y registro)
+        archivos_por_tipo = {
+            "REGISTRO": (
+                self.filtrar_archivos_sii(lista_archivos, "REGISTRO"),
+                COLUMNAS_SII_REGISTRO_O_NO_INCLUIR,
+            ),
+            "NO_INCLUIR": (
+                self.filtrar_archivos_sii(lista_archivos, "NO_INCLUIR"),
+                COLUMNAS_SII_REGISTRO_O_NO_INCLUIR,
+            ),
+            "PENDIENTE": (
+                self.filtrar_archivos_sii(lista_archivos, "PENDIENTE"),
+                COLUMNAS_SII_PENDIENTES,
+            ),
+            "RECLAMADO": (
+                self.filtrar_archivos_sii(lista_archivos, "RECLAMADO"),
+                COLUMNAS_SII_RECLAMADAS,
+            ),
+        }
+
+        if self.filas_por_bloque_sii:
+            return self.leer_sii_por_bloques(archivos_por_tipo)
+
+        # Une todos los tipos de documentos luego de alinear todos los dfs
+        df_sumada = pd.concat(
+            [
+                self.alinear_documentos_sii(self.lector_csv_sii(archivos, tipo_datos))
+                for archivos, tipo_datos in archivos_por_tipo.values()
+            ]
+        )
+
+        # Elimina documentos duplicados con mismo tipo de doc, rut y folio (casos de facturas en
+        # pendientes y registro)
+        df_sumada = df_sumada.drop_duplicates(subset=["Tipo Doc", "RUT Emisor", "Folio"])
+
+        return df_sumada
+
+    def filtrar_archivos_sii(self, lista_archivos, tipo_archivo):
+        return [
+            archivo
+            for archivo in lista_archivos
+            if tipo_archivo in os.path.basename(archivo) and archivo.lower().endswith(".csv")
+        ]
+
+    def alinear_documentos_sii(self, df):
+        """
+        Esta función deja los documentos de cualquier tipo de archivo del SII con las mismas
+        columnas, y pone en negativo los montos de las Notas de Crédito/Débito.
+        """
+        # Registro y No incluir traen Fecha Acuse, que se renombra a Fecha de Reclamo (6 de
+        # ~74000 documentos tienen registros). Pendientes no la trae, y se agrega para alinear
+        df = df.rename(columns={"Fecha Acuse": "Fecha Reclamo", "RUT Proveedor": "RUT Emisor"})
+        if "Fecha Reclamo" not in df.columns:
+            df.insert(8, "Fecha Reclamo", pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]"))
+
+        # Pone Notas de Credito/Debito en negativo
+        COLUMNAS_NEGATIVAS = ["Monto Exento", "Monto Neto", "Monto IVA Recuperable", "Monto Total"]
+        mask_negativas = (df["Tipo Doc"] == 61) | (df["Tipo Doc"] == 56)
+        df.loc[mask_negativas, COLUMNAS_NEGATIVAS] = df.loc[mask_negativas, COLUMNAS_NEGATIVAS] * -1
+
+        return df
+
+    def leer_sii_por_bloques(self, archivos_por_tipo):
+        """
+        Esta función lee los archivos del SII por bloques de filas_por_bloque_sii filas. Cada
+        bloque se alinea antes de guardarlo, por lo que sólo se mantiene en memoria un bloque
+        crudo a la vez.
+
+        - De cada bloque se guarda la huella (hash) del tipo de doc, rut y folio de sus
+        documentos, y al final se quitan los documentos ya leídos con una sola pasada sobre
+        todas las huellas (se mantiene el primero, igual que al leer sin bloques).
+        - Los archivos se leen de a uno y sin el cache de lectura, ya que el cache guarda cada
+        archivo completo (leerlo entero usaría la memoria que los bloques buscan acotar).
+        """
+        if self.usar_cache:
+            print("Ojo! Al leer el SII por bloques no se usa el cache de lectura para el SII")
+
+        bloques = []
+        huellas_bloques = []
+        for archivos, tipo_datos in archivos_por_tipo.values():
+            for archivo in archivos:
+                for bloque in self.leer_archivo_sii(
+                    archivo, tipo_datos, chunksize=self.filas_por_bloque_sii
+                ):
+                    bloque = self.alinear_documentos_sii(bloque)
+                    bloques.append(bloque)
+                    huellas_bloques.append(
+                        pd.util.hash_pandas_object(
+                            bloque[["Tipo Doc", "RUT Emisor", "Folio"]], index=False
+                        ).to_numpy()
+                    )
+
+        mask_nuevos = ~pd.Series(np.concatenate(huellas_bloques)).duplicated().to_numpy()
+
+        return pd.concat(bloques)[mask_nuevos]
+
+    def leer_turbo(self, lista_archivos):
+        df_sumada = self.leer_archivos(
+            self.leer_archivo_turbo,
+            lista_archivos,
+            "excel",
+            base_de_datos="TURBO",
+            header=3,
+            columnas=self.obtener_columnas_a_leer("TURBO"),
+        )
+
+        return df_sumada
+
+    def leer_archivo_turbo(self, archivo, base_de_datos, header, columnas):
+        df = self.leer_archivo_excel(archivo, base_de_datos, header, columnas)
+        df = df.rename(columns=RENOMBRES_COLUMNAS["TURBO"])
+
+        df["Folio"] = df["Folio"].astype(str).str.replace(".0", "", regex=False)
+        df["Monto"] = df["Monto"].astype("Int64")
+
+        return df
+
+    def obtener_oc_base_de_datos(self, archivos_a_leer):
+        diccionario_base_de_datos = {}
+        for base_de_datos, lista_archivos in archivos_a_leer.items():
+            df_sumada = self.leer_base_de_datos_oc(base_de_datos, lista_archivos)
+
+            diccionario_base_de_datos[base_de_datos] = df_sumada
+
+        return diccionario_base_de_datos
+
+    def leer_base_de_datos_oc(self, base_de_datos, lista_archivos):
+        print(f"Leyendo {base_de_datos}")
+        if base_de_datos == "SIGFE_REPORTS":
+            df_sumada = self.leer_sigfe_reports(lista_archivos)
+
+        else:
+            raise ValueError(f"No se sabe cómo leer la base de datos de OC {base_de_datos}")
+
+        df_sumada = self.aplicar_tipos_datos_lectura(df_sumada, base_de_datos)
+
+        return df_sumada
+
+    def leer_sigfe_reports(self, lista_archivos):
+        df_sumada = self.leer_archivos(
+            self.leer_archivo_excel,
+            lista_archivos,
+            "excel",
+            base_de_datos="SIGFE_REPORTS",
+            header=5,
+            columnas=self.obtener_columnas_a_leer("SIGFE_REPORTS"),
+        )
+
+        return df_sumada
+
+    def obtener_articulos_base_de_datos(self, archivos_a_leer):
+        diccionario_base_de_datos = {}
+        for base_de_datos, lista_archivos in archivos_a_leer.items():
+            df_sumada = self.leer_base_de_datos_articulos(base_de_datos, lista_archivos)
+
+            diccionario_base_de_datos[base_de_datos] = df_sumada
+
+        return diccionario_base_de_datos
+
+    def leer_base_de_datos_articulos(self, base_de_datos, lista_archivos):
+        print(f"Leyendo {base_de_datos}")
+        if base_de_datos == "MAESTRO_ARTICULOS":
+            df_sumada = self.leer_maestro_articulo(lista_archivos)
+
+        elif base_de_datos == "LEY_PRESUPUESTOS":
+            df_sumada = self.leer_ley_de_presupuestos(lista_archivos)
+
+        else:
+            raise ValueError(f"No se sabe cómo leer la base de datos de articulos {base_de_datos}")
+
+        df_sumada = self.aplicar_tipos_datos_lectura(df_sumada, base_de_datos)
+
+        return df_sumada
+
+    def leer_maestro_articulo(self, lista_archivos):
+        df_sumada = self.leer_archivos(
+            self.leer_archivo_excel,
+            lista_archivos,
+            "excel",
+            base_de_datos="MAESTRO_ARTICULOS",
+            header=3,
+            columnas=self.obtener_columnas_a_leer("MAESTRO_ARTICULOS"),
+        )
+
+        return df_sumada
+
+    def leer_ley_de_presupuestos(self, lista_archivos):
+        df_sumada = self.leer_archivos(
+            self.leer_archivo_excel,
+            lista_archivos,
+            "excel",
+            base_de_datos="LEY_PRESUPUESTOS",
+            header=0,
+            columnas=self.obtener_columnas_a_leer("LEY_PRESUPUESTOS"),
+        )
+
+        return df_sumada
+
+    def leer_archivo_excel(self, archivo, base_de_datos, header, columnas):
+        return self.leer_excel(
+            archivo,
+            base_de_datos,
+            header=header,
+            usecols=self.filtrar_columnas(base_de_datos, columnas),
+        )
+
+    def obtener_columnas_a_leer(self, base_de_datos):
+        """
+        Esta función obtiene los nombres de la tabla unida que se necesitan de una base de datos:
+        las columnas de ESQUEMA_PLANILLA y las de COLUMNAS_ETAPAS. Se retornan ordenadas, ya que
+        forman parte de la llave del cache de lectura.
+        """
+        return sorted(set(ESQUEMA_PLANILLA) | set(COLUMNAS_ETAPAS.get(base_de_datos, [])))
+
+    def filtrar_columnas(self, base_de_datos, columnas):
+        """
+        Esta función retorna un filtro para el usecols de pandas, que deja sólo las columnas
+        crudas cuyo nombre en la tabla unida está en columnas.
+        """
+        renombres = RENOMBRES_COLUMNAS.get(base_de_datos, {})
+        sufijo = SUFIJOS_TABLA_UNIDA.get(base_de_datos)
+
+        def es_necesaria(columna):
+            columna = renombres.get(columna, columna)
+            if sufijo is None:
+                return f"{columna}_{base_de_datos}".replace(" ", "_") in columnas
+            return f"{columna}{sufijo}" in columnas
+
+        return es_necesaria
+
+    def leer_excel(self, archivo, base_de_datos, **parametros):
+        """
+        Esta función lee un archivo Excel con el primer motor de obtener_motores_excel que
+        funcione. Si un motor falla (ej: un archivo que calamine no soporta), se intenta con el
+        siguiente, y el último motor ya no atrapa el error.
+        """
+        motores = self.obtener_motores_excel(archivo, base_de_datos)
+        for motor in motores[:-1]:
+            try:
+                return pd.read_excel(archivo, engine=motor, **parametros)
+            # Cada motor lanza sus propios tipos de error
+            except Exception as error:
+                print(f"No se pudo leer {archivo} con {motor} ({error}), se usa otro motor")
+
+        # Si ningún motor sabe leer el formato, pandas elige el motor como antes
+        return pd.read_excel(archivo, engine=motores[-1] if motores else None, **parametros)
+
+    def obtener_motores_excel(self, archivo, base_de_datos):
+        """
+        Esta función obtiene los motores instalados que saben leer el formato del archivo,
+        partiendo por el elegido en motores_excel para la base de datos y luego en el orden de
+        MOTORES_EXCEL.
+        """
+        with open(archivo, "rb") as archivo_excel:
+            firma = archivo_excel.read(4)
+        formato = FIRMAS_FORMATO_EXCEL.get(firma)
+
+        motor_elegido = self.motores_excel.get(base_de_datos)
+        return [
+            motor
+            for motor in sorted(MOTORES_EXCEL, key=lambda motor: motor != motor_elegido)
+            if formato in MOTORES_EXCEL[motor][1]
+            and importlib.util.find_spec(MOTORES_EXCEL[motor][0]) is not None
+        ]
+
+    def unir_dfs(self, diccionario_dfs_limpias):
+        """
+        Esta función permite unir todas las bases de datos según la llave RUT-DV + Folio SII.
+        - En este caso, se realiza un LEFT JOIN a la base de datos del SII. Esto, ya que es la base
+        de las facturas.
+        - El orden en que se agregan las bases de datos es: SII -> ACEPTA -> OBSERVACIONES -> SCI
+        -> SIGFE -> TURBO
+        - Cada base se deja con una fila por llave (la primera) antes de unirla, y luego todas se
+        alinean de una vez a las llaves del SII. Así las llaves duplicadas no multiplican las
+        filas intermedias.
+        """
+        print("\nUniendo todas las bases de datos!")
+        df_sii = diccionario_dfs_limpias.pop("SII")
+
+        reporte_abanico = {"SII": self.contar_abanico(df_sii.index, df_sii.index)}
+        df_sii = df_sii[~df_sii.index.duplicated(keep="first")]
+
+        dfs_alineadas = [df_sii]
+        for base_de_datos, df_derecha in diccionario_dfs_limpias.items():
+            reporte_abanico[base_de_datos] = self.contar_abanico(df_derecha.index, df_sii.index)
+            df_derecha = df_derecha[~df_derecha.index.duplicated(keep="first")]
+            dfs_alineadas.append(df_derecha.reindex(df_sii.index))
+
+        df_sii = pd.concat(dfs_alineadas, axis=1)
+
+        print("Llaves duplicadas en cada base de datos:")
+        print(pd.DataFrame(reporte_abanico).T.to_string())
+
+        return df_sii
+
+    def contar_abanico(self, llaves_derecha, llaves_sii):
+        """
+        Esta función cuenta las llaves duplicadas de una base de datos: cuántas llaves se repiten,
+        cuántas filas se descartan al dejar una fila por llave, y cuántas filas de más hubiera
+        generado un merge contra las llaves del SII.
+        """
+        conteo_llaves = llaves_derecha.value_counts()
+        llaves_repetidas = conteo_llaves[conteo_llaves > 1]
+        repetidas_en_sii = llaves_repetidas[llaves_repetidas.index.isin(llaves_sii)]
+
+        return {
+            "llaves_repetidas": len(llaves_repetidas),
+            "filas_descartadas": int((llaves_repetidas - 1).sum()),
+            "filas_extra_en_merge": int((repetidas_en_sii - 1).sum()),
+        }
+
+    def calcular_tiempo_8_dias(self, df_unida):
+        """
+        Esta función permite calcular la diferencia de tiempo entre el día actual, y el día en que
+        se recibió la factura ("Fecha Recepción SII").
+
+        Este calculo solo se realiza a las facturas que NO estén devengadas (y con fecha de
+        recepción), de una vez para todas:
+        - tiempo_diferencia_SII: Días corridos desde la recepción (contando el día de recepción).
+        - dias_habiles_SII: Días hábiles desde la recepción (sin contar el día de recepción), y
+        tramo_antiguedad_SII su tramo según LIMITES_TRAMOS_ANTIGUEDAD.
+        - dias_para_plazo_SII: Días hábiles que faltan para el último día del plazo
+        (PLAZO_DIAS_HABILES_SII días hábiles después de la recepción), 0 si vence hoy. Si ya
+        venció, es negativo (-1 desde el día siguiente al vencimiento). esta_al_dia indica si el
+        plazo no ha vencido.
+        """
+        print("Calculando los 8 días de las facturas!")
+        for columna_fecha in ("Fecha_Docto_SII", "Fecha_Recepcion_SII", "Fecha_Reclamo_SII"):
+            df_unida[columna_fecha] = self.convertir_fechas(df_unida[columna_fecha], columna_fecha)
+
+        hoy = pd.to_datetime("today")
+        fechas_recepcion = df_unida["Fecha_Recepcion_SII"].to_numpy(dtype="datetime64[ns]")
+        mask_a_calcular = pd.isna(df_unida["Fecha_DEVENGO_SIGFE"]).to_numpy() & ~np.isnat(
+            fechas_recepcion
+        )
+        fechas_recepcion = fechas_recepcion[mask_a_calcular]
+
+        diferencia = (hoy.to_datetime64() - fechas_recepcion) + np.timedelta64(1, "D")
+        tiempo_diferencia = np.round(diferencia / np.timedelta64(1, "D"), 2)
+
+        dias_recepcion = fechas_recepcion.astype("datetime64[D]")
+        dia_hoy = np.datetime64(hoy.date(), "D")
+        # Los días hábiles se cuentan en todos los años entre la recepción más antigua y hoy
+        años_recepcion = dias_recepcion.astype("datetime64[Y]").astype(int) + 1970
+        calendario = self.obtener_calendario_dias_habiles(
+            range(años_recepcion.min(initial=hoy.year), años_recepcion.max(initial=hoy.year) + 1)
+        )
+        ultimo_dia_plazo = np.busday_offset(
+            dias_recepcion, PLAZO_DIAS_HABILES_SII, roll="backward", busdaycal=calendario
+        )
+        dias_habiles = np.busday_count(dias_recepcion + 1, dia_hoy + 1, busdaycal=calendario)
+        # Los días hábiles se cuentan desde la primera fecha (incluida) hasta la segunda (excluida),
+        # así el día del vencimiento cuenta como atrasado si ya pasó, aunque hoy no sea hábil
+        plazo_vencido = ultimo_dia_plazo < dia_hoy
+        dias_entre_hoy_y_plazo = np.busday_count(
+            np.minimum(dia_hoy, ultimo_dia_plazo),
+            np.maximum(dia_hoy, ultimo_dia_plazo),
+            busdaycal=calendario,
+        )
+        dias_para_plazo = np.where(plazo_vencido, -dias_entre_hoy_y_plazo, dias_entre_hoy_y_plazo)
+
+        limites_inferiores = [0] + [limite + 1 for limite in LIMITES_TRAMOS_ANTIGUEDAD]
+        tramos = pd.Categorical.from_codes(
+            np.searchsorted(LIMITES_TRAMOS_ANTIGUEDAD, dias_habiles, side="left"),
+            categories=[
+                f"{limite_inferior}-{limite}"
+                for limite_inferior, limite in zip(limites_inferiores, LIMITES_TRAMOS_ANTIGUEDAD)
+            ]
+            + [f">{LIMITES_TRAMOS_ANTIGUEDAD[-1]}"],
+            ordered=True,
+        )
+
+        columnas_calculadas = {
+            "tiempo_diferencia_SII": (tiempo_diferencia, "float64"),
+            "esta_al_dia": (~plazo_vencido, "boolean"),
+            "dias_habiles_SII": (dias_habiles, "Int64"),
+            "dias_para_plazo_SII": (dias_para_plazo, "Int64"),
+            "tramo_antiguedad_SII": (tramos, tramos.dtype),
+        }
+        posiciones = np.flatnonzero(mask_a_calcular)
+        for columna, (valores, tipo_dato) in columnas_calculadas.items():
+            # Las filas que no se calcularon (devengadas o sin recepción) quedan vacías
+            df_unida[columna] = (
+                pd.Series(valores, index=posiciones)
+                .reindex(np.arange(len(df_unida)))
+                .astype(tipo_dato)
+                .array
+            )
+
+        return df_unida
+
+    def obtener_calendario_dias_habiles(self, años):
+        """
+        Esta función obtiene el calendario de días hábiles (lunes a viernes, sin FERIADOS_CHILE
+        ni los feriados de ARCHIVO_FERIADOS_LOCALES), y avisa por cada uno de los años en que se
+        cuentan días hábiles que no tenga feriados. El calendario se arma una sola vez por cada
+        lista de feriados (ver armar_calendario_dias_habiles).
+        """
+        feriados = [linea.split()[0] for linea in FERIADOS_CHILE.strip().splitlines()]
+        version_feriados = str(VERSION_FERIADOS)
+
+        ruta_feriados_locales = self.obtener_ruta_entrada(ARCHIVO_FERIADOS_LOCALES)
+        if os.path.exists(ruta_feriados_locales):
+            feriados_locales = pd.read_csv(ruta_feriados_locales, sep=";", dtype=str)
+            feriados += list(
+                pd.to_datetime(
+                    feriados_locales["fecha"].str.strip(), format="%Y-%m-%d"
+                ).dt.strftime("%Y-%m-%d")
+            )
+            with open(ruta_feriados_locales, "rb") as archivo:
+                version_feriados += f"+{hashlib.sha1(archivo.read()).hexdigest()[:8]}"
+
+        años_con_feriados = {int(feriado[:4]) for feriado in feriados}
+        años_sin_feriados = sorted(set(años) - años_con_feriados)
+        if años_sin_feriados:
+            print(
+                f"Ojo! No hay feriados de {', '.join(map(str, años_sin_feriados))}, por lo que "
+                f"sus días hábiles incluyen los feriados. Se pueden agregar en "
+                f"{ARCHIVO_FERIADOS_LOCALES}"
+            )
+
+        self.version_feriados = version_feriados
+
+        return armar_calendario_dias_habiles(tuple(sorted(set(feriados))))
+
+    def convertir_fechas(self, fechas, nombre_formato):
+        """
+        Esta función convierte una columna de fechas en texto a datetime, usando los formatos de
+        FORMATOS_FECHA[nombre_formato].
+
+        - Sólo se convierte cada texto distinto una vez (la misma fecha se repite en muchos
+        documentos).
+        - Se prueba cada formato exacto en orden, sólo con los textos que aún no se pudieron
+        convertir. Los que no calzan con ningún formato se leen con el lector flexible de pandas.
+        - Se informan los textos que no se pudieron convertir, y quedan vacíos (NaT).
+        """
+        if pd.api.types.is_datetime64_any_dtype(fechas):
+            return fechas
+
+        textos_unicos = pd.Series(fechas.dropna().unique())
+        fechas_unicas = pd.Series(pd.NaT, index=textos_unicos.index, dtype="datetime64[ns]")
+
+        for formato in FORMATOS_FECHA[nombre_formato]:
+            mask_pendientes = fechas_unicas.isna()
+            if not mask_pendientes.any():
+                break
+
+            fechas_unicas[mask_pendientes] = pd.to_datetime(
+                textos_unicos[mask_pendientes], format=formato, errors="coerce"
+            )
+
+        mask_pendientes = fechas_unicas.isna()
+        if mask_pendientes.any():
+            fechas_unicas[mask_pendientes] = pd.to_datetime(
+                textos_unicos[mask_pendientes], dayfirst=True, format="mixed", errors="coerce"
+            )
+
+        textos_no_convertidos = textos_unicos[fechas_unicas.isna()]
+        if not textos_no_convertidos.empty:
+            print(
+                f"{nombre_formato} tiene {len(textos_no_convertidos)} fechas que no se pudieron "
+                f"leer (ej: {textos_no_convertidos.head(3).tolist()})"
+            )
+
+        fechas_convertidas = fechas.map(
+            pd.Series(fechas_unicas.to_numpy(), index=textos_unicos.to_numpy())
+        )
+
+        return fechas_convertidas.astype("datetime64[ns]")
+
+    def leer_contexto_referencias(self, archivos_a_leer):
+        """
+        Esta función lee todos los archivos del SII y ACEPTA indicados, y retorna sólo las
+        columnas que necesita el grafo de referencias. Se usa cuando sólo se lee un período, para
+        que el grafo tenga también las notas y documentos de los otros períodos.
+        """
+        print("Leyendo el SII y ACEPTA completos para las referencias...")
+        tablas = {
+            base_de_datos: self.normalizar_base_de_datos_facturas(
+                self.leer_base_de_datos_facturas(base_de_datos, lista_archivos), base_de_datos
+            )
+            for base_de_datos, lista_archivos in archivos_a_leer.items()
+        }
+
+        return self.obtener_contexto_referencias(tablas)
+
+    def obtener_contexto_referencias(self, tablas):
+        """
+        Esta función une sólo el SII y ACEPTA de las tablas de facturas, con las columnas que
+        necesita el grafo de referencias.
+        """
+        contexto = self.unir_dfs({"SII": tablas["SII"], "ACEPTA": tablas["ACEPTA"]})
+
+        return contexto[
+            ["Tipo_Doc_SII", "RUT_Emisor_SII", "Folio_SII", "Monto_Total_SII", "referencias_ACEPTA"]
+        ]
+
+    def construir_grafo_referencias(self, df_unida):
+        """
+        Esta función construye el grafo de referencias entre documentos. Tiene un arco por cada
+        referencia de una Nota de Crédito o Débito hacia otro documento del mismo emisor (Factura
+        Electrónica, Nota de Débito o Nota de Crédito).
+
+        - El grafo queda indexado por la llave del documento referenciado, para obtener
+        directamente todas las notas que afectan a un documento.
+        - Cada arco guarda el tipo, folio y monto de la nota, junto al tipo, folio y monto del
+        documento referenciado, y la parte del monto de la nota que se aplica a ese documento
+        (ver repartir_montos_notas).
+        """
+        print("Construyendo el grafo de referencias entre documentos...")
+        arcos = self.obtener_arcos_referencias(df_unida)
+
+        return self.completar_grafo_referencias(arcos, df_unida["Monto_Total_SII"])
+
+    def obtener_arcos_referencias(self, df_unida):
+        """
+        Esta función obtiene los arcos del grafo de referencias de las notas de df_unida, con el
+        tipo, folio y monto de la nota, y el tipo, folio y llave del documento referenciado.
+        """
+        columnas_notas = [
+            "Tipo_Doc_SII",
+            "RUT_Emisor_SII",
+            "Folio_SII",
+            "Monto_Total_SII",
+            "referencias_ACEPTA",
+        ]
+        notas = df_unida.loc[df_unida["Tipo_Doc_SII"].isin(TIPOS_NOTA), columnas_notas]
+        notas = notas.dropna(subset="referencias_ACEPTA").rename_axis("llave_nota")
+        notas = notas.reset_index()
+
+        # Deja sólo las referencias a documentos que pueden estar en la planilla
+        referencias = self.extraer_referencias_de_json(notas["referencias_ACEPTA"]).droplevel(-1)
+        referencias["Tipo"] = pd.to_numeric(referencias["Tipo"], errors="coerce")
+        referencias["Folio"] = referencias["Folio"].str.lstrip("0")
+        referencias = referencias[
+            referencias["Tipo"].isin(ABREVIATURAS_TIPO_DOCUMENTO.keys())
+            & (referencias["Folio"] != "")
+        ]
+
+        notas = notas.loc[referencias.index].reset_index(drop=True)
+        referencias = referencias.reset_index(drop=True)
+        arcos = pd.DataFrame(
+            {
+                "llave_nota": notas["llave_nota"],
+                "tipo_nota": notas["Tipo_Doc_SII"],
+                "folio_nota": notas["Folio_SII"],
+                "monto_nota": notas["Monto_Total_SII"],
+                "RUT_Emisor": notas["RUT_Emisor_SII"],
+                "tipo_referencia": referencias["Tipo"].astype("Int64"),
+                "folio_referencia": referencias["Folio"],
+            }
+        )
+        arcos["llave_referencia"] = self.calcular_llave(
+            arcos["RUT_Emisor"], arcos["folio_referencia"]
+        )
+        arcos = arcos.dropna(subset="llave_referencia")
+        arcos["llave_referencia"] = arcos["llave_referencia"].astype("int64")
+
+        return arcos.drop_duplicates(["llave_nota", "llave_referencia"])
+
+    def completar_grafo_referencias(self, arcos, montos_documentos):
+        """
+        Esta función agrega a los arcos el monto de cada documento referenciado (según
+        montos_documentos, indexado por llave) y la parte del monto de la nota que se le aplica,
+        y deja el grafo indexado por la llave del documento referenciado.
+        """
+        grafo = arcos.copy()
+        grafo["monto_referencia"] = montos_documentos.reindex(grafo["llave_referencia"]).to_numpy()
+        grafo["monto_aplicado"] = self.repartir_montos_notas(grafo)
+
+        # Ordena los arcos para que las referencias no dependan del orden de lectura
+        grafo = grafo.sort_values(["llave_referencia", "tipo_nota", "folio_nota"])
+
+        return grafo.set_index("llave_referencia")
+
+    def obtener_grafo_referencias_periodo(self, df_unida, archivos_contexto):
+        """
+        Esta función arma el grafo de referencias cuando sólo se lee un período, actualizando el
+        grafo guardado en la última corrida con las notas leídas (ver
+        actualizar_grafo_referencias), por lo que no vuelve a leer los archivos de otros
+        períodos. El monto de los documentos que no se leyeron se toma de la planilla histórica.
+
+        Si no hay grafo guardado (ej: histórico importado desde el CSV), el grafo se construye
+        con todos los archivos del SII y ACEPTA (archivos_contexto).
+        """
+        ruta_arcos = self.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_ARCOS_REFERENCIAS)
+        if not os.path.exists(ruta_arcos):
+            print("No hay un grafo de referencias guardado, se arma con todos los archivos")
+            return self.construir_grafo_referencias(
+                self.leer_contexto_referencias(archivos_contexto)
+            )
+
+        # Sólo se necesita el monto de los documentos referenciados por los arcos
+        arcos_leidos = self.obtener_arcos_referencias(df_unida)
+        llaves_referenciadas = pd.concat(
+            [self.leer_arcos_referencias()["llave_referencia"], arcos_leidos["llave_referencia"]]
+        ).unique()
+        historico = self.leer_historico(columnas=["RUT_Emisor_SII", "Folio_SII", "Monto_Total_SII"])
+        historico = self.indexar_historico_por_llave(historico, llaves_referenciadas)
+
+        return self.actualizar_grafo_referencias(
+            df_unida, arcos_leidos, historico["Monto_Total_SII"]
+        )
+
+    def actualizar_grafo_referencias(
+        self, df_unida, arcos_leidos, montos_historico, llaves_recalculadas=None
+    ):
+        """
+        Esta función actualiza el grafo guardado en la última corrida (ARCHIVO_ARCOS_REFERENCIAS)
+        con los arcos de las notas de df_unida (arcos_leidos), sin volver a armar los arcos del
+        resto de las notas.
+
+        - Se reemplazan los arcos de las notas de llaves_recalculadas (las que cambiaron o se
+        eliminaron). Si es None, los de las notas de df_unida con datos de ACEPTA, así las notas
+        leídas sin su archivo de ACEPTA mantienen sus arcos guardados.
+        - El monto de los documentos referenciados se toma de df_unida, y si no está, de
+        montos_historico (indexado por llave), sin los documentos recalculados.
+        """
+        print("Actualizando el grafo de referencias con las notas leídas...")
+        if llaves_recalculadas is None:
+            llaves_recalculadas = df_unida.index[df_unida["referencias_ACEPTA"].notna()]
+        else:
+            montos_historico = montos_historico[~montos_historico.index.isin(llaves_recalculadas)]
+
+        arcos_guardados = self.leer_arcos_referencias()
+        arcos_guardados = arcos_guardados[~arcos_guardados["llave_nota"].isin(llaves_recalculadas)]
+        arcos = pd.concat(
+            [df for df in (arcos_guardados, arcos_leidos) if not df.empty], ignore_index=True
+        )
+        montos_documentos = df_unida["Monto_Total_SII"].combine_first(montos_historico)
+
+        return self.completar_grafo_referencias(arcos, montos_documentos)
+
+    def leer_arcos_referencias(self):
+        """
+        Esta función lee los arcos guardados del grafo de referencias, sin los montos de los
+        documentos referenciados (se vuelven a tomar en cada corrida).
+        """
+        arcos = pd.read_parquet(
+            self.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_ARCOS_REFERENCIAS)
+        )
+
+        return arcos.drop(columns=["monto_referencia", "monto_aplicado"], errors="ignore")
+
+    def guardar_arcos_referencias(self, grafo):
+        """
+        Esta función guarda los arcos del grafo de referencias, con la parte del monto de cada
+        nota que se aplicó a cada documento, para actualizarlos cuando se lee sólo un período o
+        en el modo incremental. Se escribe primero a un archivo temporal, como las particiones.
+        """
+        ruta_arcos = self.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_ARCOS_REFERENCIAS)
+        os.makedirs(os.path.dirname(ruta_arcos), exist_ok=True)
+        grafo.reset_index().to_parquet(f"{ruta_arcos}.tmp", index=False)
+        os.replace(f"{ruta_arcos}.tmp", ruta_arcos)
+
+    def obtener_llaves_referencias_cambiadas(self, grafo):
+        """
+        Esta función compara el grafo con el guardado en la última corrida, y retorna las llaves
+        de las notas y documentos de los arcos nuevos, eliminados o con otra parte del monto de
+        la nota. Sólo las referencias de esos documentos pueden haber cambiado.
+
+        Retorna None si no hay un grafo guardado con el que comparar.
+        """
+        ruta_arcos = self.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_ARCOS_REFERENCIAS)
+        if not os.path.exists(ruta_arcos):
+            return None
+        arcos_anteriores = pd.read_parquet(ruta_arcos)
+        if "monto_aplicado" not in arcos_anteriores.columns:
+            return None
+
+        # Se comparan como texto, ya que los arcos guardados y los nuevos pueden tener distintos
+        # tipos de datos (ej: int64 e Int64)
+        columnas = [
+            "llave_nota",
+            "llave_referencia",
+            "tipo_nota",
+            "folio_nota",
+            "tipo_referencia",
+            "folio_referencia",
+            "monto_aplicado",
+        ]
+        comparacion = (
+            grafo.reset_index()[columnas]
+            .astype(str)
+            .merge(arcos_anteriores[columnas].astype(str), how="outer", indicator=True)
+        )
+        arcos_cambiados = comparacion[comparacion["_merge"] != "both"]
+
+        return set(arcos_cambiados["llave_nota"].astype("int64")) | set(
+            arcos_cambiados["llave_referencia"].astype("int64")
+        )
+
+    def indexar_historico_por_llave(self, historico, llaves=None):
+        """
+        Esta función deja la llave de cada documento como índice del histórico. Si se indican
+        llaves, sólo se mantienen esos documentos, y la llave sólo se calcula para los que tienen
+        el folio de alguna de ellas (calcularla para todo el histórico es lo más lento).
+        """
+        if llaves is not None:
+            llaves = np.asarray(list(llaves), dtype="int64")
+            # Las llaves de respaldo no tienen el folio, por lo que no se puede filtrar por folio
+            if (llaves >= 0).all():
+                folios = llaves & (2**BITS_FOLIO_LLAVE - 1)
+                historico = historico[historico["Folio_SII"].isin(folios).to_numpy(dtype=bool)]
+
+        historico = historico.set_axis(
+            self.calcular_llave(
+                historico["RUT_Emisor_SII"], historico["Folio_SII"], con_respaldo=True
+            ).to_numpy()
+        )
+
+        return historico if llaves is None else historico[historico.index.isin(llaves)]
+
+    def repartir_montos_notas(self, grafo):
+        """
+        Esta función reparte el monto de cada nota entre los documentos que referencia, para que
+        una nota que referencia varios documentos no se descuente completa de cada uno.
+
+        - El monto se reparte en proporción al Monto Total SII de cada documento referenciado.
+        Si ninguno de los documentos referenciados está en la base (o todos suman 0), se reparte
+        en partes iguales. Los documentos que no están en la base no reciben parte del monto si
+        la nota referencia a otros que sí están.
+        - Cada parte se trunca a pesos enteros, y lo que sobra por el redondeo se suma al primer
+        documento referenciado (por tipo y folio), para que las partes sumen el monto de la nota.
+
+        Retorna el monto aplicado a cada arco, con el mismo índice del grafo.
+        """
+        arcos = grafo.sort_values(["llave_nota", "tipo_referencia", "folio_referencia"])
+        llaves_notas = arcos["llave_nota"]
+        montos_notas = arcos["monto_nota"].astype("float64")
+
+        pesos = arcos["monto_referencia"].astype("float64").abs().fillna(0)
+        total_pesos = pesos.groupby(llaves_notas).transform("sum")
+        cantidad_arcos = llaves_notas.groupby(llaves_notas).transform("size")
+        proporciones = (pesos / total_pesos).where(total_pesos > 0, 1 / cantidad_arcos)
+
+        montos_aplicados = np.trunc(montos_notas * proporciones)
+        restos = montos_notas - montos_aplicados.groupby(llaves_notas).transform("sum")
+        montos_aplicados += restos.where(~llaves_notas.duplicated(), 0)
+
+        return montos_aplicados.round().astype("Int64").reindex(grafo.index)
+
+    def calcular_saldo_neto_referencias(self, df, grafo):
+        """
+        Esta función calcula el saldo neto de cada documento: su Monto Total SII sumado a la parte
+        del monto de cada nota que lo referencia (en la base del SII las notas ya están en
+        negativo). Una nota que referencia varios documentos se reparte entre ellos, según
+        repartir_montos_notas.
+        """
+        ajustes = grafo["monto_aplicado"].groupby(level=0).sum()
+        df["Saldo_Neto_Referencias"] = df["Monto_Total_SII"] + ajustes.reindex(
+            df.index, fill_value=0
+        )
 
-        # Vuelve a poner el indice como la llave_id
-        tmp = tmp.set_index("llave_id")
+        return df
 
-        return tmp
+    def obtener_referencias_nc(self, df_izquierda, grafo):
+        """
+        Esta función permite agregar a la columna REFERENCIAS los documentos que referencia cada
+        nota (ej: FE: 1234), y las notas que referencian a cada documento (ej: NC: 567). También
+        agrega el saldo neto de cada documento.
+        """
+        print("Referenciando las Notas de Crédito...")
+        arcos = grafo.reset_index()
+
+        abreviatura_referencia = arcos["tipo_referencia"].map(ABREVIATURAS_TIPO_DOCUMENTO)
+        referencias_hacia = pd.Series(
+            (abreviatura_referencia + ": " + arcos["folio_referencia"]).to_numpy(),
+            index=arcos["llave_nota"],
+        )
+
+        abreviatura_nota = arcos["tipo_nota"].map(ABREVIATURAS_TIPO_DOCUMENTO)
+        referencias_desde = pd.Series(
+            (abreviatura_nota + ": " + arcos["folio_nota"].astype(str)).to_numpy(),
+            index=arcos["llave_referencia"],
+        )
+
+        # Consolida ambas referencias en una unica columna, primero las que hace el documento
+        referencias = pd.concat([referencias_hacia, referencias_desde])
+        referencias = referencias.groupby(level=0, sort=False).agg(" ".join)
+        df_izquierda["REFERENCIAS"] = referencias.reindex(df_izquierda.index).fillna("")
 
-    def extraer_referencia_de_nc_de_json(self, string_json):
+        df_izquierda = self.calcular_saldo_neto_referencias(df_izquierda, grafo)
+
+        return df_izquierda
+
+    def extraer_referencias_de_json(self, referencias_json):
         """
-        Esta función permite obtener las referencias que tienen las Notas de Crédito dentro la
-        base de datos ACEPTA
+        Esta función permite obtener todas las referencias que tienen los documentos dentro de la
+        base de datos ACEPTA. Lee la columna completa de una vez con expresiones regulares.
+
+        Retorna un DataFrame con una fila por referencia, indexado por el índice original y el
+        número de la referencia dentro del documento, con las columnas Tipo y Folio.
         """
-        diccionario_json = json.loads(string_json, strict=False)
-        for documento_referencia in diccionario_json:
-            if documento_referencia["Tipo"] == "33":
-                return documento_referencia["Folio"]
+        objetos = referencias_json.dropna().str.extractall(PATRON_OBJETO_REFERENCIA)[0]
+        referencias = pd.DataFrame(
+            {
+                "Tipo": objetos.str.extract(PATRON_TIPO_REFERENCIA, expand=False),
+                "Folio": objetos.str.extract(PATRON_FOLIO_REFERENCIA, expand=False),
+            }
+        )
+        referencias.index = referencias.index.rename("numero_referencia", level=-1)
 
-        return None
+        return referencias
 
     def asociar_saldo_de_oc(self, df_junta, oc_sigfe):
         """
-        Esta función permite agregar el saldo disponible de las ordenes de compra a cada
-        factura que esté asociada.
+        Esta función permite obtener el saldo disponible de las ordenes de compra asociadas a
+        cada factura. Retorna sólo las columnas de la OC, alineadas a las facturas.
         """
         # oc_pendientes = oc_sigfe.query('`Monto Disponible` > 0')
         # mask_subtitulo_22 = oc_pendientes['Concepto Presupuesto'].str[:2] == '22'
         # oc_pendientes_subt_22 = oc_pendientes[mask_subtitulo_22]
         print("Asociando Órdenes de Compra!")
-        tmp = df_junta.copy()
 
         # Filtra columnas utiles, y elimina las OC que su Numero de Documento sea 2022 o 2
         ordenes_compra_validas = oc_sigfe[
             ["Número Documento", "Monto Disponible", "Folio", "Concepto Presupuesto"]
         ]
         # Renombra nombres de columnas
-        ordenes_compra_validas.columns = [
-            "Número Documento",
-            "Monto_Disponible_OC",
-            "Numero_Compromiso_OC",
-            "Concepto_Presupuesto_OC",
-        ]
+        ordenes_compra_validas = ordenes_compra_validas.rename(
+            columns=RENOMBRES_COLUMNAS["SIGFE_REPORTS"]
+        )
         ordenes_compra_validas = ordenes_compra_validas.query(
             "~`Número Documento`.isin(['2022', '2'])"
         ).drop_duplicates("Número Documento")
 
         # Une las OC con el folio_oc_ACEPTA y el Numero del Documento
-        tmp = tmp.merge(
-            ordenes_compra_validas,
-            how="left",
-            left_on="folio_oc_ACEPTA",
-            right_on="Número Documento",
+        return self.alinear_por_columna(
+            ordenes_compra_validas, "Número Documento", df_junta["folio_oc_ACEPTA"]
         )
 
-        return tmp
-
     def asociar_maestro_articulos(self, df_junta, df_maestro_articulo):
+        """
+        Esta función permite obtener los datos del Maestro de Articulos de cada factura, según el
+        Codigo de Articulo de SCI. Retorna sólo las columnas del maestro, alineadas a las
+        facturas.
+        """
         print("Asociando con el Maestro Articulos")
-        tmp = df_junta.copy()
-        tmp = tmp.reset_index()
+        df_maestro_art = df_maestro_articulo.add_suffix("_MAESTRO_ARTICULOS")
+        df_maestro_art = df_maestro_art.drop_duplicates("Código_MAESTRO_ARTICULOS")
 
-        df_maestro_art = df_maestro_articulo.copy()
-        df_maestro_art.columns = df_maestro_art.columns + "_MAESTRO_ARTICULOS"
-
-        facturas_con_maestro_articulos = pd.merge(
-            tmp,
-            df_maestro_art,
-            how="left",
-            left_on="Codigo_Articulo_SCI",
-            right_on="Código_MAESTRO_ARTICULOS",
+        return self.alinear_por_columna(
+            df_maestro_art, "Código_MAESTRO_ARTICULOS", df_junta["Codigo_Articulo_SCI"]
         )
 
-        facturas_con_maestro_articulos = facturas_con_maestro_articulos.reset_index(drop=True)
-
-        return facturas_con_maestro_articulos
-
-    def asociar_ley_presupuesto(self, df_junta, df_ley_presupuestos):
+    def asociar_ley_presupuesto(self, df_maestro_articulos, df_ley_presupuestos):
+        """
+        Esta función permite obtener la Ley de Presupuestos de cada factura, según el Item del
+        Maestro de Articulos. Retorna sólo las columnas de la ley, alineadas a las facturas.
+        """
         print("Asociando con la Ley de Presupuestos!")
-        tmp = df_junta.copy()
-
-        ley_presupuesto = df_ley_presupuestos.copy()
-        ley_presupuesto.columns = ley_presupuesto.columns + "_LEY_PRESUPUESTO"
-        tmp["Items_MAESTRO_ARTICULOS"] = tmp["Items_MAESTRO_ARTICULOS"].astype(str)
-        ley_presupuesto["Numero_Concepto_LEY_PRESUPUESTO"] = ley_presupuesto[
-            "Numero_Concepto_LEY_PRESUPUESTO"
-        ].astype(str)
+        ley_presupuesto = df_ley_presupuestos.add_suffix("_LEY_PRESUPUESTO")
 
-        facturas_con_ley_presupuesto = pd.merge(
-            tmp,
-            ley_presupuesto,
-            how="left",
-            left_on="Items_MAESTRO_ARTICULOS",
-            right_on="Numero_Concepto_LEY_PRESUPUESTO",
+        # Ambos códigos se comparan como texto, sin decimales (los Items con vacíos son float)
+        items = self.convertir_codigos_a_texto(df_maestro_articulos["Items_MAESTRO_ARTICULOS"])
+        ley_presupuesto["Numero_Concepto_LEY_PRESUPUESTO"] = self.convertir_codigos_a_texto(
+            ley_presupuesto["Numero_Concepto_LEY_PRESUPUESTO"]
         )
+        ley_presupuesto = ley_presupuesto.drop_duplicates("Numero_Concepto_LEY_PRESUPUESTO")
 
-        facturas_con_ley_presupuesto = facturas_con_ley_presupuesto.reset_index(drop=True)
-
-        return facturas_con_ley_presupuesto
+        return self.alinear_por_columna(ley_presupuesto, "Numero_Concepto_LEY_PRESUPUESTO", items)
 
     def tienen_el_mismo_monto_sii_y_turbo(self, df_junta):
         print("Viendo si los montos de SII y TURBO coinciden...")
-        tmp = df_junta.copy()
 
         # Indica si los montos totales de SII y TURBO (bodega) coinciden
-        tmp["monto_sii_y_turbo_coinciden"] = tmp["Monto_Total_SII"] == tmp["Monto_TURBO"]
+        return (df_junta["Monto_Total_SII"] == df_junta["Monto_TURBO"]).rename(
+            "monto_sii_y_turbo_coinciden"
+        )
+
+    def alinear_por_columna(self, df_derecha, columna_llave, llaves_izquierda):
+        """
+        Esta función deja una fila de df_derecha por cada valor de llaves_izquierda, según
+        columna_llave (equivale a un LEFT JOIN, sin copiar la tabla izquierda). La columna_llave
+        de df_derecha no debe tener duplicados.
+        """
+        df_alineada = df_derecha.set_index(columna_llave, drop=False).reindex(llaves_izquierda)
+        df_alineada.index = llaves_izquierda.index
+
+        return df_alineada
+
+    def agregar_columnas_calculadas(self, df_junta, *columnas_calculadas):
+        """
+        Esta función agrega de una sola vez, a la tabla unida, todas las columnas obtenidas en las
+        etapas de asociación (OC, Maestro de Articulos, Ley de Presupuestos y montos de TURBO).
+        """
+        return pd.concat([df_junta, *columnas_calculadas], axis=1)
+
+    def convertir_codigos_a_texto(self, serie):
+        """
+        Esta función convierte códigos numéricos a texto. Los códigos con vacíos se leen como
+        float (5.0), y se dejan como "5".
 
-        return tmp
+        - Las columnas categóricas convierten sólo sus categorías, una vez cada una.
+        - Las columnas de texto con algunos números sólo convierten los valores float.
+        """
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias = self.convertir_codigos_a_texto(pd.Series(serie.cat.categories))
+            textos = categorias.array.take(serie.cat.codes.to_numpy(), allow_fill=True)
+            return pd.Series(textos, index=serie.index, name=serie.name)
+
+        if pd.api.types.is_float_dtype(serie.dtype):
+            # Los enteros se convierten con pyarrow, y los valores fuera del rango de int64 o con
+            # decimales se dejan como float
+            valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+            with np.errstate(invalid="ignore"):
+                mask_enteros = (np.trunc(valores) == valores) & (np.abs(valores) < 2**63)
+            enteros = pa.array(
+                np.where(mask_enteros, valores, 0).astype("int64"), mask=~mask_enteros
+            )
+            textos = pd.Series(
+                pc.cast(enteros, pa.string()).to_numpy(zero_copy_only=False),
+                index=serie.index,
+                name=serie.name,
+                dtype="string",
+            )
+            mask_decimales = ~np.isnan(valores) & ~mask_enteros
+            if mask_decimales.any():
+                textos[mask_decimales] = serie[mask_decimales].astype("string")
+            return textos
+
+        if serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) != "string":
+            mask_floats = serie.map(type).eq(float).to_numpy()
+            if mask_floats.any():
+                textos = serie.astype("string")
+                textos[mask_floats] = self.convertir_codigos_a_texto(
+                    serie[mask_floats].astype("float64")
+                )
+                return textos
+
+        return serie.astype("string")
 
     def obtener_columnas_necesarias(self, df_izquierda):
         """
@@ -619,117 +2893,820 @@ class GeneradorPlanillaFinanzas:
         Además, la ordena por fecha de Docto del SII
         """
         print("Filtrando las columnas necesarias!")
-        columnas_a_ocupar = [
-            "llave_id",
-            "Tipo_Doc_SII",
-            "RUT_Emisor_SII",
-            "Razon_Social_SII",
-            "Folio_SII",
-            "Fecha_Docto_SII",
-            "Fecha_Recepcion_SII",
-            "Fecha_Reclamo_SII",
-            "Monto_Exento_SII",
-            "Monto_Neto_SII",
-            "Monto_IVA_Recuperable_SII",
-            "Monto_Total_SII",
-            "publicacion_ACEPTA",
-            "estado_acepta_ACEPTA",
-            "estado_sii_ACEPTA",
-            "estado_nar_ACEPTA",
-            "estado_devengo_ACEPTA",
-            "folio_oc_ACEPTA",
-            "Numero_Compromiso_OC",
-            "Monto_Disponible_OC",
-            "Concepto_Presupuesto_OC",
-            "folio_rc_ACEPTA",
-            "fecha_ingreso_rc_ACEPTA",
-            "folio_sigfe_ACEPTA",
-            "tarea_actual_ACEPTA",
-            "estado_cesion_ACEPTA",
-            "Fecha_DEVENGO_SIGFE",
-            "Folio_interno_DEVENGO_SIGFE",
-            "Fecha_PAGO_SIGFE",
-            "Folio_interno_PAGO_SIGFE",
-            "Fecha_Recepción_SCI",
-            "Registrador_SCI",
-            "Codigo_Articulo_SCI",
-            "Articulo_SCI",
-            "N°_Acta_SCI",
-            "Familia_MAESTRO_ARTICULOS",
-            "Items_MAESTRO_ARTICULOS",
-            "Nombre Items_MAESTRO_ARTICULOS",
-            "Cargar_en_LEY_PRESUPUESTO",
-            "Ubic._TURBO",
-            "NºPresu_TURBO",
-            "Folio_interno_TURBO",
-            "NºPago_TURBO",
-            "Monto_TURBO",
-            "tiempo_diferencia_SII",
-            "esta_al_dia",
-            "monto_sii_y_turbo_coinciden",
-            "REFERENCIAS",
-            "OBSERVACION_OBSERVACIONES",
-        ]
+        columnas_a_ocupar = list(ESQUEMA_PLANILLA.keys())
+
+        # La planilla histórica leída desde las particiones ya trae la llave_id legible
+        if df_izquierda.index.name == "llave":
+            df_izquierda["llave_id"] = self.materializar_llave_id(
+                df_izquierda.index.to_series(),
+                df_izquierda["RUT_Emisor_SII"],
+                df_izquierda["Folio_SII"],
+            )
 
-        df_filtrada = df_izquierda[columnas_a_ocupar]
-        df_filtrada["Tipo_Doc_SII"] = df_filtrada["Tipo_Doc_SII"].astype("category")
-        df_filtrada = df_filtrada.sort_values(
+        df_izquierda["Tipo_Doc_SII"] = df_izquierda["Tipo_Doc_SII"].astype("category")
+        df_filtrada = df_izquierda[columnas_a_ocupar].sort_values(
             by=["Fecha_Docto_SII", "tiempo_diferencia_SII"], ascending=[True, False]
         )
 
         return df_filtrada
 
-    def guardar_dfs(self, df_columnas_utiles, leer):
+    def guardar_dfs(self, df_columnas_utiles, periodo=None, grafo=None):
         """
         Esta función permite guardar la planilla de facturas para el control de Devengo.
-        - El nombre del archivo es PLANILLA DE CONTROL AL  (fecha actual)
-        - Se formatea automáticamente la fecha al escribirse a formato excel.
+        - La planilla histórica se guarda en Parquet, con una partición por año de
+        Fecha_Docto_SII. Si sólo se leyó un período, sólo se reescriben las particiones de los
+        años de los documentos leídos, y las de los documentos no leídos cuyas referencias
+        cambiaron según el grafo de referencias.
+        - Si el período no cubre un año completo, en OBSERVACIONES de ese año se mantienen los
+        documentos que no se volvieron a leer.
+        - Se guardan los arcos del grafo de referencias, para la siguiente corrida de un período.
         """
         print("Guardando la planilla...")
-        diccionario_nombres = {"1": pd.to_datetime("today").year, "2": "historico"}
-        periodo_a_guardar = diccionario_nombres[leer]
+        if periodo is not None:
+            self.invalidar_estado()
+            self.importar_historico_csv()
+            self.actualizar_particiones(
+                df_columnas_utiles,
+                df_columnas_utiles["llave_id"],
+                self.obtener_años_particion(df_columnas_utiles["Fecha_Docto_SII"]).unique(),
+            )
+            self.actualizar_referencias_historico(grafo)
+
+            inicio, fin = periodo
+            mantener_no_leidos_por_año = {
+                año: not (inicio <= pd.Timestamp(año, 1, 1) and fin >= pd.Timestamp(año, 12, 31))
+                for año in range(inicio.year, fin.year + 1)
+            }
+
+        else:
+            self.guardar_particiones(df_columnas_utiles)
+            años_docto = df_columnas_utiles["Fecha_Docto_SII"].dt.year.dropna().astype(int)
+            mantener_no_leidos_por_año = dict.fromkeys(años_docto.unique(), False)
+
+        if grafo is not None:
+            self.guardar_arcos_referencias(grafo)
+        self.publicar_historico()
+        self.guardar_observaciones(df_columnas_utiles, mantener_no_leidos_por_año)
+
+    def actualizar_referencias_historico(self, grafo):
+        """
+        Esta función recalcula REFERENCIAS y Saldo_Neto_Referencias de la planilla histórica con
+        el grafo de referencias, ya que las notas leídas pueden referenciar (o dejar de
+        referenciar) documentos que no se volvieron a leer, y cambiar cómo se reparten sus
+        montos. Sólo se reescriben las particiones de los años con documentos cuyas referencias
+        cambiaron.
+
+        Sólo se recalculan los documentos de los arcos que cambiaron respecto al grafo guardado
+        (ver obtener_llaves_referencias_cambiadas). Si no hay grafo guardado, se recalcula todo
+        el histórico.
+        """
+        llaves_cambiadas = self.obtener_llaves_referencias_cambiadas(grafo)
+        if llaves_cambiadas is not None and not llaves_cambiadas:
+            return
+
+        columnas_referencias = ["REFERENCIAS", "Saldo_Neto_Referencias"]
+        historico = self.leer_historico(
+            columnas=[
+                "llave_id",
+                "RUT_Emisor_SII",
+                "Folio_SII",
+                "Fecha_Docto_SII",
+                "Monto_Total_SII",
+                *columnas_referencias,
+            ]
+        )
+        historico = self.indexar_historico_por_llave(historico, llaves_cambiadas)
+        if llaves_cambiadas is not None:
+            # Las referencias de un documento sólo dependen de los arcos en que participa
+            grafo = grafo[
+                grafo.index.isin(historico.index) | grafo["llave_nota"].isin(historico.index)
+            ]
+        recalculado = self.obtener_referencias_nc(historico[["Monto_Total_SII"]].copy(), grafo)
+        recalculado = recalculado[columnas_referencias].astype(
+            {columna: ESQUEMA_PLANILLA[columna] for columna in columnas_referencias}
+        )
+
+        mask_cambiados = pd.Series(False, index=historico.index)
+        for columna in columnas_referencias:
+            anterior, nuevo = historico[columna], recalculado[columna]
+            mask_cambiados |= anterior.ne(nuevo).fillna(anterior.isna() != nuevo.isna())
+        if not mask_cambiados.any():
+            return
+
+        cambios = recalculado[mask_cambiados.to_numpy()]
+        cambios.index = historico.loc[mask_cambiados.to_numpy(), "llave_id"]
+        años_a_actualizar = self.obtener_años_particion(
+            historico.loc[mask_cambiados.to_numpy(), "Fecha_Docto_SII"]
+        ).unique()
+        print(
+            f"Se actualizan las referencias de {len(cambios)} documentos que no se volvieron a "
+            f"leer, en los años {sorted(años_a_actualizar)}"
+        )
+        for año in años_a_actualizar:
+            df_año = self.leer_historico(años=[año])
+            mask_año = df_año["llave_id"].isin(cambios.index)
+            for columna in columnas_referencias:
+                df_año.loc[mask_año, columna] = (
+                    df_año.loc[mask_año, "llave_id"].map(cambios[columna]).array
+                )
+            self.guardar_particion(df_año, año)
+
+    def obtener_años_particion(self, fechas_docto):
+        return fechas_docto.dt.year.astype("Int64").astype("string").fillna("sin_fecha")
+
+    def obtener_ruta_particion(self, año):
+        return self.obtener_ruta_salida(CARPETA_HISTORICO, f"anio={año}", "planilla.parquet")
+
+    def aplicar_esquema_planilla(self, df):
+        """
+        Esta función deja la planilla con las columnas y tipos de datos de ESQUEMA_PLANILLA, para
+        que todas las particiones del histórico tengan el mismo esquema.
+        """
+        df = df[list(ESQUEMA_PLANILLA.keys())].copy()
+        for columna, tipo_dato in ESQUEMA_PLANILLA.items():
+            if tipo_dato == "datetime64[ns]":
+                df[columna] = pd.to_datetime(df[columna])
+            elif tipo_dato == "string":
+                df[columna] = self.convertir_codigos_a_texto(df[columna])
+            else:
+                df[columna] = df[columna].astype(tipo_dato)
+
+        return df
+
+    def guardar_particion(self, df_año, año):
+        """
+        Esta función guarda la partición de un año. Se escribe primero a un archivo temporal,
+        para que una corrida interrumpida no deje una partición a medio escribir.
+        """
+        ruta_particion = self.obtener_ruta_particion(año)
+        if df_año.empty:
+            if os.path.exists(ruta_particion):
+                os.remove(ruta_particion)
+            return
+
+        os.makedirs(os.path.dirname(ruta_particion), exist_ok=True)
+        df_año = self.aplicar_esquema_planilla(df_año)
+        df_año.to_parquet(f"{ruta_particion}.tmp", index=False)
+        os.replace(f"{ruta_particion}.tmp", ruta_particion)
+
+    def guardar_particiones(self, df_columnas_utiles):
+        """
+        Esta función reescribe todas las particiones del histórico, y elimina las de años que ya
+        no tienen documentos.
+        """
+        años = self.obtener_años_particion(df_columnas_utiles["Fecha_Docto_SII"])
+        for año, df_año in df_columnas_utiles.groupby(años):
+            self.guardar_particion(df_año, año)
+
+        años_guardados = set(años)
+        for ruta_particion in glob.glob(self.obtener_ruta_particion("*")):
+            año = os.path.basename(os.path.dirname(ruta_particion)).split("=")[1]
+            if año not in años_guardados:
+                os.remove(ruta_particion)
 
-        if periodo_a_guardar != "historico":
-            df_historico = pd.read_csv(
-                "control_facturas_historico.csv", sep=";", encoding="utf-8", low_memory=False
+    def actualizar_particiones(self, df_nueva, llaves_a_reemplazar, años_a_actualizar):
+        """
+        Esta función reemplaza los documentos indicados dentro de las particiones de los años
+        indicados. El resto de las particiones no se lee ni se reescribe.
+        """
+        llaves_a_reemplazar = set(llaves_a_reemplazar)
+        # Deja los documentos nuevos con los mismos tipos de datos que las particiones
+        df_nueva = self.aplicar_esquema_planilla(df_nueva)
+        años_nueva = self.obtener_años_particion(df_nueva["Fecha_Docto_SII"])
+
+        for año in años_a_actualizar:
+            df_año = self.leer_historico(años=[año])
+            df_año = df_año[~df_año["llave_id"].isin(llaves_a_reemplazar)]
+            partes = [df for df in (df_año, df_nueva[años_nueva == año]) if not df.empty]
+            if partes:
+                df_año = pd.concat(partes, ignore_index=True)
+            self.guardar_particion(df_año, año)
+
+    def publicar_historico(self):
+        """
+        Esta función avisa que las particiones del histórico quedaron completas, reescribiendo
+        ARCHIVO_PUBLICACION_HISTORICO con la fecha y los años guardados.
+        """
+        años = [
+            os.path.basename(os.path.dirname(ruta_particion)).split("=")[1]
+            for ruta_particion in sorted(glob.glob(self.obtener_ruta_particion("*")))
+        ]
+        ruta_publicacion = self.obtener_ruta_salida(
+            CARPETA_HISTORICO, ARCHIVO_PUBLICACION_HISTORICO
+        )
+        os.makedirs(os.path.dirname(ruta_publicacion), exist_ok=True)
+        with open(f"{ruta_publicacion}.tmp", "w", encoding="utf-8") as archivo:
+            json.dump(
+                {"fecha": datetime.datetime.now().isoformat(timespec="seconds"), "años": años},
+                archivo,
             )
-            concatenado = pd.concat([df_historico, df_columnas_utiles])
-            concatenado = concatenado.drop_duplicates(subset="llave_id", keep="last")
-            concatenado.to_csv(
-                "control_facturas_historico.csv",
-                sep=";",
-                decimal=",",
-                encoding="utf-8",
-                index=False,
+        os.replace(f"{ruta_publicacion}.tmp", ruta_publicacion)
+
+    def leer_historico(self, años=None, columnas=None):
+        """
+        Esta función lee la planilla histórica desde sus particiones. Se pueden leer sólo
+        algunos años o columnas.
+        """
+        if años is None:
+            rutas_particiones = sorted(glob.glob(self.obtener_ruta_particion("*")))
+        else:
+            rutas_particiones = [self.obtener_ruta_particion(año) for año in años]
+            rutas_particiones = [ruta for ruta in rutas_particiones if os.path.exists(ruta)]
+
+        if not rutas_particiones:
+            historico_vacio = self.aplicar_esquema_planilla(
+                pd.DataFrame(columns=list(ESQUEMA_PLANILLA.keys()))
             )
+            return historico_vacio if columnas is None else historico_vacio[columnas]
+
+        historico = pd.concat(
+            (pd.read_parquet(ruta, columns=columnas) for ruta in rutas_particiones),
+            ignore_index=True,
+        )
 
-            self.filtrar_y_guardar_observaciones(df_columnas_utiles, periodo_a_guardar)
+        # Las particiones escritas por versiones anteriores pueden no tener todas las columnas
+        if columnas is None:
+            historico = historico.reindex(columns=list(ESQUEMA_PLANILLA.keys()))
 
-        else:
-            df_columnas_utiles.to_csv(
-                "control_facturas_historico.csv",
+        return historico
+
+    def importar_historico_csv(self, ruta_csv=None):
+        """
+        Esta función crea el histórico en Parquet a partir del CSV de versiones anteriores del
+        programa. Sólo se ejecuta si el histórico en Parquet todavía no existe. Por defecto se
+        importa ARCHIVO_HISTORICO_CSV de la carpeta de salida.
+        """
+        ruta_csv = ruta_csv or self.obtener_ruta_salida(ARCHIVO_HISTORICO_CSV)
+        if glob.glob(self.obtener_ruta_particion("*")) or not os.path.exists(ruta_csv):
+            return
+
+        print(f"Importando {ruta_csv} al histórico en Parquet...")
+        df_historico = pd.read_csv(
+            ruta_csv, sep=";", decimal=",", encoding="utf-8", low_memory=False
+        )
+        # El CSV de versiones anteriores no tiene las columnas agregadas después
+        columnas_faltantes = [
+            columna for columna in ESQUEMA_PLANILLA if columna not in df_historico.columns
+        ]
+        df_historico = self.aplicar_esquema_planilla(
+            df_historico.reindex(columns=list(ESQUEMA_PLANILLA.keys()))
+        )
+
+        if columnas_faltantes:
+            print(
+                f"{ruta_csv} no tiene las columnas {columnas_faltantes}, se calculan al importarlo"
+            )
+            df_historico = self.calcular_tiempo_8_dias(df_historico)
+
+            # Sin las notas no se puede repartir su monto, por lo que el saldo de los documentos
+            # con referencias queda vacío hasta que una corrida vuelva a calcular las referencias
+            if "Saldo_Neto_Referencias" in columnas_faltantes:
+                mask_sin_referencias = df_historico["REFERENCIAS"].fillna("") == ""
+                df_historico["Saldo_Neto_Referencias"] = df_historico["Monto_Total_SII"].where(
+                    mask_sin_referencias
+                )
+                print(
+                    f"Ojo! {(~mask_sin_referencias).sum()} documentos con referencias quedan sin "
+                    "Saldo_Neto_Referencias hasta la siguiente corrida"
+                )
+
+        self.guardar_particiones(df_historico)
+
+    def exportar_historico_csv(self, ruta_csv=None):
+        """
+        Esta función exporta la planilla histórica completa a CSV, para abrirla en Excel. El
+        tiempo desde la recepción en el SII se vuelve a calcular con la fecha actual. Por defecto
+        se exporta a ARCHIVO_HISTORICO_CSV de la carpeta de salida.
+        """
+        ruta_csv = ruta_csv or self.obtener_ruta_salida(ARCHIVO_HISTORICO_CSV)
+        print(f"Exportando el histórico a {ruta_csv}...")
+        df_historico = self.leer_historico()
+        df_historico = self.calcular_tiempo_8_dias(df_historico)
+        df_historico = self.obtener_columnas_necesarias(df_historico)
+
+        df_historico.to_csv(
+            ruta_csv,
+            sep=";",
+            decimal=",",
+            encoding="utf-8",
+            index=False,
+        )
+
+    def exportar_historico_excel(self, ruta_excel=None):
+        """
+        Esta función exporta la planilla histórica completa a Excel, con una hoja por año de
+        Fecha_Docto_SII, fechas y montos con formato (FORMATOS_EXCEL), el encabezado fijo y
+        filtros. Por defecto se exporta a ARCHIVO_HISTORICO_EXCEL de la carpeta de salida.
+
+        - Se lee una partición del histórico a la vez, y se escribe con el modo write-only de
+        openpyxl (cada fila se escribe al archivo apenas se agrega), por lo que la memoria no
+        crece con la cantidad de años.
+        - Se escribe primero a un archivo temporal, para no dejar un Excel a medio escribir.
+        """
+        ruta_excel = ruta_excel or self.obtener_ruta_salida(ARCHIVO_HISTORICO_EXCEL)
+        print(f"Exportando el histórico a {ruta_excel}...")
+        libro = Workbook(write_only=True)
+
+        rutas_particiones = sorted(glob.glob(self.obtener_ruta_particion("*")))
+        años = [
+            os.path.basename(os.path.dirname(ruta)).removeprefix("anio=")
+            for ruta in rutas_particiones
+        ]
+        for año in años:
+            df_año = self.leer_historico(años=[año])
+            df_año = self.calcular_tiempo_8_dias(df_año)
+            df_año = self.obtener_columnas_necesarias(df_año)
+
+            filas_por_hoja = FILAS_MAXIMAS_HOJA_EXCEL - 1
+            for numero_hoja, inicio in enumerate(range(0, len(df_año), filas_por_hoja), start=1):
+                nombre_hoja = año if numero_hoja == 1 else f"{año} ({numero_hoja})"
+                self.escribir_hoja_excel(
+                    libro, nombre_hoja, df_año.iloc[inicio : inicio + filas_por_hoja]
+                )
+
+        if not años:
+            self.escribir_hoja_excel(
+                libro, "planilla", pd.DataFrame(columns=list(ESQUEMA_PLANILLA.keys()))
+            )
+
+        ruta_temporal = f"{ruta_excel}.{os.getpid()}.{threading.get_ident()}.tmp"
+        libro.save(ruta_temporal)
+        os.replace(ruta_temporal, ruta_excel)
+
+    def escribir_hoja_excel(self, libro, nombre_hoja, df):
+        """
+        Esta función agrega una hoja de Excel con las filas de df a un libro write-only.
+
+        - El ancho de las columnas y el encabezado fijo se definen antes de escribir filas (en
+        write-only no se pueden cambiar después).
+        - Cada columna con formato usa una única celda, a la que sólo se le cambia el valor en
+        cada fila. Esto funciona porque write-only escribe cada fila apenas se agrega.
+        """
+        hoja = libro.create_sheet(nombre_hoja)
+        for numero_columna, columna in enumerate(df.columns, start=1):
+            hoja.column_dimensions[get_column_letter(numero_columna)].width = max(
+                len(columna) + 2, 12
+            )
+        hoja.freeze_panes = "A2"
+
+        encabezado = []
+        for columna in df.columns:
+            celda = WriteOnlyCell(hoja, value=columna)
+            celda.font = Font(bold=True)
+            encabezado.append(celda)
+        hoja.append(encabezado)
+
+        celdas_con_formato = []
+        for columna in df.columns:
+            celda = None
+            if columna in FORMATOS_EXCEL:
+                celda = WriteOnlyCell(hoja)
+                celda.number_format = FORMATOS_EXCEL[columna]
+            celdas_con_formato.append(celda)
+
+        def formatear_fila(fila):
+            for celda, valor in zip(celdas_con_formato, fila):
+                if celda is None or valor is None:
+                    yield valor
+                else:
+                    celda.value = valor
+                    yield celda
+
+        for inicio in range(0, len(df), FILAS_POR_BLOQUE_EXCEL):
+            bloque = df.iloc[inicio : inicio + FILAS_POR_BLOQUE_EXCEL]
+            # Los vacíos (NaN, NaT, NA) se dejan como celdas vacías
+            valores_columnas = [
+                bloque[columna].astype(object).where(bloque[columna].notna(), None).to_list()
+                for columna in bloque.columns
+            ]
+            for fila in zip(*valores_columnas):
+                hoja.append(formatear_fila(fila))
+
+        hoja.auto_filter.ref = f"A1:{get_column_letter(max(len(df.columns), 1))}{len(df) + 1}"
+
+    def guardar_observaciones(self, df_columnas_utiles, mantener_no_leidos_por_año):
+        """
+        Esta función guarda los archivos de OBSERVACIONES de los años indicados en
+        mantener_no_leidos_por_año (diccionario {año: mantener_no_leidos}).
+
+        - La planilla se separa por año de Fecha_Docto_SII una sola vez, y los archivos de cada
+        año se escriben en paralelo con un pool de hilos.
+        - Los años sin documentos en la planilla quedan con un archivo vacío, o sólo con los
+        documentos anteriores si se mantienen los no leídos.
+        """
+        años_docto = df_columnas_utiles["Fecha_Docto_SII"].dt.year
+        dfs_por_año = dict(list(df_columnas_utiles.groupby(años_docto)))
+
+        with ThreadPoolExecutor(self.n_procesos) as ejecutor:
+            futuros = [
+                ejecutor.submit(
+                    self.guardar_archivo_observaciones,
+                    dfs_por_año.get(año, df_columnas_utiles.iloc[0:0]),
+                    año,
+                    mantener_no_leidos,
+                )
+                for año, mantener_no_leidos in mantener_no_leidos_por_año.items()
+            ]
+            for futuro in futuros:
+                futuro.result()
+
+    def guardar_archivo_observaciones(
+        self, df_observaciones_año, periodo_a_guardar, mantener_no_leidos=False
+    ):
+        """
+        Esta función guarda los documentos de un año en OBSERVACIONES, para poder agregarles
+        observaciones. Si mantener_no_leidos es True, también se mantienen los documentos del
+        archivo anterior que no están en df_observaciones_año.
+
+        - Se escribe primero a un archivo temporal oculto (que el catálogo de archivos crudos no
+        lee), para que una corrida interrumpida no deje un archivo a medio escribir.
+        """
+        nombre_archivo = f"OBSERVACIONES {periodo_a_guardar}.csv"
+        ruta_observaciones = self.obtener_ruta_entrada(
+            "crudos", "base_de_datos_facturas", "OBSERVACIONES", nombre_archivo
+        )
+
+        if mantener_no_leidos and os.path.exists(ruta_observaciones):
+            observaciones_anteriores = pd.read_csv(
+                ruta_observaciones, sep=";", encoding="utf-8", dtype=str, keep_default_na=False
+            )
+            llaves_leidas = df_observaciones_año["RUT_Emisor_SII"].astype(
+                str
+            ) + df_observaciones_año["Folio_SII"].astype(str)
+            llaves_anteriores = (
+                observaciones_anteriores["RUT_Emisor_SII"] + observaciones_anteriores["Folio_SII"]
+            )
+            df_observaciones_año = pd.concat(
+                [
+                    df_observaciones_año,
+                    observaciones_anteriores[~llaves_anteriores.isin(llaves_leidas)],
+                ]
+            )
+
+        ruta_temporal = os.path.join(
+            os.path.dirname(ruta_observaciones),
+            f".{nombre_archivo}.{os.getpid()}.{threading.get_ident()}.tmp",
+        )
+        try:
+            df_observaciones_año.to_csv(
+                ruta_temporal,
                 sep=";",
                 decimal=",",
                 encoding="utf-8",
                 index=False,
             )
-            for año in df_columnas_utiles["Fecha_Docto_SII"].dt.year.unique():
-                self.filtrar_y_guardar_observaciones(df_columnas_utiles, año)
+            os.replace(ruta_temporal, ruta_observaciones)
+        finally:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+
+        # El archivo se escribió con las observaciones de la base, por lo que no se debe volver a
+        # importar mientras nadie lo modifique
+        with contextlib.closing(self.conectar_observaciones()) as conexion, conexion:
+            self.marcar_archivo_importado(conexion, ruta_observaciones)
+
+    def obtener_manifiesto(self):
+        """
+        Esta función obtiene la fecha de modificación y el tamaño de todos los archivos crudos,
+        agrupados por tipo de documento y base de datos (junto a la base de observaciones).
+        """
+        manifiesto = {}
+        for tipo_documento in ("facturas", "oc", "articulos"):
+            manifiesto[tipo_documento] = {}
+            for base_de_datos, lista_archivos in self.obtener_archivos(tipo_documento).items():
+                manifiesto[tipo_documento][base_de_datos] = {}
+                for archivo in lista_archivos:
+                    estado_archivo = os.stat(archivo)
+                    manifiesto[tipo_documento][base_de_datos][archivo] = [
+                        estado_archivo.st_mtime_ns,
+                        estado_archivo.st_size,
+                    ]
+
+        # Las observaciones guardadas directamente en la base también cambian OBSERVACIONES
+        ruta_observaciones = self.obtener_ruta_entrada(ARCHIVO_OBSERVACIONES)
+        if os.path.exists(ruta_observaciones):
+            estado_archivo = os.stat(ruta_observaciones)
+            manifiesto["facturas"].setdefault("OBSERVACIONES", {})[ruta_observaciones] = [
+                estado_archivo.st_mtime_ns,
+                estado_archivo.st_size,
+            ]
+
+        return manifiesto
+
+    def obtener_bases_cambiadas(self):
+        """
+        Esta función compara los archivos crudos actuales con los de la última corrida, y retorna
+        las bases de datos de facturas que tienen archivos nuevos, modificados o eliminados.
+
+        Retorna None si se debe recalcular la planilla completa: cuando no existe un estado
+        previo (o el grafo de referencias guardado), o cuando cambiaron las bases de OC o
+        articulos (ya que no se unen por llave).
+        """
+        ruta_manifiesto = self.obtener_ruta_salida(CARPETA_ESTADO, "manifiesto.json")
+        ruta_arcos = self.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_ARCOS_REFERENCIAS)
+        if not (
+            os.path.exists(ruta_manifiesto)
+            and os.path.exists(ruta_arcos)
+            and glob.glob(self.obtener_ruta_particion("*"))
+        ):
+            print("No existe una corrida anterior guardada")
+            return None
+
+        with open(ruta_manifiesto, encoding="utf-8") as archivo:
+            estado_guardado = json.load(archivo)
+
+        if estado_guardado.get("version") != VERSION_ESTADO:
+            print("El estado guardado es de una versión anterior del programa")
+            return None
+
+        manifiesto_anterior = estado_guardado["archivos"]
+        manifiesto_actual = self.obtener_manifiesto()
+
+        bases_cambiadas = []
+        for tipo_documento in manifiesto_actual.keys() | manifiesto_anterior.keys():
+            bases_actuales = manifiesto_actual.get(tipo_documento, {})
+            bases_anteriores = manifiesto_anterior.get(tipo_documento, {})
+
+            for base_de_datos in bases_actuales.keys() | bases_anteriores.keys():
+                if bases_actuales.get(base_de_datos) == bases_anteriores.get(base_de_datos):
+                    continue
+
+                if tipo_documento != "facturas":
+                    print(f"Cambiaron los archivos de {base_de_datos}")
+                    return None
+
+                bases_cambiadas.append(base_de_datos)
+
+        print(f"Bases de datos con archivos nuevos o modificados: {sorted(bases_cambiadas)}")
+
+        return bases_cambiadas
+
+    def leer_estado(self):
+        """
+        Esta función lee, desde el histórico, sólo las columnas necesarias para saber qué
+        documentos recalcular, en qué partición se encuentran y su monto (para repartir las notas
+        que los referencian).
+        """
+        estado = self.leer_historico(
+            columnas=["RUT_Emisor_SII", "Folio_SII", "Fecha_Docto_SII", "Monto_Total_SII"]
+        )
+        estado["llave"] = self.calcular_llave(
+            estado["RUT_Emisor_SII"], estado["Folio_SII"], con_respaldo=True
+        )
+
+        return estado.set_index("llave")
+
+    def calcular_huellas(self, tablas, bases_de_datos):
+        """
+        Esta función calcula una huella (hash) por cada fila de las bases de datos indicadas. Al
+        compararlas con las huellas de la corrida anterior, se obtienen los documentos nuevos,
+        modificados o eliminados de cada base.
+        """
+        huellas = {}
+        for base_de_datos in bases_de_datos:
+            df = tablas[base_de_datos]
+            huellas_base = pd.DataFrame(
+                {
+                    "llave": df.index,
+                    "huella": pd.util.hash_pandas_object(df, index=False).to_numpy(),
+                }
+            )
+            huellas[base_de_datos] = huellas_base.drop_duplicates()
+
+        return huellas
 
-    def filtrar_y_guardar_observaciones(self, df_columnas_utiles, periodo_a_guardar):
-        df_observaciones_año = df_columnas_utiles.query(
-            "Fecha_Docto_SII.dt.year == @periodo_a_guardar"
+    def obtener_llaves_afectadas(self, huellas, tablas):
+        """
+        Esta función obtiene las llaves que se deben recalcular en el modo incremental:
+
+        - Los documentos cuya huella cambió en alguna base de datos.
+        - Las facturas referenciadas por esas Notas de Crédito (antes y después del cambio). Las
+        de antes se toman del grafo de referencias guardado.
+        - Las Notas de Crédito que referencian a esas facturas.
+        """
+        llaves_afectadas = set()
+        for base_de_datos, huellas_nuevas in huellas.items():
+            ruta_huellas = self.obtener_ruta_salida(
+                CARPETA_ESTADO, f"huellas_{base_de_datos}.parquet"
+            )
+            if os.path.exists(ruta_huellas):
+                huellas_anteriores = pd.read_parquet(ruta_huellas)
+            else:
+                huellas_anteriores = huellas_nuevas.iloc[0:0]
+
+            comparacion = huellas_nuevas.merge(huellas_anteriores, how="outer", indicator=True)
+            llaves_cambiadas = set(comparacion.query("_merge != 'both'")["llave"])
+            print(f"{base_de_datos} tiene {len(llaves_cambiadas)} documentos cambiados")
+            llaves_afectadas.update(llaves_cambiadas)
+
+        # Documentos referenciados por las notas nuevas o modificadas
+        if "ACEPTA" in tablas:
+            acepta = tablas["ACEPTA"]
+            mask_notas_afectadas = acepta.index.isin(llaves_afectadas) & acepta["tipo_ACEPTA"].isin(
+                TIPOS_NOTA
+            )
+            notas_afectadas = acepta.loc[
+                mask_notas_afectadas, ["RUT_Emisor_ACEPTA", "referencias_ACEPTA"]
+            ]
+            notas_afectadas = notas_afectadas.dropna().reset_index(drop=True)
+            referencias = self.extraer_referencias_de_json(notas_afectadas["referencias_ACEPTA"])
+            referencias = referencias.droplevel(-1)
+            folios_referenciados = referencias.loc[
+                pd.to_numeric(referencias["Tipo"], errors="coerce").isin(
+                    ABREVIATURAS_TIPO_DOCUMENTO.keys()
+                ),
+                "Folio",
+            ]
+            llaves_referenciadas = self.calcular_llave(
+                notas_afectadas["RUT_Emisor_ACEPTA"].reindex(folios_referenciados.index),
+                folios_referenciados,
+            )
+            llaves_afectadas.update(llaves_referenciadas.dropna())
+
+        # Referencias (en ambos sentidos) que estaban guardadas en la corrida anterior
+        referencias_anteriores = self.leer_arcos_referencias()[["llave_nota", "llave_referencia"]]
+        llaves_afectadas.update(
+            referencias_anteriores.loc[
+                referencias_anteriores["llave_nota"].isin(llaves_afectadas), "llave_referencia"
+            ]
         )
-        nombre_archivo = f"OBSERVACIONES {periodo_a_guardar}.csv"
-        df_observaciones_año.to_csv(
-            f"crudos\\base_de_datos_facturas\\OBSERVACIONES\\{nombre_archivo}",
-            sep=";",
-            decimal=",",
-            encoding="utf-8",
-            index=False,
+        llaves_afectadas.update(
+            referencias_anteriores.loc[
+                referencias_anteriores["llave_referencia"].isin(llaves_afectadas), "llave_nota"
+            ]
+        )
+
+        print(f"Se recalcularán {len(llaves_afectadas)} documentos")
+
+        return llaves_afectadas
+
+    def filtrar_llaves_afectadas(self, tablas, llaves_afectadas):
+        return {
+            base_de_datos: df[df.index.isin(llaves_afectadas)]
+            for base_de_datos, df in tablas.items()
+        }
+
+    def guardar_incremental(self, planilla_recalculada, llaves_afectadas, estado, huellas, grafo):
+        """
+        Esta función reemplaza los documentos recalculados dentro del histórico, y guarda el
+        estado para la siguiente corrida.
+
+        - Sólo se reescriben las particiones y OBSERVACIONES de los años que tuvieron documentos
+        recalculados.
+        - Luego se actualizan las referencias del resto del histórico con el grafo completo, ya
+        que al cambiar un documento cambia cómo se reparten las notas que lo referencian entre
+        los demás documentos que referencian. Sólo se recalculan los documentos de los arcos que
+        cambiaron respecto al grafo guardado.
+        """
+        print("Actualizando la planilla histórica...")
+        fechas_anteriores = estado.loc[estado.index.isin(llaves_afectadas), "Fecha_Docto_SII"]
+        años_a_actualizar = set(
+            self.obtener_años_particion(planilla_recalculada["Fecha_Docto_SII"])
+        ) | set(self.obtener_años_particion(fechas_anteriores))
+
+        # Las llaves de respaldo no se pueden decodificar, su llave_id se arma desde el estado
+        estado_afectado = estado[estado.index.isin(llaves_afectadas)]
+        llaves_id_afectadas = pd.concat(
+            [
+                self.materializar_llave_id(
+                    pd.Series(estado_afectado.index, index=estado_afectado.index),
+                    estado_afectado["RUT_Emisor_SII"],
+                    estado_afectado["Folio_SII"],
+                ),
+                planilla_recalculada["llave_id"],
+            ]
+        )
+        self.actualizar_particiones(planilla_recalculada, llaves_id_afectadas, años_a_actualizar)
+        self.actualizar_referencias_historico(grafo)
+        self.guardar_arcos_referencias(grafo)
+        self.publicar_historico()
+        años_observaciones = sorted(años_a_actualizar - {"sin_fecha"})
+        self.guardar_observaciones(
+            self.leer_historico(años=años_observaciones),
+            dict.fromkeys(map(int, años_observaciones), False),
+        )
+
+        self.guardar_estado(huellas)
+        print(
+            f"Se recalcularon {planilla_recalculada.shape[0]} documentos, en los años "
+            f"{sorted(años_a_actualizar)}."
+        )
+
+    def invalidar_estado(self):
+        """
+        Esta función borra el listado de archivos del estado incremental. Se usa cuando las
+        particiones se modifican sin actualizar las huellas, para que la siguiente corrida
+        incremental recalcule todo en vez de comparar contra huellas desactualizadas.
+        """
+        ruta_manifiesto = self.obtener_ruta_salida(CARPETA_ESTADO, "manifiesto.json")
+        if os.path.exists(ruta_manifiesto):
+            os.remove(ruta_manifiesto)
+
+    def guardar_estado(self, huellas):
+        """
+        Esta función guarda las huellas de cada base de datos y el listado de archivos leídos,
+        para que la siguiente corrida pueda ser incremental. El listado de archivos se guarda al
+        final, así una corrida interrumpida obliga a recalcular.
+        """
+        os.makedirs(self.obtener_ruta_salida(CARPETA_ESTADO), exist_ok=True)
+
+        for base_de_datos, huellas_base in huellas.items():
+            huellas_base.to_parquet(
+                self.obtener_ruta_salida(CARPETA_ESTADO, f"huellas_{base_de_datos}.parquet"),
+                index=False,
+            )
+
+        ruta_manifiesto = self.obtener_ruta_salida(CARPETA_ESTADO, "manifiesto.json")
+        with open(f"{ruta_manifiesto}.tmp", "w", encoding="utf-8") as archivo:
+            json.dump({"version": VERSION_ESTADO, "archivos": self.obtener_manifiesto()}, archivo)
+        os.replace(f"{ruta_manifiesto}.tmp", ruta_manifiesto)
+
+
+def main(argumentos=None):
+    """
+    Esta función permite correr el programa desde la línea de comandos, sin preguntas (ej: para
+    dejarlo programado en la noche):
+
+    python programa_planilla_facturas.py --modo 1 --desde 2024-03 --hasta 2024-03 --salida marzo
+
+    Si no se indica el modo, se le pregunta al usuario como siempre.
+    """
+    parser = argparse.ArgumentParser(
+        description="Genera la planilla de Control de Facturas de la Unidad de Finanzas."
+    )
+    parser.add_argument(
+        "--modo",
+        choices=["1", "2", "3"],
+        help="1) Este año (o desde/hasta), 2) Todos los años, 3) Incremental",
+    )
+    parser.add_argument(
+        "--desde", help="Inicio del período a leer en el modo 1 (ej: 2024, 2024-03, 2024-03-15)"
+    )
+    parser.add_argument(
+        "--hasta", help="Fin del período a leer en el modo 1 (ej: 2024, 2024-03, 2024-03-15)"
+    )
+    parser.add_argument("--entrada", default=".", help="Carpeta que contiene crudos/")
+    parser.add_argument("--salida", default=".", help="Carpeta donde se guarda la planilla")
+    parser.add_argument("--procesos", type=int, help="Cantidad de procesos para leer archivos")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar el cache de lectura")
+    parser.add_argument("--csv", action="store_true", help="Exportar el histórico a CSV")
+    parser.add_argument(
+        "--excel", action="store_true", help="Exportar el histórico a Excel, con formato"
+    )
+    parser.add_argument(
+        "--filas-por-bloque-sii",
+        type=int,
+        help="Leer los archivos del SII por bloques de esta cantidad de filas, de a uno y sin el "
+        "cache de lectura, para acotar la memoria",
+    )
+    parser.add_argument(
+        "--agregaciones-sigfe", nargs="*", default=[], choices=list(AGREGACIONES_SIGFE_OPCIONALES)
+    )
+    parser.add_argument("--medir-memoria", action="store_true")
+    parser.add_argument(
+        "--motores-excel",
+        nargs="*",
+        default=[],
+        metavar="BASE=MOTOR",
+        help=f"Motor con que se lee cada base de datos en Excel ({', '.join(MOTORES_EXCEL)}), "
+        "ej: ACEPTA=calamine TURBO=openpyxl",
+    )
+    argumentos = parser.parse_args(argumentos)
+
+    motores_excel = {}
+    for motor_base in argumentos.motores_excel:
+        base_de_datos, _, motor = motor_base.partition("=")
+        if not motor:
+            parser.error(f"--motores-excel espera BASE=MOTOR, no {motor_base}")
+        motores_excel[base_de_datos] = motor
+
+    try:
+        programa = GeneradorPlanillaFinanzas(
+            usar_cache=not argumentos.sin_cache,
+            n_procesos=argumentos.procesos,
+            exportar_csv=argumentos.csv,
+            filas_por_bloque_sii=argumentos.filas_por_bloque_sii,
+            agregaciones_sigfe_extra=argumentos.agregaciones_sigfe,
+            medir_memoria=argumentos.medir_memoria,
+            carpeta_entrada=argumentos.entrada,
+            carpeta_salida=argumentos.salida,
+            motores_excel=motores_excel,
+            exportar_excel=argumentos.excel,
         )
+    except ValueError as error:
+        parser.error(str(error))
+
+    if argumentos.modo is not None:
+        try:
+            programa.obtener_periodo_a_leer(argumentos.modo, argumentos.desde, argumentos.hasta)
+        except ValueError as error:
+            parser.error(str(error))
+
+    try:
+        programa.correr_programa(argumentos.modo, argumentos.desde, argumentos.hasta)
+    except PeriodoSinArchivosError as error:
+        parser.error(str(error))
 
 
 if __name__ == "__main__":
-    programa = GeneradorPlanillaFinanzas()
-    programa.correr_programa()
+    main()
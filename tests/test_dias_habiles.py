@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from programa_planilla_facturas import GeneradorPlanillaFinanzas
+
+
+@pytest.fixture
+def programa(tmp_path):
+    return GeneradorPlanillaFinanzas(carpeta_entrada=tmp_path, carpeta_salida=tmp_path)
+
+
+def armar_df_unida(fechas_recepcion):
+    fechas_recepcion = pd.to_datetime(pd.Series(fechas_recepcion))
+
+    return pd.DataFrame(
+        {
+            "Fecha_Docto_SII": fechas_recepcion,
+            "Fecha_Recepcion_SII": fechas_recepcion,
+            "Fecha_Reclamo_SII": pd.Series(pd.NaT, index=fechas_recepcion.index),
+            "Fecha_DEVENGO_SIGFE": pd.Series(pd.NaT, index=fechas_recepcion.index),
+        }
+    )
+
+
+def test_generador_se_puede_serializar_despues_de_calcular(programa):
+    programa.calcular_tiempo_8_dias(armar_df_unida(["2024-09-16"]))
+
+    # Los procesos que leen los archivos reciben el generador serializado
+    assert pickle.loads(pickle.dumps(programa)).version_feriados == programa.version_feriados
+
+
+def test_avisa_cada_año_sin_feriados(programa, capsys):
+    programa.calcular_tiempo_8_dias(armar_df_unida(["2019-03-01", "2024-09-16"]))
+
+    assert "No hay feriados de 2019, 2020, 2021," in capsys.readouterr().out
+
+
+def test_feriados_no_son_dias_habiles(programa):
+    calendario = programa.obtener_calendario_dias_habiles([2024])
+
+    # Desde el viernes 13/09/2024, el plazo se salta el 18, 19 y 20 de septiembre (Fiestas Patrias)
+    ultimo_dia_plazo = np.busday_offset("2024-09-13", 8, roll="backward", busdaycal=calendario)
+
+    assert ultimo_dia_plazo == np.datetime64("2024-09-30")
@@ -0,0 +1,54 @@
+import importlib.util
+
+import pandas as pd
+import pytest
+
+from programa_planilla_facturas import MOTORES_EXCEL, GeneradorPlanillaFinanzas
+
+
+@pytest.fixture
+def libro_xlsx(tmp_path):
+    ruta = tmp_path / "TURBO.xlsx"
+    pd.DataFrame(
+        {
+            "Folio": [1234, None, 99999999],
+            "Monto": [1000.0, 2500.5, None],
+            "Fecha": pd.to_datetime(["2024-03-01", None, "2025-12-31"]),
+            "Ubic.": ["DEVENGO", "007", None],
+        }
+    ).to_excel(ruta, index=False)
+
+    return ruta
+
+
+def test_motores_excel_leen_lo_mismo(libro_xlsx, tmp_path):
+    motores = [
+        motor
+        for motor, (modulo, formatos) in MOTORES_EXCEL.items()
+        if "xlsx" in formatos and importlib.util.find_spec(modulo) is not None
+    ]
+    if len(motores) < 2:
+        pytest.skip(f"Sólo está instalado {motores} para leer xlsx")
+
+    lecturas = {
+        motor: GeneradorPlanillaFinanzas(
+            carpeta_entrada=tmp_path, motores_excel={"TURBO": motor}
+        ).leer_excel(libro_xlsx, "TURBO")
+        for motor in motores
+    }
+    for motor in motores[1:]:
+        pd.testing.assert_frame_equal(lecturas[motor], lecturas[motores[0]])
+
+
+def test_cache_depende_del_motor_excel(libro_xlsx, tmp_path, monkeypatch):
+    programa = GeneradorPlanillaFinanzas(carpeta_entrada=tmp_path)
+    parametros = {"base_de_datos": "TURBO", "header": 0, "columnas": None}
+    rutas_cache = []
+    for motores in [["openpyxl"], ["calamine", "openpyxl"], ["openpyxl"]]:
+        monkeypatch.setattr(programa, "obtener_motores_excel", lambda *_, m=motores: m)
+        rutas_cache.append(
+            programa.obtener_ruta_cache("leer_archivo_turbo", libro_xlsx, parametros)
+        )
+
+    assert rutas_cache[0] != rutas_cache[1]
+    assert rutas_cache[0] == rutas_cache[2]
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from generar_datos_sinteticos import GeneradorDatosSinteticos
+from programa_planilla_facturas import (
+    ARCHIVO_HISTORICO_CSV,
+    ESQUEMA_PLANILLA,
+    GeneradorPlanillaFinanzas,
+)
+
+# Columnas que no existían en el CSV que exportaban las versiones anteriores del programa
+COLUMNAS_NUEVAS = [
+    "dias_habiles_SII",
+    "dias_para_plazo_SII",
+    "tramo_antiguedad_SII",
+    "Saldo_Neto_Referencias",
+]
+
+
+@pytest.fixture(scope="module")
+def programa_completo(tmp_path_factory):
+    carpeta_datos = tmp_path_factory.mktemp("datos")
+    GeneradorDatosSinteticos(2000, años=[2024, 2025], semilla=3).generar(carpeta_datos)
+    programa = GeneradorPlanillaFinanzas(
+        n_procesos=1,
+        carpeta_entrada=carpeta_datos,
+        carpeta_salida=tmp_path_factory.mktemp("salida"),
+        exportar_csv=True,
+    )
+    programa.correr_programa("2")
+
+    return programa
+
+
+def test_importa_el_csv_de_versiones_anteriores(programa_completo, tmp_path):
+    df_csv = pd.read_csv(
+        programa_completo.obtener_ruta_salida(ARCHIVO_HISTORICO_CSV), sep=";", decimal=","
+    )
+    df_csv.drop(columns=COLUMNAS_NUEVAS, errors="ignore").to_csv(
+        tmp_path / ARCHIVO_HISTORICO_CSV, sep=";", decimal=",", index=False
+    )
+
+    programa = GeneradorPlanillaFinanzas(
+        n_procesos=1, carpeta_entrada=programa_completo.carpeta_entrada, carpeta_salida=tmp_path
+    )
+    programa.importar_historico_csv()
+
+    importado = programa.leer_historico().set_index("llave_id").sort_index()
+    completo = programa_completo.leer_historico().set_index("llave_id").sort_index()
+    assert list(importado.columns) == [c for c in ESQUEMA_PLANILLA if c != "llave_id"]
+    assert importado.index.equals(completo.index)
+
+    # Los días hábiles se recalculan al importar
+    columnas_dias = ["dias_habiles_SII", "dias_para_plazo_SII", "tramo_antiguedad_SII"]
+    pd.testing.assert_frame_equal(importado[columnas_dias], completo[columnas_dias])
+
+    # El saldo sólo se conoce para los documentos sin referencias
+    mask_sin_referencias = completo["REFERENCIAS"] == ""
+    assert not mask_sin_referencias.all()
+    pd.testing.assert_series_equal(
+        importado.loc[mask_sin_referencias, "Saldo_Neto_Referencias"],
+        completo.loc[mask_sin_referencias, "Saldo_Neto_Referencias"],
+    )
+    assert importado.loc[~mask_sin_referencias, "Saldo_Neto_Referencias"].isna().all()
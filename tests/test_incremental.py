@@ -0,0 +1,103 @@
+import glob
+import json
+import os
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from generar_datos_sinteticos import GeneradorDatosSinteticos
+from programa_planilla_facturas import GeneradorPlanillaFinanzas
+
+COLUMNAS_REFERENCIAS = ["REFERENCIAS", "Saldo_Neto_Referencias"]
+
+
+@pytest.fixture
+def carpeta_datos(tmp_path):
+    carpeta = tmp_path / "datos"
+    GeneradorDatosSinteticos(3000, años=[2024, 2025], semilla=2).generar(carpeta)
+
+    return carpeta
+
+
+def agregar_referencias_a_una_factura(carpeta):
+    """
+    Agrega una misma Factura a las referencias de dos Notas de Crédito del mismo emisor en
+    ACEPTA. Retorna el RUT y el folio de la Factura que referenciaba la primera nota.
+    """
+    ruta_acepta = sorted(glob.glob(os.path.join(carpeta, "crudos", "*", "ACEPTA", "*")))[0]
+    libro = openpyxl.load_workbook(ruta_acepta)
+    hoja = libro.active
+    filas = list(hoja.iter_rows(min_row=2))
+    columnas = [celda.value for celda in hoja[1]]
+    tipo, folio, emisor, referencias = (
+        columnas.index(columna) for columna in ("tipo", "folio", "emisor", "referencias")
+    )
+
+    notas_por_emisor = {}
+    for fila in filas:
+        if fila[tipo].value == 61 and fila[referencias].value:
+            notas_por_emisor.setdefault(fila[emisor].value, []).append(fila)
+
+    for rut, notas in notas_por_emisor.items():
+        folios_referenciados = {
+            int(referencia["Folio"])
+            for nota in notas
+            for referencia in json.loads(nota[referencias].value)
+        }
+        otras_facturas = [
+            fila[folio].value
+            for fila in filas
+            if fila[emisor].value == rut
+            and fila[tipo].value == 33
+            and fila[folio].value not in folios_referenciados
+        ]
+        if len(notas) < 2 or not otras_facturas:
+            continue
+
+        for nota in notas[:2]:
+            referencias_nota = json.loads(nota[referencias].value)
+            referencias_nota.append({"Tipo": "33", "Folio": str(otras_facturas[0])})
+            nota[referencias].value = json.dumps(referencias_nota)
+        libro.save(ruta_acepta)
+
+        return rut, int(json.loads(notas[0][referencias].value)[1]["Folio"])
+
+    raise AssertionError("No hay dos notas del mismo emisor con otra factura que referenciar")
+
+
+def cambiar_monto_sii(carpeta, rut, folio):
+    encontrado = False
+    for ruta_sii in glob.glob(os.path.join(carpeta, "crudos", "*", "SII", "*")):
+        sii = pd.read_csv(ruta_sii, sep=";", dtype=str, keep_default_na=False)
+        mask_documento = (sii["RUT Proveedor"] == rut) & (sii["Folio"] == str(folio))
+        if mask_documento.any():
+            sii.loc[mask_documento, "Monto Total"] = "123456789"
+            sii.to_csv(ruta_sii, sep=";", index=False)
+            encontrado = True
+
+    assert encontrado, f"No se encontró el documento {rut} {folio} en el SII"
+
+
+def leer_referencias(programa):
+    historico = programa.leer_historico(columnas=["llave_id", *COLUMNAS_REFERENCIAS])
+
+    return historico.set_index("llave_id").sort_index()
+
+
+def test_incremental_reparte_las_notas_igual_que_la_corrida_completa(carpeta_datos, tmp_path):
+    rut, folio = agregar_referencias_a_una_factura(carpeta_datos)
+    incremental = GeneradorPlanillaFinanzas(
+        n_procesos=1, carpeta_entrada=carpeta_datos, carpeta_salida=tmp_path / "incremental"
+    )
+    incremental.correr_programa("2")
+
+    cambiar_monto_sii(carpeta_datos, rut, folio)
+    incremental.correr_programa("3")
+
+    completa = GeneradorPlanillaFinanzas(
+        n_procesos=1, carpeta_entrada=carpeta_datos, carpeta_salida=tmp_path / "completa"
+    )
+    completa.correr_programa("2")
+
+    pd.testing.assert_frame_equal(leer_referencias(incremental), leer_referencias(completa))
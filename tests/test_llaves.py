@@ -0,0 +1,86 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from programa_planilla_facturas import GeneradorPlanillaFinanzas
+
+
+@pytest.fixture
+def programa(tmp_path):
+    return GeneradorPlanillaFinanzas(carpeta_entrada=tmp_path, carpeta_salida=tmp_path)
+
+
+@pytest.fixture
+def documentos():
+    return pd.DataFrame(
+        {
+            "RUT Emisor": ["76.123.456-k", "76123456-K", "EXTRANJERO", "76123456-K"],
+            "Folio": [1234, 99999999999, 55, 1234],
+            "Monto": [100, 200, 300, 400],
+        }
+    )
+
+
+def test_llave_compacta_se_materializa(programa):
+    llaves = programa.calcular_llave(pd.Series(["76123456-K", "1-9"]), pd.Series([1234, 0]))
+
+    assert programa.materializar_llave_id(llaves).tolist() == ["76123456-K1234", "1-90"]
+
+
+def test_sii_mantiene_documentos_con_llave_invalida(programa, documentos):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        df = programa.normalizar_base_de_datos_facturas(documentos, "SII")
+
+    assert len(df) == 4
+    assert (df.index[[1, 2]] < 0).all()
+    assert df.index[0] == df.index[3] > 0
+
+    llave_id = programa.materializar_llave_id(
+        df.index.to_series(), df["RUT_Emisor_SII"], df["Folio_SII"]
+    )
+    assert llave_id.tolist() == [
+        "76123456-K1234",
+        "76123456-K99999999999",
+        "EXTRANJERO55",
+        "76123456-K1234",
+    ]
+
+
+def test_llave_de_respaldo_es_la_misma_en_cada_corrida(programa, documentos):
+    df = programa.normalizar_base_de_datos_facturas(documentos.copy(), "SII")
+    # Al leer el histórico, el Folio viene como Int64 y el RUT como texto
+    llaves = programa.calcular_llave(
+        df["RUT_Emisor_SII"].astype("string"),
+        df["Folio_SII"].astype("Int64"),
+        con_respaldo=True,
+    )
+
+    assert llaves.tolist() == df.index.tolist()
+
+
+def test_otras_bases_descartan_documentos_con_llave_invalida(programa, documentos):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        df = programa.normalizar_base_de_datos_facturas(documentos, "TURBO")
+
+    assert df["Monto_TURBO"].tolist() == [100, 400]
+    assert (df.index > 0).all()
+
+
+@pytest.mark.parametrize(
+    "serie, esperado",
+    [
+        (pd.Series([5.0, None, 5.5, 123456789.0]), ["5", pd.NA, "5.5", "123456789"]),
+        (
+            pd.Series([5.0, None, 5.5, 123456789.0]).astype("category"),
+            ["5", pd.NA, "5.5", "123456789"],
+        ),
+        (pd.Series(["007", 5.0, None, 5.5]), ["007", "5", pd.NA, "5.5"]),
+    ],
+)
+def test_codigos_a_texto(programa, serie, esperado):
+    pd.testing.assert_series_equal(
+        programa.convertir_codigos_a_texto(serie), pd.Series(esperado, dtype="string")
+    )
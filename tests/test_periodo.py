@@ -0,0 +1,104 @@
+import os
+
+import pandas as pd
+import pytest
+
+from generar_datos_sinteticos import GeneradorDatosSinteticos
+from programa_planilla_facturas import (
+    ARCHIVO_ARCOS_REFERENCIAS,
+    CARPETA_HISTORICO,
+    GeneradorPlanillaFinanzas,
+    main,
+)
+
+COLUMNAS_REFERENCIAS = ["REFERENCIAS", "Saldo_Neto_Referencias"]
+
+
+@pytest.fixture(scope="module")
+def carpeta_datos(tmp_path_factory):
+    carpeta = tmp_path_factory.mktemp("datos")
+    GeneradorDatosSinteticos(3000, años=[2024, 2025], semilla=1).generar(carpeta)
+
+    return carpeta
+
+
+def leer_referencias(programa):
+    historico = programa.leer_historico(columnas=["llave_id", *COLUMNAS_REFERENCIAS])
+
+    return historico.set_index("llave_id").sort_index()
+
+
+def test_periodo_mantiene_las_referencias_de_la_corrida_completa(carpeta_datos, tmp_path):
+    programa = GeneradorPlanillaFinanzas(
+        n_procesos=1, carpeta_entrada=carpeta_datos, carpeta_salida=tmp_path
+    )
+    programa.correr_programa("2")
+    referencias_completas = leer_referencias(programa)
+    assert (referencias_completas["REFERENCIAS"] != "").any()
+
+    # Con el grafo guardado no se leen los archivos de otros períodos
+    programa.leer_contexto_referencias = None
+    programa.correr_programa("1", "2025-03", "2025-03")
+    referencias_periodo = leer_referencias(programa)
+
+    pd.testing.assert_frame_equal(referencias_periodo, referencias_completas)
+
+
+def test_periodo_actualiza_las_referencias_de_otros_periodos(carpeta_datos, tmp_path):
+    programa = GeneradorPlanillaFinanzas(
+        n_procesos=1, carpeta_entrada=carpeta_datos, carpeta_salida=tmp_path
+    )
+    programa.correr_programa("2")
+    referencias_completas = leer_referencias(programa)
+
+    # Simula un histórico guardado antes de que llegaran las notas de marzo de 2025: se
+    # eliminan sus arcos del grafo guardado y se recalculan las referencias de todo el histórico
+    historico = programa.indexar_historico_por_llave(programa.leer_historico())
+    notas_marzo = historico.index[historico["Fecha_Docto_SII"].dt.strftime("%Y-%m") == "2025-03"]
+    arcos = programa.leer_arcos_referencias()
+    grafo_sin_notas = programa.completar_grafo_referencias(
+        arcos[~arcos["llave_nota"].isin(notas_marzo)], historico["Monto_Total_SII"]
+    )
+    referencias_sin_notas = programa.obtener_referencias_nc(
+        historico[["Monto_Total_SII"]].copy(), grafo_sin_notas
+    )
+    historico[COLUMNAS_REFERENCIAS] = referencias_sin_notas[COLUMNAS_REFERENCIAS]
+    programa.guardar_particiones(historico)
+    programa.guardar_arcos_referencias(grafo_sin_notas)
+    assert not leer_referencias(programa).equals(referencias_completas)
+
+    # Al leer sólo marzo se recuperan las referencias de los documentos de otros meses
+    programa.correr_programa("1", "2025-03", "2025-03")
+
+    pd.testing.assert_frame_equal(leer_referencias(programa), referencias_completas)
+
+
+def test_periodo_sin_grafo_guardado_lee_todos_los_archivos(carpeta_datos, tmp_path):
+    programa = GeneradorPlanillaFinanzas(
+        n_procesos=1, carpeta_entrada=carpeta_datos, carpeta_salida=tmp_path
+    )
+    programa.correr_programa("2")
+    referencias_completas = leer_referencias(programa)
+
+    ruta_arcos = programa.obtener_ruta_salida(CARPETA_HISTORICO, ARCHIVO_ARCOS_REFERENCIAS)
+    os.remove(ruta_arcos)
+    programa.correr_programa("1", "2025-03", "2025-03")
+
+    pd.testing.assert_frame_equal(leer_referencias(programa), referencias_completas)
+    assert os.path.exists(ruta_arcos)
+
+
+def test_periodo_sin_archivos_es_un_error_de_uso(carpeta_datos, tmp_path, capsys):
+    with pytest.raises(SystemExit) as salida:
+        main(
+            [
+                "--modo=1",
+                "--desde=2019-01",
+                "--hasta=2019-02",
+                f"--entrada={carpeta_datos}",
+                f"--salida={tmp_path}",
+            ]
+        )
+
+    assert salida.value.code == 2
+    assert "del 2019-01-01 al 2019-02-28" in capsys.readouterr().err
@@ -0,0 +1,104 @@
+import json
+
+import pandas as pd
+import pytest
+
+from programa_planilla_facturas import GeneradorPlanillaFinanzas
+
+RUT_EMISOR = "76123456-K"
+
+
+@pytest.fixture
+def programa(tmp_path):
+    return GeneradorPlanillaFinanzas(carpeta_entrada=tmp_path, carpeta_salida=tmp_path)
+
+
+def armar_df_unida(programa, documentos):
+    """
+    Arma una tabla unida mínima, con los documentos (tipo, folio, monto, referencias) de un
+    mismo emisor.
+    """
+    df_unida = pd.DataFrame(
+        documentos, columns=["Tipo_Doc_SII", "Folio_SII", "Monto_Total_SII", "referencias"]
+    )
+    df_unida["RUT_Emisor_SII"] = RUT_EMISOR
+    df_unida["referencias_ACEPTA"] = df_unida.pop("referencias").map(
+        lambda referencias: (
+            json.dumps([{"Tipo": str(tipo), "Folio": str(folio)} for tipo, folio in referencias])
+            if referencias
+            else None
+        )
+    )
+    df_unida.index = programa.calcular_llave(df_unida["RUT_Emisor_SII"], df_unida["Folio_SII"])
+    df_unida.index = df_unida.index.astype("int64")
+
+    return df_unida
+
+
+def calcular_saldos(programa, df_unida):
+    grafo = programa.construir_grafo_referencias(df_unida)
+    df = programa.obtener_referencias_nc(df_unida.copy(), grafo)
+
+    return df.set_index("Folio_SII")["Saldo_Neto_Referencias"]
+
+
+def test_nota_a_varios_documentos_se_reparte_en_proporcion(programa):
+    df_unida = armar_df_unida(
+        programa,
+        [
+            (33, 1, 1000, None),
+            (33, 2, 3000, None),
+            (61, 10, -500, [(33, 1), (33, 2)]),
+        ],
+    )
+
+    saldos = calcular_saldos(programa, df_unida)
+
+    assert saldos[1] == 875
+    assert saldos[2] == 2625
+    # El monto de la nota se descuenta una sola vez en total
+    assert saldos[[1, 2]].sum() == 4000 - 500
+
+
+def test_nota_a_documentos_iguales_no_se_cuenta_dos_veces(programa):
+    df_unida = armar_df_unida(
+        programa,
+        [
+            (33, 1, 1000, None),
+            (33, 2, 1000, None),
+            (61, 10, -501, [(33, 2), (33, 1)]),
+        ],
+    )
+
+    saldos = calcular_saldos(programa, df_unida)
+
+    # Lo que sobra al truncar se aplica al primer documento referenciado
+    assert saldos[1] == 749
+    assert saldos[2] == 750
+
+
+def test_nota_a_documentos_fuera_de_la_base_se_reparte_en_partes_iguales(programa):
+    df_unida = armar_df_unida(programa, [(61, 10, -600, [(33, 1), (33, 2), (33, 3)])])
+
+    grafo = programa.construir_grafo_referencias(df_unida)
+
+    assert grafo["monto_aplicado"].tolist() == [-200, -200, -200]
+
+
+def test_notas_y_referencias(programa):
+    df_unida = armar_df_unida(
+        programa,
+        [
+            (33, 1, 1000, None),
+            (61, 10, -300, [(33, 1)]),
+            (56, 11, 100, [(61, 10)]),
+        ],
+    )
+
+    grafo = programa.construir_grafo_referencias(df_unida)
+    df = programa.obtener_referencias_nc(df_unida.copy(), grafo).set_index("Folio_SII")
+
+    assert df.loc[1, "REFERENCIAS"] == "NC: 10"
+    assert df.loc[10, "REFERENCIAS"] == "FE: 1 ND: 11"
+    assert df.loc[1, "Saldo_Neto_Referencias"] == 700
+    assert df.loc[10, "Saldo_Neto_Referencias"] == -200